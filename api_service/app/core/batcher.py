@@ -0,0 +1,79 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+
+class MicroBatcher:
+    # Coalesces concurrent calls into one flush(group, items) per group: a
+    # batch goes out when it reaches max_size, or `linger` seconds after its
+    # first item. Each caller awaits only its own result: flush returns one
+    # result per item, in order, and an exception in that list fails that
+    # item alone. Per worker and only touched from the event loop, so no lock.
+
+    def __init__(
+        self,
+        flush: Callable[[Hashable, list], Awaitable[list]],
+        max_size: int,
+        linger: float,
+    ):
+        self.flush = flush
+        self.max_size = max_size
+        self.linger = linger
+        self._pending: dict[Hashable, list[tuple[object, asyncio.Future]]] = {}
+        self._timers: dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, group: Hashable, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(group, [])
+        batch.append((item, future))
+        if len(batch) >= self.max_size:
+            self._dispatch(group)
+        elif len(batch) == 1:
+            self._timers[group] = loop.call_later(self.linger, self._dispatch, group)
+        return await future
+
+    def _dispatch(self, group: Hashable):
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(group, None)
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(group, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group: Hashable, batch: list):
+        # Callers that gave up while the batch was filling are not sent.
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+
+        try:
+            results = await self.flush(group, [item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch of {len(batch)} got {len(results)} results")
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    # Sends what is still waiting and lets batches in flight finish.
+    async def close(self):
+        for group in list(self._pending):
+            self._dispatch(group)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import psycopg
+
+from .config import settings
+from .metrics import ENTITY_CACHE_EVICTIONS, ENTITY_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Card and profile updates are announced by the entity_cache_invalidate
+# trigger (database/init.sql) when they commit, so every worker drops its
+# copy, not only the one that served the write.
+CHANNEL = "entity_changes"
+
+_MISSING = object()
+
+
+class EntityCache:
+    # Read-through, per worker, bounded (LRU) and with a TTL. Also caches
+    # "not found" (None) for a shorter time, so probing missing ids does not
+    # reach the database every time. Sync routes run in the threadpool, hence
+    # the lock.
+
+    def __init__(self, name: str, max_entries: int, ttl: float, negative_ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation: a load that started before one may
+        # have read the old row and is not stored.
+        self._generation = 0
+
+    def _get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key: Hashable, value, generation: int):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                ENTITY_CACHE_EVICTIONS.labels(self.name).inc()
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Optional[object]]):
+        if not self.max_entries:
+            return load()
+
+        value = self._get(key)
+        if value is not _MISSING:
+            result = "hit" if value is not None else "negative_hit"
+            ENTITY_CACHE_REQUESTS.labels(self.name, result).inc()
+            return value
+
+        ENTITY_CACHE_REQUESTS.labels(self.name, "miss").inc()
+        generation = self._generation
+        value = load()
+        self._put(key, value, generation)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+def _create_cache(name: str) -> EntityCache:
+    return EntityCache(
+        name,
+        settings.ENTITY_CACHE_MAX_ENTRIES if settings.ENTITY_CACHE_ENABLED else 0,
+        ttl=settings.ENTITY_CACHE_TTL_SECONDS,
+        negative_ttl=settings.ENTITY_CACHE_NEGATIVE_TTL_SECONDS,
+    )
+
+
+# Cards by card id, active profiles by user id.
+card_cache = _create_cache("card")
+profile_cache = _create_cache("profile")
+
+CACHES = {"cards": card_cache, "profiles": profile_cache}
+
+
+async def listen_entity_changes(conninfo: str):
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(
+                conninfo, autocommit=True
+            ) as conn:
+                await conn.execute(f"LISTEN {CHANNEL}")
+                # Changes made while disconnected were missed.
+                for cache in CACHES.values():
+                    cache.clear()
+                async for notify in conn.notifies():
+                    # "<table>:<key>"
+                    table, key = notify.payload.split(":", 1)
+                    CACHES[table].invalidate(int(key))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Entity change listener disconnected | error=%s", e)
+            await asyncio.sleep(1)
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,14 +9,147 @@ class Settings(BaseSettings):
     DB_HOST: str
     DB_PORT: str
     DB_NAME: str
+    # Per worker: total connections = WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # psycopg server-side prepared statements: a query is prepared after this
+    # many executions on a connection (None disables, e.g. behind PgBouncer in
+    # transaction mode); each connection keeps at most DB_PREPARED_MAX of them
+    DB_PREPARE_THRESHOLD: Optional[int] = 2
+    DB_PREPARED_MAX: int = 200
+
+    # Optional read replicas (full SQLAlchemy URLs); empty = primary only
+    DB_REPLICA_URLS: list[str] = []
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_STICKY_SECONDS: float = 5.0
+    REPLICA_CHECK_INTERVAL: float = 5.0
+
+    # Sharding by user: shard 0 is the DB_* database, DB_SHARD_URLS (full
+    # SQLAlchemy URLs) are shards 1..N-1. Every shard's sequences are set up
+    # by database/shards.sql with this stride, which caps the shard count.
+    # Not combinable with read replicas.
+    DB_SHARD_URLS: list[str] = []
+    DB_SHARD_ID_STRIDE: int = 64
+
+    # Token buckets, as [requests per second, burst]. RATE_LIMIT_IP applies to
+    # every request per client IP; RATE_LIMIT_ROUTES per "METHOD /route/template",
+    # per user (per IP when unauthenticated). "memory" keeps buckets in each
+    # worker, so N workers allow N times the budget; "redis" shares them
+    # (needs the redis package).
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORE: Literal["memory", "redis"] = "memory"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_IP: Optional[list[float]] = [50, 200]
+    RATE_LIMIT_ROUTES: dict[str, list[float]] = {
+        "POST /auth/login": [0.2, 5],
+        "POST /auth/register": [0.1, 3],
+        "POST /payments/": [1, 10],
+        "GET /payments/": [5, 20],
+        "GET /cards/": [5, 20],
+        "GET /users/": [5, 20],
+        "GET /profiles/": [5, 20],
+    }
 
     PROCESSOR_URL: str
+    # Several processor instances, balanced by the client (core/processor_pool.py);
+    # empty means PROCESSOR_URL alone
+    PROCESSOR_URLS: list[str] = []
+    PROCESSOR_CHECK_INTERVAL: float = 5.0
+    # Consecutive errors (network or 5xx) before an endpoint is taken out of
+    # rotation, and for how long (longer each time it happens again)
+    PROCESSOR_EJECT_AFTER_ERRORS: int = 5
+    PROCESSOR_EJECT_SECONDS: float = 30.0
+    # One keep-alive connection pool per worker for all processor calls
+    PROCESSOR_TIMEOUT: float = 10.0
+    PROCESSOR_MAX_CONNECTIONS: int = 100
+    # "binary": compact struct framing (core/wire.py) for the synchronous
+    # call; the processor must be upgraded first
+    PROCESSOR_WIRE_FORMAT: Literal["json", "binary"] = "json"
+    # Micro-batching of synchronous calls (core/batcher.py): concurrent
+    # payments to the same instance go out as one POST /process-payment/batch
+    # of up to PROCESSOR_BATCH_SIZE, sent when full or PROCESSOR_BATCH_LINGER_MS
+    # after the first one. 0 or 1 disables it; must not exceed the processor's
+    # BATCH_MAX_SIZE
+    PROCESSOR_BATCH_SIZE: int = 0
+    PROCESSOR_BATCH_LINGER_MS: float = 2.0
+    # "callback": the processor answers 202 and POSTs the signed result to
+    # CALLBACK_URL (signed with CALLBACK_SECRET, or INTERNAL_SECRET_KEY if empty)
+    PROCESSOR_MODE: Literal["sync", "callback"] = "sync"
+    CALLBACK_URL: str = "http://localhost:8000/payments/callback"
+    CALLBACK_SECRET: str = ""
+    CALLBACK_TOLERANCE_SECONDS: int = 300
 
     SECRET_KEY: str
     INTERNAL_SECRET_KEY: str
     JWT_ALGORITHM: str
     JWT_EXPIRE_MINUTES: int
 
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    # Per-logger settings, keyed by logger name prefix, e.g. {"app.trace": 0.1}
+    LOG_SAMPLING: dict[str, float] = {}
+    LOG_RATE_LIMITS: dict[str, float] = {}
+    SQL_LOG_LEVEL: str = "WARNING"
+
+    PAYMENT_PARTITIONS_AHEAD: int = 3
+    PARTITION_MAINTENANCE_INTERVAL: float = 21600.0
+
+    # Re-drives payments left pending (processor errors, lost callbacks)
+    RECONCILE_ENABLED: bool = True
+    RECONCILE_INTERVAL: float = 60.0
+    RECONCILE_STALE_SECONDS: float = 120.0
+    RECONCILE_BATCH_SIZE: int = 200
+    RECONCILE_CONCURRENCY: int = 8
+    # The processor's JOB_STORE and JOB_RETENTION_SECONDS. A payment the
+    # processor does not know is sent again only while a durable store would
+    # still remember its idempotency key; otherwise it goes to manual review.
+    # With "memory" every call for a payment also goes to the same processor.
+    PROCESSOR_JOB_STORE: Literal["memory", "redis"] = "memory"
+    PROCESSOR_JOB_RETENTION_SECONDS: float = 3600.0
+
+    # Per-worker read-through cache of cards and profiles; writes and the
+    # entity_changes NOTIFY invalidate it, the TTL bounds anything missed
+    ENTITY_CACHE_ENABLED: bool = True
+    ENTITY_CACHE_MAX_ENTRIES: int = 10000
+    ENTITY_CACHE_TTL_SECONDS: float = 60.0
+    ENTITY_CACHE_NEGATIVE_TTL_SECONDS: float = 5.0
+
+    # SSE / WebSocket payment status events
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    EVENTS_SUBSCRIBER_BUFFER: int = 100
+    EVENTS_HISTORY_SIZE: int = 10000
+
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = str(Path(__file__).resolve().parent.parent.parent / "archive")
+    # Soft-deleted rows older than this are moved out of the hot tables
+    ARCHIVE_MIN_AGE_DAYS: int = 30
+    ARCHIVE_BATCH_SIZE: int = 5000
+    ARCHIVE_INTERVAL: float = 3600.0
+
+    SLOW_QUERY_THRESHOLD_MS: float = 100.0
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    SLOW_QUERY_MAX_ENTRIES: int = 500
+
+    METRICS_MONITOR_INTERVAL: float = 1.0
+    TRACE_SAMPLE_RATE: float = 0.01
+    # Obey the sampled flag of an incoming traceparent; only behind a gateway
+    # that sets or strips it, since clients reach this service directly
+    TRACE_TRUST_UPSTREAM: bool = False
+
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    # 0 = one worker per CPU core
+    WORKERS: int = 0
+    BACKLOG: int = 2048
+    KEEPALIVE_TIMEOUT: int = 5
+    GRACEFUL_TIMEOUT: int = 30
+    # Recycle a worker after this many requests (0 disables recycling)
+    MAX_REQUESTS: int = 10000
+    # Each worker adds a random 0..N to MAX_REQUESTS so they don't restart together
+    MAX_REQUESTS_JITTER: int = 1000
+    ACCESS_LOG: bool = False
+
     model_config = SettingsConfigDict(
         env_file=Path(__file__).resolve().parent.parent / ".env", extra="ignore"
     )
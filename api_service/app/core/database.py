@@ -1,15 +1,387 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+
+import psycopg
+from fastapi import Depends, Request
+from psycopg.rows import dict_row
+from sqlalchemy import event, insert, literal, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.sql.dml import UpdateBase
 from sqlmodel import SQLModel, create_engine, Session
+from payments_common.tracing import record_span
 from .config import settings
+from .metrics import DB_QUERY_LATENCY
+from .replicas import STICKY_COOKIE, STICKY_HEADER, ReplicaSet
+from .shards import ShardMap
+from .slow_queries import SlowQueryLog
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(DATABASE_URL, echo=True)
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    explain_sample_rate=settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    max_entries=settings.SLOW_QUERY_MAX_ENTRIES,
+)
+
+
+def observe_statement(
+    engine: Engine, statement: str, parameters, executemany: bool, elapsed: float
+) -> str:
+    operation = statement.lstrip().split(None, 1)[0].upper()
+    DB_QUERY_LATENCY.labels(operation).observe(elapsed)
+    if elapsed >= slow_query_log.threshold:
+        slow_query_log.record(engine, statement, parameters, executemany, elapsed)
+    return operation
+
+
+def instrument_engine(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        if conn.info.get("explain"):
+            return
+        elapsed = time.perf_counter() - start
+        operation = observe_statement(conn.engine, statement, parameters, executemany, elapsed)
+        record_span("db", start, elapsed, operation)
+
+
+def _create_engine(url: str) -> Engine:
+    engine = create_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        # SQLAlchemy's compiled cache keeps the SQL text of a query stable, so
+        # psycopg recognises repeats and prepares them server side.
+        connect_args={"prepare_threshold": settings.DB_PREPARE_THRESHOLD},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure_connection(dbapi_connection, connection_record):
+        dbapi_connection.prepared_max = settings.DB_PREPARED_MAX
+
+    return engine
+
+
+engine = _create_engine(DATABASE_URL)
+instrument_engine(engine)
+
+# Shard 0 is the main database; DB_SHARD_URLS adds shards 1..N-1.
+shard_engines = [engine] + [_create_engine(url) for url in settings.DB_SHARD_URLS]
+for shard_engine in shard_engines[1:]:
+    instrument_engine(shard_engine)
+shards = (
+    ShardMap(len(shard_engines), settings.DB_SHARD_ID_STRIDE)
+    if settings.DB_SHARD_URLS
+    else None
+)
+if shards and settings.DB_REPLICA_URLS:
+    raise RuntimeError("DB_REPLICA_URLS cannot be combined with DB_SHARD_URLS")
+
+replicas = ReplicaSet(
+    [_create_engine(url) for url in settings.DB_REPLICA_URLS],
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+    sticky_seconds=settings.REPLICA_STICKY_SECONDS,
+    secret=settings.SECRET_KEY,
+)
+for replica_engine in replicas.engines:
+    instrument_engine(replica_engine)
+
+
+class RoutingSession(Session):
+    # Sessions created with info["read_only"] send plain SELECTs to a healthy
+    # replica; flushes, DML and users inside their post-write sticky window go
+    # to the primary.
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["wrote"] = True
+            return super().get_bind(mapper, clause=clause, **kw)
+
+        if self.info.get("read_only") and not self._is_sticky():
+            replica = replicas.pick()
+            if replica is not None:
+                return replica
+
+        return super().get_bind(mapper, clause=clause, **kw)
+
+    def _is_sticky(self) -> bool:
+        request = self.info.get("request")
+        if request is None:
+            return False
+        user_id = getattr(request.state, "user_id", None)
+        token = request.cookies.get(STICKY_COOKIE) or request.headers.get(STICKY_HEADER)
+        return replicas.is_sticky(user_id, token)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _mark_sticky_after_write(session):
+    if not replicas or not session.info.pop("wrote", False):
+        return
+    request = session.info.get("request")
+    user_id = getattr(request.state, "user_id", None) if request else None
+    if user_id is not None:
+        request.state.last_write = replicas.write_token(user_id)
+
+
+def _choose_shard(mapper, instance, clause=None, **kw):
+    if instance is not None:
+        return str(shards.for_instance(instance))
+    return str(shards.route(clause)[0])
+
+
+def _choose_identity(mapper, primary_key, **kw):
+    return [str(shards.for_id(primary_key[0]))]
+
+
+def _choose_execute(orm_context):
+    return [str(shard) for shard in shards.route(orm_context.statement)]
+
+
+class ShardSession(ShardedSession, Session):
+    # Statements that filter on an id or user_id run on that shard only; the
+    # rest (admin listings, email lookups) run on every shard and their rows
+    # are concatenated.
 
+    def __init__(self, **kwargs):
+        super().__init__(
+            shards={str(i): e for i, e in enumerate(shard_engines)},
+            shard_chooser=_choose_shard,
+            identity_chooser=_choose_identity,
+            execute_chooser=_choose_execute,
+            **kwargs,
+        )
 
-def get_session():
-    with Session(engine) as session:
+
+def new_session(**kwargs) -> Session:
+    if shards:
+        return ShardSession(**kwargs)
+    return RoutingSession(engine, **kwargs)
+
+
+def get_session(request: Request):
+    with new_session(info={"request": request}) as session:
+        yield session
+
+
+# Without replicas reads share the request's get_session session (FastAPI
+# caches the dependency), so an authenticated GET uses one connection.
+def get_read_session(request: Request, session: Session = Depends(get_session)):
+    if not replicas:
+        yield session
+        return
+    with new_session(info={"request": request, "read_only": True}) as read_session:
+        yield read_session
+
+
+# Reads inside the block go to the primary even on a read-only session. The
+# entity caches load through it: a row read from a lagging replica would stay
+# cached for the whole TTL, after the invalidation for it already ran.
+@contextmanager
+def primary_reads(session: Session):
+    read_only = session.info.get("read_only")
+    session.info["read_only"] = False
+    try:
         yield session
+    finally:
+        session.info["read_only"] = read_only
+
+
+async def monitor_replicas(interval: float):
+    while True:
+        await asyncio.to_thread(replicas.check)
+        await asyncio.sleep(interval)
+
+
+# Write helpers: one statement that both changes the row and returns it, so a
+# mutation needs no SELECT beforehand and no refresh afterwards.
+def insert_returning(model, values: dict, unless=None):
+    # INSERT ... SELECT <values> [WHERE NOT EXISTS (<unless>)] RETURNING *
+    table = model.__table__
+    source = select(*(literal(v, table.c[k].type) for k, v in values.items()))
+    if unless is not None:
+        source = source.where(~unless)
+    return insert(table).from_select(list(values), source).returning(*table.c)
+
+
+def update_returning(model, *where, **values):
+    table = model.__table__
+    return update(table).where(*where).values(**values).returning(*table.c)
+
+
+def fetch_returning(session: Session, statement, schema, commit: bool = False):
+    if commit:
+        rows = run_pipeline(session, statement, commit=True)[0]
+        row = rows[0] if rows else None
+    else:
+        row = session.execute(statement).mappings().first()
+    return None if row is None else schema.model_validate(dict(row))
+
+
+def _compile(statement, dialect) -> tuple[str, dict]:
+    compiled = statement.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = compiled.construct_params()
+    for name, bind in compiled.binds.items():
+        processor = bind.type.dialect_impl(dialect).bind_processor(dialect)
+        if processor is not None and name in params:
+            params[name] = processor(params[name])
+    return str(compiled), params
+
+
+# psycopg pipeline mode: the statements, and the COMMIT when asked for, are
+# sent back to back and answered together, so N statements cost one network
+# round trip instead of N (plus BEGIN and COMMIT). They run in order on the
+# session's own connection and transaction, but their results are only read
+# after the sync, so no statement may need an earlier one's result on the
+# client. Returns the rows of each statement as dicts.
+def run_pipeline(session: Session, *statements, commit: bool = False) -> list[list[dict]]:
+    bind_arguments = {"clause": statements[0]}
+    if isinstance(session, ShardedSession):
+        # Ids from two shards in one statement (someone else's card, say)
+        # match no row on either, so the first shard answers as well as any.
+        bind_arguments["shard_id"] = str(shards.route(statements[0])[0])
+    connection = session.connection(bind_arguments=bind_arguments)
+    compiled = [_compile(s, connection.dialect) for s in statements]
+    raw = connection.connection.driver_connection
+
+    start = time.perf_counter()
+    try:
+        with raw.pipeline():
+            cursors = []
+            for sql, params in compiled:
+                cursor = raw.cursor(row_factory=dict_row)
+                cursor.execute(sql, params)
+                cursors.append(cursor)
+            if commit:
+                raw.commit()
+        results = [c.fetchall() if c.description else [] for c in cursors]
+    except psycopg.Error as e:
+        # Same exception classes (IntegrityError, ...) as session.execute.
+        raise DBAPIError.instance(
+            compiled[-1][0], compiled[-1][1], e, psycopg.Error, dialect=connection.dialect
+        ) from e
+    finally:
+        # The cursor hooks never see these statements. They are answered
+        # together, so each one reports the pipeline's time to the metrics and
+        # the slow-query log.
+        elapsed = time.perf_counter() - start
+        record_span("db", start, elapsed, f"PIPELINE x{len(statements)}")
+        for sql, params in compiled:
+            observe_statement(connection.engine, sql, params, False, elapsed)
+
+    if commit:
+        # Nothing left to send: the COMMIT went with the pipeline. This only
+        # closes the ORM transaction and runs the after_commit hooks.
+        session.commit()
+    return results
 
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    for shard_engine in shard_engines:
+        SQLModel.metadata.create_all(shard_engine)
+        install_notify_triggers(shard_engine)
+    if shards:
+        verify_shard_sequences()
+
+
+# The NOTIFY triggers of database/init.sql (migrations 004 and 005). Tables
+# made by create_all lack them, and without them SSE/WebSocket subscribers
+# and the entity caches silently miss every change.
+PAYMENTS_NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION payments_notify_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('payment_events', json_build_object(
+        'ts', (EXTRACT(EPOCH FROM NEW.updated_at) * 1000000)::BIGINT,
+        'user_id', NEW.user_id,
+        'payment_id', NEW.id,
+        'status', NEW.status,
+        'status_reason', NEW.status_reason,
+        'processor_reference', NEW.processor_reference,
+        'amount', NEW.amount,
+        'currency', NEW.currency,
+        'updated_at', NEW.updated_at
+    )::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+ENTITY_NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION entity_cache_invalidate()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('entity_changes', TG_TABLE_NAME || ':' || CASE TG_TABLE_NAME
+        WHEN 'profiles' THEN NEW.user_id
+        ELSE NEW.id
+    END);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+NOTIFY_TRIGGERS = {
+    ("payments", "payments_notify_status"): (
+        PAYMENTS_NOTIFY_FUNCTION,
+        "CREATE TRIGGER payments_notify_status AFTER UPDATE OF status ON payments"
+        " FOR EACH ROW WHEN (OLD.status = 'pending' AND NEW.status <> 'pending')"
+        " EXECUTE FUNCTION payments_notify_status()",
+    ),
+    ("cards", "cards_cache_invalidate"): (
+        ENTITY_NOTIFY_FUNCTION,
+        "CREATE TRIGGER cards_cache_invalidate AFTER INSERT OR UPDATE ON cards"
+        " FOR EACH ROW EXECUTE FUNCTION entity_cache_invalidate()",
+    ),
+    ("profiles", "profiles_cache_invalidate"): (
+        ENTITY_NOTIFY_FUNCTION,
+        "CREATE TRIGGER profiles_cache_invalidate AFTER INSERT OR UPDATE ON profiles"
+        " FOR EACH ROW EXECUTE FUNCTION entity_cache_invalidate()",
+    ),
+}
+EXISTING_TRIGGERS_SQL = text(
+    "SELECT c.relname, t.tgname FROM pg_trigger t JOIN pg_class c ON c.oid = t.tgrelid"
+    " WHERE NOT t.tgisinternal AND c.relname IN ('payments', 'cards', 'profiles')"
+)
+
+
+def install_notify_triggers(shard_engine: Engine):
+    with shard_engine.begin() as conn:
+        if set(NOTIFY_TRIGGERS) <= set(map(tuple, conn.execute(EXISTING_TRIGGERS_SQL))):
+            return
+        # Workers start together; the second one finds the triggers in place.
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('install_notify_triggers'))"))
+        existing = set(map(tuple, conn.execute(EXISTING_TRIGGERS_SQL)))
+        for key, (function_sql, trigger_sql) in NOTIFY_TRIGGERS.items():
+            if key not in existing:
+                logger.warning("Installing missing trigger %s on %s", key[1], key[0])
+                conn.exec_driver_sql(function_sql)
+                conn.exec_driver_sql(trigger_sql)
+
+
+SHARD_SEQUENCES_SQL = text(
+    "SELECT sequencename, start_value, increment_by FROM pg_sequences"
+    " WHERE sequencename IN ('users_id_seq', 'profiles_id_seq', 'cards_id_seq', 'payments_id_seq')"
+)
+
+
+# A shard whose sequences were not set up by database/shards.sql would hand
+# out ids that route to another shard; refuse to start instead.
+def verify_shard_sequences():
+    for index, shard_engine in enumerate(shard_engines):
+        with shard_engine.connect() as conn:
+            for name, start, increment in conn.execute(SHARD_SEQUENCES_SQL):
+                if increment != shards.stride or (start - 1) % shards.stride != index:
+                    raise RuntimeError(
+                        f"Shard {index}: {name} starts at {start} with increment "
+                        f"{increment}; run database/shards.sql with shard_index={index} "
+                        f"and stride={shards.stride}"
+                    )
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict, deque
+from typing import AsyncIterator, Optional
+
+import psycopg
+
+from .config import settings
+from .metrics import EVENT_SUBSCRIBER_OVERFLOWS, EVENT_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+# Finalised payments are announced by the payments_notify_status trigger
+# (database/init.sql) inside the committing transaction, so every worker's
+# listener (and therefore every subscriber, whichever worker it is connected
+# to) sees the event only once it is durable.
+CHANNEL = "payment_events"
+
+# The database clock in the unit of event keys (see payments_notify_status),
+# read right after LISTEN: every event committed later has a newer key.
+LISTEN_STARTED_SQL = (
+    "SELECT (EXTRACT(EPOCH FROM clock_timestamp()::timestamp) * 1000000)::BIGINT"
+)
+
+
+class PaymentEvent:
+    __slots__ = ("key", "user_id", "data")
+
+    def __init__(self, key: tuple[int, int], user_id: int, data: dict):
+        self.key = key
+        self.user_id = user_id
+        self.data = data
+
+    # "<updated_at in µs>-<payment id>": the same on every worker, so a client
+    # can resume on any of them.
+    @property
+    def id(self) -> str:
+        return f"{self.key[0]}-{self.key[1]}"
+
+    @classmethod
+    def from_payload(cls, payload: str) -> "PaymentEvent":
+        data = json.loads(payload)
+        return cls((data.pop("ts"), data["payment_id"]), data.pop("user_id"), data)
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[tuple[int, int]]:
+    if not event_id:
+        return None
+    try:
+        ts, payment_id = event_id.split("-", 1)
+        return int(ts), int(payment_id)
+    except ValueError:
+        return None
+
+
+class Subscription:
+
+    def __init__(self, user_id: int, buffer_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue[PaymentEvent] = asyncio.Queue(buffer_size)
+        self.overflowed = False
+
+    def push(self, event: PaymentEvent):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow consumer is cut off instead of buffering without bound;
+            # it reconnects with its last event id and replays from history.
+            self.overflowed = True
+            EVENT_SUBSCRIBER_OVERFLOWS.inc()
+
+    async def events(self, heartbeat: float) -> AsyncIterator[Optional[PaymentEvent]]:
+        # Yields None whenever `heartbeat` seconds pass without an event.
+        while True:
+            if self.overflowed and self.queue.empty():
+                return
+            try:
+                yield await asyncio.wait_for(self.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+
+class EventBroker:
+    # Only touched from the event loop thread, so no locking.
+    #
+    # History holds every event newer than the latest (re)connect of any
+    # listener (one per shard) and newer than the last event it dropped.
+    # Events before that were missed (worker start or recycle, listener
+    # disconnected) or dropped, so older event ids need a resync.
+
+    def __init__(self, history_size: int, buffer_size: int):
+        self.buffer_size = buffer_size
+        self._history: deque[PaymentEvent] = deque(maxlen=history_size)
+        self._subscribers: dict[int, set[Subscription]] = defaultdict(set)
+        # Per listener, the key it has been connected since (None while not).
+        self._sources: list[Optional[tuple[int, int]]] = []
+        self._dropped: tuple[int, int] = (0, 0)
+
+    def add_source(self) -> int:
+        self._sources.append(None)
+        return len(self._sources) - 1
+
+    def connected(self, source: int, since: tuple[int, int]):
+        self._sources[source] = since
+
+    def disconnected(self, source: int):
+        self._sources[source] = None
+
+    def complete_since(self) -> Optional[tuple[int, int]]:
+        if not self._sources or None in self._sources:
+            return None
+        return max(*self._sources, self._dropped)
+
+    def publish(self, event: PaymentEvent):
+        if len(self._history) == self._history.maxlen:
+            self._dropped = max(self._dropped, self._history[0].key)
+        self._history.append(event)
+        for subscription in self._subscribers.get(event.user_id, ()):
+            subscription.push(event)
+
+    # Events newer than `last_event_id` still held in history are queued
+    # first. The second value asks the client to resync (re-read its payments)
+    # when the id is unknown or older than what history covers.
+    def subscribe(
+        self, user_id: int, last_event_id: Optional[str] = None
+    ) -> tuple[Subscription, bool]:
+        subscription = Subscription(user_id, self.buffer_size)
+        self._subscribers[user_id].add(subscription)
+        EVENT_SUBSCRIBERS.inc()
+
+        if last_event_id is None:
+            return subscription, False
+
+        key = parse_event_id(last_event_id)
+        since = self.complete_since()
+        resync = key is None or since is None or key < since
+        if key is not None:
+            for event in self._history:
+                if event.user_id == user_id and event.key > key:
+                    subscription.push(event)
+        return subscription, resync
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+        EVENT_SUBSCRIBERS.dec()
+
+
+payment_events = EventBroker(
+    history_size=settings.EVENTS_HISTORY_SIZE,
+    buffer_size=settings.EVENTS_SUBSCRIBER_BUFFER,
+)
+
+
+async def listen_payment_events(broker: EventBroker, conninfo: str):
+    source = broker.add_source()
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(
+                conninfo, autocommit=True
+            ) as conn:
+                await conn.execute(f"LISTEN {CHANNEL}")
+                cursor = await conn.execute(LISTEN_STARTED_SQL)
+                (started,) = await cursor.fetchone()
+                broker.connected(source, (started, 0))
+                logger.info("Listening for payment events")
+                async for notify in conn.notifies():
+                    broker.publish(PaymentEvent.from_payload(notify.payload))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            broker.disconnected(source)
+            logger.warning("Payment event listener disconnected | error=%s", e)
+            await asyncio.sleep(1)
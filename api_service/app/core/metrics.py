@@ -0,0 +1,116 @@
+import asyncio
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.engine import Engine
+
+from payments_common.metrics import LATENCY_BUCKETS
+
+# HTTP metrics, the middleware and /metrics come from payments_common.metrics,
+# shared with the processor; these are the API's own.
+
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Database statement latency by SQL operation",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size", "Configured connection pool size", multiprocess_mode="livesum"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections opened beyond the pool size",
+    multiprocess_mode="livesum",
+)
+
+PROCESSOR_CALL_LATENCY = Histogram(
+    "processor_call_duration_seconds",
+    "Payment processor call latency by outcome",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+PROCESSOR_ENDPOINT_LATENCY = Histogram(
+    "processor_endpoint_duration_seconds",
+    "Payment processor call latency by endpoint and result (ok or error)",
+    ["endpoint", "result"],
+    buckets=LATENCY_BUCKETS,
+)
+PROCESSOR_BATCH_ITEMS = Histogram(
+    "processor_batch_items",
+    "Payments per batched processor call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+PROCESSOR_EJECTIONS = Counter(
+    "processor_ejections_total",
+    "Processor endpoints taken out of rotation after consecutive errors",
+    ["endpoint"],
+)
+PAYMENTS = Counter(
+    "payments_total", "Finalised payments by status", ["status"]
+)
+
+RECONCILER_PAYMENTS = Counter(
+    "reconciler_payments_total",
+    "Stale pending payments handled by the reconciler, by outcome",
+    ["outcome"],
+)
+STALE_PENDING_PAYMENTS = Gauge(
+    "stale_pending_payments",
+    "Pending payments older than the reconciler threshold at the last pass",
+    multiprocess_mode="max",
+)
+
+EVENT_SUBSCRIBERS = Gauge(
+    "payment_event_subscribers",
+    "Open SSE/WebSocket payment event subscriptions",
+    multiprocess_mode="livesum",
+)
+EVENT_SUBSCRIBER_OVERFLOWS = Counter(
+    "payment_event_subscriber_overflows_total",
+    "Subscriptions closed because their buffer filled up",
+)
+
+ENTITY_CACHE_REQUESTS = Counter(
+    "entity_cache_requests_total",
+    "Card/profile cache lookups by cache and result (hit, negative_hit, miss)",
+    ["cache", "result"],
+)
+ENTITY_CACHE_EVICTIONS = Counter(
+    "entity_cache_evictions_total",
+    "Entries dropped from a full card/profile cache",
+    ["cache"],
+)
+
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests answered 429, by limit (ip or route)",
+    ["limit"],
+)
+
+EVENT_LOOP_LAG = Gauge(
+    "event_loop_lag_seconds",
+    "Delay observed by a periodic timer on the event loop",
+    multiprocess_mode="max",
+)
+
+
+def update_pool_metrics(engine: Engine):
+    pool = engine.pool
+    DB_POOL_SIZE.set(pool.size())
+    DB_POOL_CHECKED_OUT.set(pool.checkedout())
+    DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+async def monitor_runtime(engine: Engine, interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.set(max(loop.time() - start - interval, 0.0))
+        update_pool_metrics(engine)
+
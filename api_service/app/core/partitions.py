@@ -0,0 +1,38 @@
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+IS_PARTITIONED_SQL = text(
+    "SELECT EXISTS ("
+    " SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('payments')"
+    ")"
+)
+ENSURE_PARTITIONS_SQL = text("SELECT ensure_payment_partitions(:months_ahead)")
+
+
+def ensure_payment_partitions(engine: Engine, months_ahead: int) -> Optional[int]:
+    # Databases created by SQLModel.create_all have a plain payments table;
+    # only those initialised with database/init.sql are partitioned.
+    with engine.begin() as conn:
+        if not conn.execute(IS_PARTITIONED_SQL).scalar():
+            return None
+        return conn.execute(ENSURE_PARTITIONS_SQL, {"months_ahead": months_ahead}).scalar()
+
+
+async def maintain_payment_partitions(engine: Engine, months_ahead: int, interval: float):
+    while True:
+        try:
+            created = await asyncio.to_thread(ensure_payment_partitions, engine, months_ahead)
+            if created is None:
+                logger.info("payments is not partitioned; partition maintenance stopped")
+                return
+            if created:
+                logger.info("Created %d payment partitions", created)
+        except Exception:
+            logger.exception("Payment partition maintenance failed")
+        await asyncio.sleep(interval)
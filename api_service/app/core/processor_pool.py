@@ -0,0 +1,139 @@
+import logging
+import random
+import time
+import zlib
+from typing import Optional
+
+from .config import settings
+from .metrics import PROCESSOR_EJECTIONS, PROCESSOR_ENDPOINT_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the per-endpoint latency average.
+LATENCY_EWMA_ALPHA = 0.2
+# Repeated ejections of the same endpoint last longer, up to this multiple.
+MAX_EJECTION_MULTIPLIER = 10
+
+
+class ProcessorEndpoint:
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.latency: Optional[float] = None
+
+    def available(self, now: float) -> bool:
+        return self.healthy and self.ejected_until <= now
+
+
+class ProcessorPool:
+    # Per worker, like the replica set: only touched from the event loop, so
+    # no lock. Every worker sees its own traffic and runs its own checks.
+
+    def __init__(
+        self, urls: list[str], eject_after: int, eject_seconds: float, key_affinity: bool = False
+    ):
+        self.endpoints = [ProcessorEndpoint(url) for url in urls]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.key_affinity = key_affinity
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def _candidates(self) -> list[ProcessorEndpoint]:
+        now = time.monotonic()
+        available = [e for e in self.endpoints if e.available(now)]
+        # With every endpoint out, trying them beats failing every call
+        # without one.
+        return available or self.endpoints
+
+    def pick(self, key: Optional[str] = None) -> ProcessorEndpoint:
+        candidates = self._candidates()
+        if len(candidates) == 1:
+            return candidates[0]
+
+        if key is not None and self.key_affinity:
+            # With JOB_STORE=memory each processor instance keeps its own
+            # idempotency keys and jobs, so a payment's submit, status lookups
+            # and resubmissions must reach the same instance: highest
+            # rendezvous hash wins, and only the keys of an ejected endpoint
+            # move. A shared (redis) store needs no affinity.
+            return max(candidates, key=lambda e: zlib.crc32(f"{e.url}|{key}".encode()))
+
+        # Power of two choices: the less busy of two random endpoints.
+        first, second = random.sample(candidates, 2)
+        return min(first, second, key=lambda e: (e.outstanding, e.latency or 0.0))
+
+    def started(self, endpoint: ProcessorEndpoint):
+        endpoint.outstanding += 1
+
+    def finished(self, endpoint: ProcessorEndpoint, elapsed: float, ok: bool):
+        endpoint.outstanding -= 1
+        endpoint.requests += 1
+        PROCESSOR_ENDPOINT_LATENCY.labels(endpoint.url, "ok" if ok else "error").observe(elapsed)
+
+        if endpoint.latency is None:
+            endpoint.latency = elapsed
+        else:
+            endpoint.latency += LATENCY_EWMA_ALPHA * (elapsed - endpoint.latency)
+
+        if ok:
+            endpoint.consecutive_errors = 0
+            return
+        endpoint.errors += 1
+        endpoint.consecutive_errors += 1
+        if endpoint.consecutive_errors >= self.eject_after:
+            self._eject(endpoint)
+
+    def _eject(self, endpoint: ProcessorEndpoint):
+        now = time.monotonic()
+        if endpoint.ejected_until > now:
+            return
+        # Ejections further apart than the longest one are not a streak.
+        if now - endpoint.ejected_until > self.eject_seconds * MAX_EJECTION_MULTIPLIER:
+            endpoint.ejections = 0
+        endpoint.ejections += 1
+        duration = self.eject_seconds * min(endpoint.ejections, MAX_EJECTION_MULTIPLIER)
+        endpoint.ejected_until = now + duration
+        endpoint.consecutive_errors = 0
+        PROCESSOR_EJECTIONS.labels(endpoint.url).inc()
+        logger.warning(
+            "Processor ejected | endpoint=%s | seconds=%.0f", endpoint.url, duration
+        )
+
+    def mark_health(self, endpoint: ProcessorEndpoint, healthy: bool):
+        if healthy and not endpoint.healthy:
+            logger.info("Processor healthy again | endpoint=%s", endpoint.url)
+        elif not healthy and endpoint.healthy:
+            logger.warning("Processor health check failed | endpoint=%s", endpoint.url)
+        endpoint.healthy = healthy
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "endpoint": e.url,
+                "healthy": e.healthy,
+                "ejected_seconds": max(e.ejected_until - now, 0.0) or None,
+                "outstanding": e.outstanding,
+                "requests": e.requests,
+                "errors": e.errors,
+                "latency_ms": e.latency * 1000 if e.latency is not None else None,
+            }
+            for e in self.endpoints
+        ]
+
+
+processor_pool = ProcessorPool(
+    settings.PROCESSOR_URLS or [settings.PROCESSOR_URL],
+    eject_after=settings.PROCESSOR_EJECT_AFTER_ERRORS,
+    eject_seconds=settings.PROCESSOR_EJECT_SECONDS,
+    key_affinity=settings.PROCESSOR_JOB_STORE == "memory",
+)
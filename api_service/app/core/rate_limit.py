@@ -0,0 +1,173 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+from .config import settings
+from .metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+# Token buckets: each key holds up to `burst` tokens, refilled at `rate` per
+# second; a request takes one token or is told how long until one is back.
+
+
+class MemoryBucketStore:
+    # Per worker. Only touched from the event loop thread (the middleware and
+    # the async route dependency), so no lock. Kept in last-use order: when
+    # full, the least recently used bucket goes. If it was idle long enough to
+    # refill it is the same as a missing one; otherwise only that client gets
+    # a fresh burst, never every client at once.
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def take_now(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[key] = [burst, now]
+        else:
+            self._buckets.move_to_end(key)
+
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        return self.take_now(key, rate, burst)
+
+    async def close(self):
+        pass
+
+
+# Same bucket, kept in Redis and updated atomically by a script, so every
+# worker (and host) shares it. Uses the Redis clock, not each worker's.
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(bucket[1]) or burst
+local stamp = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - stamp) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_STORE=redis needs the redis package")
+
+        self.client = redis.from_url(url)
+        self._take = self.client.register_script(TAKE_SCRIPT)
+        self._errors = redis.RedisError
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        try:
+            return float(await self._take(keys=[f"rate:{key}"], args=[rate, burst]))
+        except self._errors as e:
+            # Fail open: an unavailable limiter must not take the API down.
+            logger.warning("Rate limit store unavailable | error=%s", e)
+            return 0.0
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class RateLimiter:
+
+    def __init__(
+        self,
+        store,
+        ip_budget: Optional[list[float]],
+        route_budgets: dict[str, list[float]],
+        # Probes, scrapes and processor callbacks all come from a few IPs.
+        exempt_paths: frozenset = frozenset({"/health", "/metrics", "/payments/callback"}),
+    ):
+        self.store = store
+        self.ip_budget = ip_budget
+        self.route_budgets = route_budgets
+        self.exempt_paths = exempt_paths
+
+    async def hit(self, key: str, budget: list[float]) -> float:
+        rate, burst = budget
+        return await self.store.take(key, rate, burst)
+
+    @staticmethod
+    def retry_after(wait: float) -> str:
+        return str(max(1, math.ceil(wait)))
+
+    def rejection(self, wait: float, scope: str) -> HTTPException:
+        RATE_LIMITED.labels(scope).inc()
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": self.retry_after(wait)},
+        )
+
+
+def _create_limiter() -> RateLimiter:
+    if settings.RATE_LIMIT_STORE == "redis":
+        store = RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+    else:
+        store = MemoryBucketStore(settings.RATE_LIMIT_MAX_KEYS)
+
+    return RateLimiter(store, settings.RATE_LIMIT_IP, settings.RATE_LIMIT_ROUTES)
+
+
+rate_limiter = _create_limiter() if settings.RATE_LIMIT_ENABLED else None
+
+
+class RateLimitMiddleware:
+    # Per client IP, before routing, authentication or any database work.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or rate_limiter is None
+            or not rate_limiter.ip_budget
+            or scope["path"] in rate_limiter.exempt_paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+        wait = await rate_limiter.hit(f"ip:{ip}", rate_limiter.ip_budget)
+        if wait:
+            error = rate_limiter.rejection(wait, "ip")
+            response = JSONResponse(
+                {"detail": error.detail}, status_code=error.status_code, headers=error.headers
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
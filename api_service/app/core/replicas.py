@@ -0,0 +1,128 @@
+import hashlib
+import hmac
+import itertools
+import logging
+import math
+import time
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds behind the primary; 0 when the replica has replayed everything it
+# received (an idle replica otherwise reports an ever-growing lag).
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+# Read-your-writes across workers and hosts: after a commit the response
+# carries a signed "user id + wall-clock time of the write" token, as a
+# cookie and a header. The client sends either back; while the token is
+# younger than sticky_seconds that user's reads go to the primary.
+STICKY_COOKIE = "last_write"
+STICKY_HEADER = "x-last-write"
+
+
+class ReplicaSet:
+
+    def __init__(self, engines: list[Engine], max_lag: float, sticky_seconds: float, secret: str):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self._secret = secret.encode()
+        self.names = [e.url.render_as_string(hide_password=True) for e in engines]
+        self.healthy: list[Engine] = list(engines)
+        self.lag: dict[str, Optional[float]] = {}
+        self._next = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def pick(self) -> Optional[Engine]:
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    def _sign(self, payload: str) -> str:
+        return hmac.new(self._secret, payload.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def write_token(self, user_id: int) -> str:
+        payload = f"{user_id}.{int(time.time() * 1000)}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def is_sticky(self, user_id: Optional[int], token: Optional[str]) -> bool:
+        if user_id is None or not token:
+            return False
+        payload, _, signature = token.rpartition(".")
+        token_user, _, written_ms = payload.partition(".")
+        if token_user != str(user_id) or not written_ms.isdigit():
+            return False
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return False
+        return time.time() - int(written_ms) / 1000 < self.sticky_seconds
+
+    def status(self) -> list[dict]:
+        return [
+            {
+                "replica": name,
+                "healthy": engine in self.healthy,
+                "lag_seconds": self.lag.get(name),
+            }
+            for engine, name in zip(self.engines, self.names)
+        ]
+
+    def check(self):
+        healthy = []
+        for engine, name in zip(self.engines, self.names):
+            try:
+                with engine.connect() as conn:
+                    lag = float(conn.exec_driver_sql(REPLICA_LAG_SQL).scalar())
+            except Exception as e:
+                logger.warning("Replica unreachable | replica=%s | error=%s", name, e)
+                self.lag[name] = None
+                continue
+
+            self.lag[name] = lag
+            if lag <= self.max_lag:
+                healthy.append(engine)
+            else:
+                logger.warning("Replica lagging | replica=%s | lag=%.1fs", name, lag)
+
+        self.healthy = healthy
+
+
+# Sends the token of a request that committed a write (request.state.last_write,
+# set by the session) back to the client.
+class StickyReadsMiddleware:
+
+    def __init__(self, app, max_age: float):
+        self.app = app
+        self.max_age = math.ceil(max_age)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message):
+            token = state.get("last_write")
+            if message["type"] == "http.response.start" and token:
+                headers = list(message.get("headers", []))
+                headers.append((STICKY_HEADER.encode(), token.encode()))
+                headers.append((
+                    b"set-cookie",
+                    f"{STICKY_COOKIE}={token}; Max-Age={self.max_age}; Path=/; "
+                    f"HttpOnly; SameSite=Lax".encode(),
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,3 +1,9 @@
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -9,3 +15,29 @@ def hash_password(password: str) -> str:
 
 def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
+
+
+# Processor callbacks carry "X-Signature: t=<unix time>,v1=<hex HMAC-SHA256 of
+# '<t>.<body>'>"; the timestamp bounds how long a captured body can be replayed.
+def verify_callback_signature(body: bytes, signature: Optional[str], secret: str, tolerance: int):
+    try:
+        parts = dict(item.split("=", 1) for item in (signature or "").split(","))
+        timestamp = int(parts["t"])
+        received = parts["v1"]
+    except (KeyError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid signature"
+        )
+
+    if abs(time.time() - timestamp) > tolerance:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Signature expired"
+        )
+
+    expected = hmac.new(
+        secret.encode(), str(timestamp).encode() + b"." + body, hashlib.sha256
+    ).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid signature"
+        )
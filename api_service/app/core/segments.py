@@ -0,0 +1,219 @@
+import json
+import mmap
+import os
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+# Segment file layout (all integers little endian):
+#
+#   b"PAYSEG01" | u64 header length | header JSON | padding to 8 bytes
+#   column blocks        zlib(null flags + encoded values), one per column
+#   id index             int64[rows], ids in ascending order (row order)
+#   user index           int64[rows] user ids ascending + int64[rows] row numbers
+#
+# Column blocks are decompressed on demand; both indexes are read in place
+# through the memory map, so a lookup touches a few pages of the file.
+MAGIC = b"PAYSEG01"
+SUFFIX = ".pseg"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _pad(length: int) -> bytes:
+    return b"\0" * (-length % 8)
+
+
+def _encode_column(kind: str, values: list) -> bytes:
+    nulls = bytes(1 if v is None else 0 for v in values)
+
+    if kind == "int":
+        payload = array("q", (0 if v is None else int(v) for v in values)).tobytes()
+    elif kind == "float":
+        payload = array("d", (0.0 if v is None else float(v) for v in values)).tobytes()
+    elif kind == "bool":
+        payload = bytes(1 if v else 0 for v in values)
+    elif kind == "datetime":
+        micros = array("q")
+        for v in values:
+            if v is None:
+                micros.append(0)
+                continue
+            if v.tzinfo is None:
+                v = v.replace(tzinfo=timezone.utc)
+            delta = v - _EPOCH
+            micros.append((delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds)
+        payload = micros.tobytes()
+    else:
+        encoded = [
+            b"" if v is None else (v.value if isinstance(v, Enum) else str(v)).encode()
+            for v in values
+        ]
+        offsets = array("I", [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        payload = offsets.tobytes() + b"".join(encoded)
+
+    return zlib.compress(nulls + payload, 6)
+
+
+def _decode_column(kind: str, block: bytes, rows: int) -> list:
+    raw = zlib.decompress(block)
+    nulls, payload = raw[:rows], raw[rows:]
+
+    if kind == "int":
+        values = array("q", payload).tolist()
+    elif kind == "float":
+        values = array("d", payload).tolist()
+    elif kind == "bool":
+        values = [bool(b) for b in payload]
+    elif kind == "datetime":
+        values = [
+            datetime.fromtimestamp(us / 1_000_000, timezone.utc)
+            for us in array("q", payload)
+        ]
+    else:
+        offsets = array("I", payload[: (rows + 1) * 4])
+        blob = payload[(rows + 1) * 4:]
+        values = [blob[offsets[i]:offsets[i + 1]].decode() for i in range(rows)]
+
+    return [None if null else value for null, value in zip(nulls, values)]
+
+
+def write_segment(
+    path: Path,
+    table: str,
+    columns: list[tuple[str, str]],
+    rows: list[dict],
+    user_key: str,
+):
+    rows = sorted(rows, key=lambda r: r["id"])
+    count = len(rows)
+
+    blocks = []
+    column_meta = []
+    offset = 0
+    for name, kind in columns:
+        block = _encode_column(kind, [r[name] for r in rows])
+        blocks.append(block + _pad(len(block)))
+        column_meta.append({"name": name, "type": kind, "offset": offset, "length": len(block)})
+        offset += len(blocks[-1])
+
+    ids = array("q", (r["id"] for r in rows)).tobytes()
+    user_pairs = sorted((r[user_key], i) for i, r in enumerate(rows))
+    user_ids = array("q", (u for u, _ in user_pairs)).tobytes()
+    user_rows = array("q", (i for _, i in user_pairs)).tobytes()
+
+    header = json.dumps(
+        {
+            "table": table,
+            "rows": count,
+            "min_id": rows[0]["id"] if rows else None,
+            "max_id": rows[-1]["id"] if rows else None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "columns": column_meta,
+            "id_index": offset,
+            "user_index": offset + len(ids),
+        }
+    ).encode()
+
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        f.write(_pad(16 + len(header)))
+        for block in blocks:
+            f.write(block)
+        f.write(ids)
+        f.write(user_ids)
+        f.write(user_rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_user_range(path: Path) -> Optional[tuple[int, int]]:
+    # Lowest and highest user id in a segment: the ends of its sorted user
+    # index, read without mapping the file. None for an empty segment.
+    with open(path, "rb") as f:
+        if f.read(8) != MAGIC:
+            raise ValueError(f"{path} is not a segment file")
+        header_length = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_length))
+        rows = header["rows"]
+        if not rows:
+            return None
+        start = 16 + header_length + len(_pad(16 + header_length)) + header["user_index"]
+        f.seek(start)
+        first = int.from_bytes(f.read(8), "little", signed=True)
+        f.seek(start + (rows - 1) * 8)
+        last = int.from_bytes(f.read(8), "little", signed=True)
+    return first, last
+
+
+class SegmentReader:
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:8] != MAGIC:
+            raise ValueError(f"{path} is not a segment file")
+
+        header_length = int.from_bytes(self._mm[8:16], "little")
+        header = json.loads(self._mm[16:16 + header_length])
+        self._data = 16 + header_length + len(_pad(16 + header_length))
+
+        self.table = header["table"]
+        self.rows = header["rows"]
+        self.min_id = header["min_id"]
+        self.max_id = header["max_id"]
+        self.columns = header["columns"]
+
+        view = memoryview(self._mm)
+        size = self.rows * 8
+        start = self._data + header["id_index"]
+        self._ids = view[start:start + size].cast("q")
+        start = self._data + header["user_index"]
+        self._user_ids = view[start:start + size].cast("q")
+        self._user_rows = view[start + size:start + 2 * size].cast("q")
+
+        self._decoded: dict[str, list] = {}
+
+    def _column(self, meta: dict) -> list:
+        values = self._decoded.get(meta["name"])
+        if values is None:
+            start = self._data + meta["offset"]
+            block = self._mm[start:start + meta["length"]]
+            values = self._decoded[meta["name"]] = _decode_column(meta["type"], block, self.rows)
+        return values
+
+    def _row(self, index: int) -> dict:
+        return {meta["name"]: self._column(meta)[index] for meta in self.columns}
+
+    def get(self, record_id: int) -> Optional[dict]:
+        index = bisect_left(self._ids, record_id)
+        if index < self.rows and self._ids[index] == record_id:
+            return self._row(index)
+        return None
+
+    def for_user(self, user_id: int) -> list[dict]:
+        lo = bisect_left(self._user_ids, user_id)
+        hi = bisect_right(self._user_ids, user_id)
+        return [self._row(self._user_rows[i]) for i in range(lo, hi)]
+
+    def drop_cache(self):
+        self._decoded.clear()
+
+    def close(self):
+        self._ids.release()
+        self._user_ids.release()
+        self._user_rows.release()
+        self._mm.close()
+        self._file.close()
@@ -0,0 +1,82 @@
+import zlib
+from typing import Optional
+
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.dml import Insert
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+from sqlalchemy.sql.schema import Column
+
+# A user and everything they own (profile, cards, payments) live on one shard,
+# so joins and foreign keys stay local. Every shard's sequences start at
+# <shard index + 1> and step by the same stride (database/shards.sql), which
+# makes any id, from any of these tables, carry its shard:
+#
+#   shard = (id - 1) % stride
+#
+# Ids never collide across shards, routing by id or user_id needs no
+# directory lookup, and adding shards (up to the stride) moves no rows. New
+# users are placed by a stable hash of their email.
+SHARDED_TABLES = {"users", "profiles", "cards", "payments"}
+SHARD_KEYS = {"id", "user_id"}
+
+
+def _comparisons(statement):
+    # column = value / column IN (values) anywhere in the statement, including
+    # subqueries, EXISTS and the SELECT of an INSERT ... SELECT.
+    for element in visitors.iterate(statement):
+        if not isinstance(element, BinaryExpression):
+            continue
+        if element.operator not in (operators.eq, operators.in_op):
+            continue
+        left, right = element.left, element.right
+        if isinstance(left, BindParameter):
+            left, right = right, left
+        if isinstance(left, Column) and isinstance(right, BindParameter):
+            yield left, element.operator, right.effective_value
+
+
+class ShardMap:
+
+    def __init__(self, count: int, stride: int):
+        if not 0 < count <= stride:
+            raise ValueError(f"Between 1 and {stride} shards are supported, got {count}")
+        self.count = count
+        self.stride = stride
+
+    def for_id(self, record_id: int) -> int:
+        shard = (int(record_id) - 1) % self.stride
+        # An id from a shard that is not configured here matches nothing;
+        # shard 0 answers "not found" for it.
+        return shard if shard < self.count else 0
+
+    def place(self, email: str) -> int:
+        return zlib.crc32(email.strip().lower().encode()) % self.count
+
+    def for_instance(self, instance) -> int:
+        if instance.__tablename__ == "users":
+            return self.for_id(instance.id) if instance.id else self.place(instance.email)
+        return self.for_id(instance.user_id)
+
+    def route(self, statement) -> list[int]:
+        found: set[int] = set()
+        email: Optional[str] = None
+
+        for column, operator, value in _comparisons(statement):
+            table = getattr(column.table, "name", None)
+            if table in SHARDED_TABLES and column.name in SHARD_KEYS:
+                values = value if operator is operators.in_op else [value]
+                found.update(self.for_id(v) for v in values)
+            elif table == "users" and column.name == "email":
+                email = value
+
+        if found:
+            return sorted(found)
+
+        if isinstance(statement, Insert):
+            # A new user: the INSERT's duplicate check compares the email.
+            if statement.table.name == "users" and email is not None:
+                return [self.place(email)]
+            raise ValueError(f"No shard key in INSERT INTO {statement.table.name}")
+
+        # No id or user_id to go by: ask every shard.
+        return list(range(self.count))
@@ -0,0 +1,163 @@
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# Re-explain a statement at most this often.
+EXPLAIN_REFRESH_SECONDS = 600
+# Plain EXPLAIN only plans the statement, so writes can be explained too;
+# ANALYZE would run it again, with its side effects (FOR UPDATE locks,
+# nextval, advisory locks, pg_notify, the write itself).
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(statement: str) -> str:
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def find_caller() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_globals.get("__name__", "").startswith("app.services."):
+            return frame.f_code.co_qualname
+        frame = frame.f_back
+    return "unknown"
+
+
+class SlowQueryStats:
+    __slots__ = (
+        "normalized_sql",
+        "caller",
+        "calls",
+        "total_ms",
+        "max_ms",
+        "last_seen",
+        "explain",
+        "explained_at",
+    )
+
+    def __init__(self, normalized_sql: str, caller: str):
+        self.normalized_sql = normalized_sql
+        self.caller = caller
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_seen: Optional[datetime] = None
+        self.explain: Optional[str] = None
+        self.explained_at = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "normalized_sql": self.normalized_sql,
+            "caller": self.caller,
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "last_seen": self.last_seen,
+            "explain": self.explain,
+        }
+
+
+class SlowQueryLog:
+
+    def __init__(self, threshold_ms: float, explain_sample_rate: float, max_entries: int):
+        self.threshold = threshold_ms / 1000
+        self.explain_sample_rate = explain_sample_rate
+        self.max_entries = max_entries
+        self._entries: dict[tuple, SlowQueryStats] = {}
+        self._lock = threading.Lock()
+        self._explaining = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+
+    # Called from the after_cursor_execute hook once a statement has already
+    # crossed the threshold, so the fast path never reaches this method.
+    def record(self, engine: Engine, statement: str, parameters, executemany: bool, elapsed: float):
+        normalized = normalize_sql(statement)
+        key = (normalized, find_caller())
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    smallest = min(self._entries, key=lambda k: self._entries[k].total_ms)
+                    del self._entries[smallest]
+                entry = self._entries[key] = SlowQueryStats(*key)
+
+            elapsed_ms = elapsed * 1000
+            entry.calls += 1
+            entry.total_ms += elapsed_ms
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.last_seen = datetime.now(timezone.utc)
+
+            should_explain = (
+                not executemany
+                and normalized.upper().startswith(EXPLAINABLE)
+                and key not in self._explaining
+                and now - entry.explained_at > EXPLAIN_REFRESH_SECONDS
+                and random.random() < self.explain_sample_rate
+            )
+            if should_explain:
+                self._explaining.add(key)
+
+        logger.warning(
+            "Slow query | caller=%s | duration_ms=%.1f | sql=%s",
+            key[1],
+            elapsed_ms,
+            normalized,
+        )
+
+        if should_explain:
+            self._executor.submit(self._explain, engine, key, statement, parameters)
+
+    def _explain(self, engine: Engine, key: tuple, statement: str, parameters):
+        try:
+            with engine.connect() as conn:
+                conn.info["explain"] = True
+                try:
+                    rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).scalars().all()
+                    conn.rollback()
+                finally:
+                    conn.info.pop("explain", None)
+            plan = "\n".join(rows)
+        except Exception:
+            logger.exception("EXPLAIN failed for slow query")
+            plan = None
+
+        with self._lock:
+            self._explaining.discard(key)
+            entry = self._entries.get(key)
+            if entry is not None and plan is not None:
+                entry.explain = plan
+                entry.explained_at = time.monotonic()
+
+    def top(self, limit: int) -> list[dict]:
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: e.total_ms, reverse=True)
+            return [e.to_dict() for e in entries[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
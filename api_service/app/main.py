@@ -1,12 +1,38 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from fastapi.responses import RedirectResponse
-
-from app.core.logging import setup_logging
-from app.core.database import create_db_and_tables
+from payments_common.logging import setup_logging
+from payments_common.metrics import MetricsMiddleware, mark_process_dead, metrics_response
+from payments_common.tracing import TracingMiddleware
+
+from app.core.cache import listen_entity_changes
+from app.core.config import settings
+from app.core.database import (
+    create_db_and_tables,
+    engine,
+    monitor_replicas,
+    replicas,
+    shard_engines,
+    shards,
+)
+from app.core.events import listen_payment_events, payment_events
+from app.core.metrics import monitor_runtime
+from app.core.partitions import maintain_payment_partitions
+from app.core.processor_pool import processor_pool
+from app.core.rate_limit import RateLimitMiddleware, rate_limiter
+from app.core.replicas import StickyReadsMiddleware
+from app.services.archive_service import archive_periodically
+from app.services.processor_client import (
+    PaymentProcessorClient,
+    monitor_processors,
+    payment_batcher,
+)
+from app.services.rate_limit_service import RateLimitService
+from app.services.reconciler_service import reconcile_periodically
 
 from app.routes import (
     auth_router,
@@ -14,12 +40,20 @@ from app.routes import (
     profile_router,
     card_router,
     payment_router,
+    admin_router,
+    ws_router,
 )
 
 # --------------------------------------------------
 # 🔧 Logging
 # --------------------------------------------------
-setup_logging()
+setup_logging(
+    settings.LOG_LEVEL,
+    settings.LOG_QUEUE_SIZE,
+    settings.LOG_SAMPLING,
+    settings.LOG_RATE_LIMITS,
+    levels={"sqlalchemy.engine": settings.SQL_LOG_LEVEL},
+)
 logger = logging.getLogger(__name__)
 
 
@@ -31,8 +65,60 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Starting payment system API...")
     create_db_and_tables()
     logger.info("📦 Database initialized successfully")
+    tasks = [
+        asyncio.create_task(monitor_runtime(engine, settings.METRICS_MONITOR_INTERVAL)),
+    ]
+    # Every shard has its own payment partitions and its own NOTIFY channels.
+    for shard_engine in shard_engines:
+        conninfo = shard_engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        tasks.append(
+            asyncio.create_task(
+                maintain_payment_partitions(
+                    shard_engine,
+                    settings.PAYMENT_PARTITIONS_AHEAD,
+                    settings.PARTITION_MAINTENANCE_INTERVAL,
+                )
+            )
+        )
+        tasks.append(asyncio.create_task(listen_payment_events(payment_events, conninfo)))
+        if settings.ENTITY_CACHE_ENABLED:
+            tasks.append(asyncio.create_task(listen_entity_changes(conninfo)))
+    if shards:
+        logger.info("🧩 Sharding enabled: %d shards", shards.count)
+    if replicas:
+        tasks.append(
+            asyncio.create_task(monitor_replicas(settings.REPLICA_CHECK_INTERVAL))
+        )
+        logger.info("📚 Read replicas enabled: %d", len(replicas.engines))
+    if len(processor_pool) > 1:
+        tasks.append(
+            asyncio.create_task(monitor_processors(settings.PROCESSOR_CHECK_INTERVAL))
+        )
+        logger.info("⚖️ Processor load balancing enabled: %d endpoints", len(processor_pool))
+    if settings.PROCESSOR_BATCH_SIZE > 1:
+        logger.info(
+            "📦 Processor micro-batching enabled: up to %d payments, %.1f ms linger",
+            settings.PROCESSOR_BATCH_SIZE,
+            settings.PROCESSOR_BATCH_LINGER_MS,
+        )
+    if settings.RECONCILE_ENABLED:
+        tasks.append(
+            asyncio.create_task(reconcile_periodically(settings.RECONCILE_INTERVAL))
+        )
+    if settings.ARCHIVE_ENABLED:
+        tasks.append(asyncio.create_task(archive_periodically(settings.ARCHIVE_INTERVAL)))
+        logger.info("🗄️ Soft-delete archival enabled: %s", settings.ARCHIVE_DIR)
     yield
     logger.info("🛑 Shutting down payment system API...")
+    for task in tasks:
+        task.cancel()
+    if rate_limiter is not None:
+        await rate_limiter.store.close()
+    await payment_batcher.close()
+    await PaymentProcessorClient.close()
+    mark_process_dead()
 
 
 # --------------------------------------------------
@@ -45,7 +131,29 @@ app = FastAPI(
 )
 
 # --------------------------------------------------
-# 🌐 CORS
+# 🚦 Rate limiting (per IP; per-route budgets are a router dependency)
+# --------------------------------------------------
+app.add_middleware(RateLimitMiddleware)
+
+# --------------------------------------------------
+# 📌 Read-your-writes token for replica routing
+# --------------------------------------------------
+if replicas:
+    app.add_middleware(StickyReadsMiddleware, max_age=settings.REPLICA_STICKY_SECONDS)
+
+# --------------------------------------------------
+# 📊 Metrics & Tracing
+# --------------------------------------------------
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(
+    TracingMiddleware,
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    trust_sampled=settings.TRACE_TRUST_UPSTREAM,
+)
+
+# --------------------------------------------------
+# 🌐 CORS (added last, so it is the outermost middleware and responses
+# written by the ones inside it, like the rate limiter's 429, get its headers)
 # --------------------------------------------------
 app.add_middleware(
     CORSMiddleware,
@@ -58,11 +166,14 @@ app.add_middleware(
 # --------------------------------------------------
 # 🔗 Routers
 # --------------------------------------------------
-app.include_router(auth_router.router)
-app.include_router(user_router.router)
-app.include_router(profile_router.router)
-app.include_router(card_router.router)
-app.include_router(payment_router.router)
+rate_limited = [Depends(RateLimitService.limit_route)]
+app.include_router(auth_router.router, dependencies=rate_limited)
+app.include_router(user_router.router, dependencies=rate_limited)
+app.include_router(profile_router.router, dependencies=rate_limited)
+app.include_router(card_router.router, dependencies=rate_limited)
+app.include_router(payment_router.router, dependencies=rate_limited)
+app.include_router(admin_router.router, dependencies=rate_limited)
+app.include_router(ws_router.router)
 
 logger.info("🔗 API routers registered successfully")
 
@@ -75,6 +186,14 @@ def health():
     return {"status": "ok"}
 
 
+# --------------------------------------------------
+# 📊 Metrics
+# --------------------------------------------------
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
 # --------------------------------------------------
 # 🔄 Redirect Docs
 # --------------------------------------------------
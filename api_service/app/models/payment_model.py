@@ -28,7 +28,7 @@ class Payment(SQLModel, table=True):
     status: PaymentStatus = Field(default=PaymentStatus.pending)
     status_reason: Optional[str] = None
 
-    processor_reference: Optional[str] = None
+    processor_reference: Optional[str] = Field(default=None, index=True)
     idempotency_key: Optional[str] = Field(default=None, index=True)
 
     processed_at: Optional[datetime] = None
@@ -2,4 +2,6 @@ from .user_router import *
 from .card_router import *
 from .payment_router import *
 from .auth_router import *
-from .profile_router import *
\ No newline at end of file
+from .profile_router import *
+from .admin_router import *
+from .ws_router import *
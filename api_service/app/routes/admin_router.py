@@ -0,0 +1,99 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+from typing import List, Literal, Optional
+from app.models import User
+from app.services import AuthService, ArchiveService, ReconcilerService, SearchService
+from app.schemas import (
+    ArchiveRunRead,
+    ProcessorStatusRead,
+    ReconcilerRunRead,
+    ReplicaStatusRead,
+    SlowQueryRead,
+    UserSearchRead,
+)
+from app.core.database import get_read_session, replicas, slow_query_log
+from app.core.processor_pool import processor_pool
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/search", response_model=List[UserSearchRead])
+def search_users(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    session: Session = Depends(get_read_session),
+    current_user: User = Depends(AuthService.require_admin),
+):
+    return SearchService.search(session, q, limit, offset)
+
+
+@router.get("/slow-queries", response_model=List[SlowQueryRead])
+def list_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    current_user: User = Depends(AuthService.require_admin),
+):
+    return slow_query_log.top(limit)
+
+
+@router.delete("/slow-queries", status_code=204)
+def reset_slow_queries(
+    current_user: User = Depends(AuthService.require_admin),
+):
+    slow_query_log.reset()
+
+
+@router.get("/replicas", response_model=List[ReplicaStatusRead])
+def list_replicas(
+    current_user: User = Depends(AuthService.require_admin),
+):
+    return replicas.status()
+
+
+@router.get("/processors", response_model=List[ProcessorStatusRead])
+def list_processors(
+    current_user: User = Depends(AuthService.require_admin),
+):
+    return processor_pool.status()
+
+
+@router.get("/reconciler", response_model=Optional[ReconcilerRunRead])
+def get_reconciler_run(
+    current_user: User = Depends(AuthService.require_admin),
+):
+    return ReconcilerService.last_run or None
+
+
+@router.post("/reconciler/run", response_model=ReconcilerRunRead)
+async def run_reconciler(
+    current_user: User = Depends(AuthService.require_admin),
+):
+    return await ReconcilerService.run()
+
+
+ArchiveTable = Literal["payments", "cards", "profiles", "users"]
+
+
+@router.post("/archive/run", response_model=ArchiveRunRead)
+def run_archive(
+    current_user: User = Depends(AuthService.require_admin),
+):
+    return ArchiveService.run()
+
+
+@router.get("/archive/{table}")
+def list_archived(
+    table: ArchiveTable,
+    user_id: int,
+    current_user: User = Depends(AuthService.require_admin),
+) -> List[dict]:
+    return ArchiveService.list_archived(table, user_id)
+
+
+@router.get("/archive/{table}/{record_id}")
+def get_archived(
+    table: ArchiveTable,
+    record_id: int,
+    current_user: User = Depends(AuthService.require_admin),
+) -> dict:
+    return ArchiveService.get_archived(table, record_id)
@@ -5,14 +5,14 @@ from typing import List
 from app.models import User
 from app.services import AuthService, CardService
 from app.schemas import CardCreate, CardRead, CardUpdate
-from app.core.database import get_session
+from app.core.database import get_session, get_read_session
 
 router = APIRouter(prefix="/cards", tags=["Cards"])
 
 
 @router.get("/", response_model=List[CardRead])
 def list_cards(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(AuthService.get_current_user),
 ):
     return CardService.list_cards(session, current_user)
@@ -21,7 +21,7 @@ def list_cards(
 @router.get("/{card_id}", response_model=CardRead)
 def get_card(
     card_id: int,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(AuthService.get_current_user),
 ):
     return CardService.get_card(session, card_id, current_user)
@@ -1,27 +1,54 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from pydantic import ValidationError
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 from app.models import User
-from app.services import AuthService, PaymentService
-from app.schemas import PaymentCreate, PaymentRead
-from app.core.database import get_session
+from app.services import AuthService, PaymentService, PaymentEventService
+from app.schemas import PaymentCreate, PaymentRead, ProcessorCallback
+from app.core.config import settings
+from app.core.database import get_session, get_read_session
+from app.core.security import verify_callback_signature
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
 
 @router.get("/", response_model=List[PaymentRead])
 def list_payments(
-    session: Session = Depends(get_session),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    processor_reference: Optional[str] = None,
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(AuthService.get_current_user),
 ):
     service = PaymentService(session)
-    return service.list_payments(current_user)
+    return service.list_payments(
+        current_user, created_from, created_to, processor_reference
+    )
+
+
+@router.get("/events")
+def payment_events(
+    last_event_id: Optional[str] = Header(None),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(AuthService.get_current_user),
+):
+    user_id = current_user.id
+    # The stream stays open for as long as the client listens; give the
+    # connection used for authentication back to the pool now.
+    session.close()
+    return StreamingResponse(
+        PaymentEventService.sse_stream(user_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{payment_id}", response_model=PaymentRead)
 def get_payment(
     payment_id: int,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(AuthService.get_current_user),
 ):
     service = PaymentService(session)
@@ -46,3 +73,30 @@ def delete_payment(
 ):
     service = PaymentService(session)
     return service.delete_payment(payment_id, current_user)
+
+
+# Called by the payment processor in callback mode; authenticated by the
+# HMAC signature over the raw body instead of a user token.
+@router.post("/callback", response_model=PaymentRead)
+async def payment_callback(
+    request: Request,
+    x_signature: Optional[str] = Header(None),
+    session: Session = Depends(get_session),
+):
+    body = await request.body()
+    verify_callback_signature(
+        body,
+        x_signature,
+        settings.CALLBACK_SECRET or settings.INTERNAL_SECRET_KEY,
+        settings.CALLBACK_TOLERANCE_SECONDS,
+    )
+    try:
+        callback = ProcessorCallback.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False),
+        )
+
+    service = PaymentService(session)
+    return service.apply_callback(callback)
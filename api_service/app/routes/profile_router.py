@@ -5,14 +5,14 @@ from app.models import User
 from app.services.auth_service import AuthService
 from app.services.profile_service import ProfileService
 from app.schemas import ProfileCreate, ProfileUpdate, ProfileRead
-from app.core.database import get_session
+from app.core.database import get_session, get_read_session
 
 router = APIRouter(prefix="/profiles", tags=["Profiles"])
 
 
 @router.get("/", response_model=List[ProfileRead])
 def list_profiles(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(AuthService.require_admin),
 ):
     return ProfileService.list_profiles(session, current_user)
@@ -20,7 +20,7 @@ def list_profiles(
 
 @router.get("/me", response_model=ProfileRead)
 def my_profile(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(AuthService.get_current_user),
 ):
     return ProfileService.get_profile(session, current_user.id, current_user)
@@ -29,7 +29,7 @@ def my_profile(
 @router.get("/{user_id}", response_model=ProfileRead)
 def get_profile(
     user_id: int,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(AuthService.get_current_user),
 ):
     return ProfileService.get_profile(session, user_id, current_user)
@@ -1,20 +1,25 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
 from sqlmodel import Session
-from typing import List
+from typing import List, Optional, Union
 from app.models import User
 from app.services import AuthService, UserService
-from app.schemas import UserRead, UserUpdate
-from app.core.database import get_session
+from app.schemas import UserRead, UserStatsRead, UserSummaryRead, UserUpdate
+from app.core.database import get_session, get_read_session
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
 
-@router.get("/", response_model=List[UserRead])
+# with_stats adds active_cards, payments and last_payment_at to each user, one
+# page (limit, default 50) at a time.
+@router.get("/", response_model=Union[List[UserStatsRead], List[UserRead]])
 def list_users(
-    session: Session = Depends(get_session),
+    with_stats: bool = False,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after_id: int = Query(0, ge=0),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(AuthService.require_admin),
 ):
-    return UserService.list_users(session, current_user)
+    return UserService.list_users(session, current_user, with_stats, limit, after_id)
 
 
 @router.get("/me", response_model=UserRead)
@@ -25,12 +30,22 @@ def read_me(current_user: User = Depends(AuthService.get_current_user)):
 @router.get("/{user_id}", response_model=UserRead)
 def get_user(
     user_id: int,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(AuthService.require_admin),
 ):
     return UserService.get_by_id(session, user_id)
 
 
+@router.get("/{user_id}/summary", response_model=UserSummaryRead)
+def get_user_summary(
+    user_id: int,
+    payments_limit: int = Query(10, ge=1, le=100),
+    session: Session = Depends(get_read_session),
+    current_user: User = Depends(AuthService.require_admin),
+):
+    return UserService.get_summary(session, user_id, payments_limit)
+
+
 @router.put("/{user_id}", response_model=UserRead)
 def update_user(
     user_id: int,
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, Query, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+from app.services import AuthService, PaymentEventService
+from app.core.database import new_session
+
+router = APIRouter(prefix="/ws", tags=["Events"])
+
+
+def _authenticate(token: str) -> int:
+    with new_session() as session:
+        return AuthService.get_user_from_token(session, token).id
+
+
+# Browsers cannot set headers on a WebSocket handshake, so the access token
+# comes in the query string.
+@router.websocket("/payments")
+async def payment_events(
+    websocket: WebSocket,
+    token: str = Query(...),
+    last_event_id: Optional[str] = Query(None),
+):
+    try:
+        # Token check and user lookup are blocking; keep them off the event loop.
+        user_id = await run_in_threadpool(_authenticate, token)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+        return
+
+    await websocket.accept()
+    await PaymentEventService.websocket_session(websocket, user_id, last_event_id)
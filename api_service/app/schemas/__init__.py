@@ -2,3 +2,5 @@ from .user_schemas import *
 from .profile_schemas import *
 from .card_schemas import *
 from .payment_schemas import *
+from .admin_schemas import *
+from .summary_schemas import *
@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import SQLModel
+
+
+class SlowQueryRead(SQLModel):
+    normalized_sql: str
+    caller: str
+    calls: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    last_seen: Optional[datetime]
+    explain: Optional[str]
+
+
+class ReplicaStatusRead(SQLModel):
+    replica: str
+    healthy: bool
+    lag_seconds: Optional[float]
+
+
+class ProcessorStatusRead(SQLModel):
+    endpoint: str
+    healthy: bool
+    ejected_seconds: Optional[float]
+    outstanding: int
+    requests: int
+    errors: int
+    latency_ms: Optional[float]
+
+
+class UserSearchRead(SQLModel):
+    user_id: int
+    email: str
+    role: str
+    is_active: bool
+    name: Optional[str]
+    last_name: Optional[str]
+    ci: Optional[str]
+    phone: Optional[str]
+    # True when the query is a prefix of the email, CI or phone; otherwise
+    # score is the trigram similarity (0-1) of the closest field.
+    prefix: bool
+    score: float
+
+
+class ArchiveRunRead(SQLModel):
+    payments: int
+    cards: int
+    profiles: int
+    users: int
+
+
+class ReconcilerRunRead(SQLModel):
+    started_at: datetime
+    locked: bool
+    stale: int
+    resolved: int
+    resubmitted: int
+    manual_review: int
+    in_flight: int
+    error: int
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 from sqlmodel import SQLModel
 from app.models import PaymentStatus
 
@@ -29,3 +29,12 @@ class PaymentRead(SQLModel):
     processed_at: Optional[datetime]
     
     created_at: datetime
+
+
+class ProcessorCallback(SQLModel):
+    payment_id: int
+    idempotency_key: str
+    status: Literal["approved", "rejected"]
+    reference: Optional[str] = None
+    reason: Optional[str] = None
+    processed_at: datetime
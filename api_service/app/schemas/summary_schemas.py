@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlmodel import SQLModel
+from app.models import PaymentStatus
+from .user_schemas import UserRead
+from .profile_schemas import ProfileRead
+from .card_schemas import CardRead
+from .payment_schemas import PaymentRead
+
+
+class PaymentTotalRead(SQLModel):
+    status: PaymentStatus
+    currency: str
+    count: int
+    amount: float
+
+
+class UserSummaryRead(SQLModel):
+    user: UserRead
+    profile: Optional[ProfileRead]
+    cards: List[CardRead]
+    recent_payments: List[PaymentRead]
+    payment_totals: List[PaymentTotalRead]
+
+
+class UserStatsRead(UserRead):
+    active_cards: int
+    payments: int
+    last_payment_at: Optional[datetime]
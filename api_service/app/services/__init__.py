@@ -3,4 +3,9 @@ from .user_service import UserService
 from .profile_service import ProfileService
 from .card_service import CardService
 from .payment_service import PaymentService
+from .payment_event_service import PaymentEventService
 from .processor_client import PaymentProcessorClient
+from .archive_service import ArchiveService
+from .reconciler_service import ReconcilerService
+from .rate_limit_service import RateLimitService
+from .search_service import SearchService
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Boolean, DateTime, Float, Integer, delete, exists
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.database import run_pipeline, shard_engines
+from app.core.segments import SUFFIX, SegmentReader, read_user_range, write_segment
+from app.models import Card, Payment, Profile, User
+
+logger = logging.getLogger(__name__)
+
+# Children first so foreign keys never point at an archived row.
+ARCHIVE_MODELS = {
+    "payments": Payment,
+    "cards": Card,
+    "profiles": Profile,
+    "users": User,
+}
+
+
+def _still_referenced(model):
+    if model is Card:
+        return exists().where(Payment.card_id == Card.id)
+    if model is User:
+        return (
+            exists().where(Card.user_id == User.id)
+            | exists().where(Payment.user_id == User.id)
+            | exists().where(Profile.user_id == User.id)
+        )
+    return None
+
+
+def _column_kind(column) -> str:
+    if isinstance(column.type, Boolean):
+        return "bool"
+    if isinstance(column.type, Integer):
+        return "int"
+    if isinstance(column.type, Float):
+        return "float"
+    if isinstance(column.type, DateTime):
+        return "datetime"
+    return "str"
+
+
+def _columns(model) -> list[tuple[str, str]]:
+    return [(c.name, _column_kind(c)) for c in model.__table__.columns]
+
+
+def _user_key(model) -> str:
+    return "id" if model is User else "user_id"
+
+
+class ArchiveStore:
+    # Open segment readers, most recently used last, capped to keep the number
+    # of mapped files and decoded columns bounded. A reader evicted while
+    # another thread is still reading it is closed by the last one to finish.
+
+    def __init__(self, root: Path, max_open: int = 64):
+        self.root = root
+        self.max_open = max_open
+        self._readers: OrderedDict[Path, SegmentReader] = OrderedDict()
+        self._refs: dict[SegmentReader, int] = {}
+        self._evicted: set[SegmentReader] = set()
+        # Segments are immutable, so their user id range is read once.
+        self._user_ranges: dict[Path, Optional[tuple[int, int]]] = {}
+        self._lock = threading.Lock()
+
+    def segment_paths(self, table: str) -> list[Path]:
+        directory = self.root / table
+        if not directory.exists():
+            return []
+        return sorted(directory.glob(f"*{SUFFIX}"))
+
+    def new_segment_path(self, table: str, min_id: int, max_id: int) -> Path:
+        directory = self.root / table
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        return directory / f"{min_id:012d}-{max_id:012d}-{stamp}{SUFFIX}"
+
+    @contextmanager
+    def _reader(self, path: Path):
+        with self._lock:
+            reader = self._readers.get(path)
+            if reader is not None:
+                self._readers.move_to_end(path)
+            else:
+                reader = self._readers[path] = SegmentReader(path)
+                if len(self._readers) > self.max_open:
+                    _, evicted = self._readers.popitem(last=False)
+                    if self._refs.get(evicted):
+                        self._evicted.add(evicted)
+                    else:
+                        evicted.close()
+            self._refs[reader] = self._refs.get(reader, 0) + 1
+
+        try:
+            yield reader
+        finally:
+            with self._lock:
+                self._refs[reader] -= 1
+                if not self._refs[reader]:
+                    del self._refs[reader]
+                    if reader in self._evicted:
+                        self._evicted.discard(reader)
+                        reader.close()
+
+    def _user_range(self, path: Path) -> Optional[tuple[int, int]]:
+        if path not in self._user_ranges:
+            self._user_ranges[path] = read_user_range(path)
+        return self._user_ranges[path]
+
+    def get(self, table: str, record_id: int) -> Optional[dict]:
+        for path in self.segment_paths(table):
+            # File names carry the id range, so most segments are skipped
+            # without opening them.
+            min_id, max_id = (int(part) for part in path.name.split("-")[:2])
+            if min_id <= record_id <= max_id:
+                with self._reader(path) as reader:
+                    record = reader.get(record_id)
+                if record is not None:
+                    return record
+        return None
+
+    def for_user(self, table: str, user_id: int) -> list[dict]:
+        records = []
+        for path in self.segment_paths(table):
+            user_range = self._user_range(path)
+            if user_range is None or not user_range[0] <= user_id <= user_range[1]:
+                continue
+            with self._reader(path) as reader:
+                records.extend(reader.for_user(user_id))
+        return records
+
+
+archive_store = ArchiveStore(Path(settings.ARCHIVE_DIR))
+
+
+class ArchiveService:
+
+    @staticmethod
+    def _archive_batch(
+        engine: Engine, model, table: str, cutoff: datetime, batch_size: int
+    ) -> int:
+        statement = (
+            select(model)
+            .where(model.deleted_at != None, model.deleted_at < cutoff)
+            .order_by(model.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        referenced = _still_referenced(model)
+        if referenced is not None:
+            statement = statement.where(~referenced)
+
+        with Session(engine) as session:
+            rows = session.exec(statement).all()
+            if not rows:
+                return 0
+
+            records = [r.model_dump() for r in rows]
+            ids = [r["id"] for r in records]
+            path = archive_store.new_segment_path(table, min(ids), max(ids))
+            write_segment(path, table, _columns(model), records, _user_key(model))
+
+            try:
+                run_pipeline(session, delete(model).where(model.id.in_(ids)), commit=True)
+            except Exception:
+                path.unlink(missing_ok=True)
+                raise
+
+        logger.info("Archived %d %s into %s", len(ids), table, path.name)
+        return len(ids)
+
+    @staticmethod
+    def run(
+        min_age_days: int = settings.ARCHIVE_MIN_AGE_DAYS,
+        batch_size: int = settings.ARCHIVE_BATCH_SIZE,
+    ) -> dict:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=min_age_days)
+        archived = {}
+        for table, model in ARCHIVE_MODELS.items():
+            total = 0
+            # One shard at a time: ids never collide across shards, so their
+            # segments share the table's directory.
+            for engine in shard_engines:
+                while True:
+                    count = ArchiveService._archive_batch(
+                        engine, model, table, cutoff, batch_size
+                    )
+                    total += count
+                    if count < batch_size:
+                        break
+            archived[table] = total
+        return archived
+
+    @staticmethod
+    def get_archived(table: str, record_id: int) -> dict:
+        record = archive_store.get(table, record_id)
+        if record is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Archived record not found"
+            )
+        record.pop("hashed_password", None)
+        return record
+
+    @staticmethod
+    def list_archived(table: str, user_id: int) -> List[dict]:
+        records = archive_store.for_user(table, user_id)
+        for record in records:
+            record.pop("hashed_password", None)
+        return records
+
+
+async def archive_periodically(interval: float):
+    while True:
+        try:
+            archived = await asyncio.to_thread(ArchiveService.run)
+            if any(archived.values()):
+                logger.info("Archive run finished | %s", archived)
+        except Exception:
+            logger.exception("Archive run failed")
+        await asyncio.sleep(interval)
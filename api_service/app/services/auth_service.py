@@ -2,7 +2,7 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 from passlib.context import CryptContext
 from jose import jwt, JWTError
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session, select
 
@@ -11,6 +11,7 @@ from .user_service import UserService
 from app.core.config import settings
 from app.core.database import get_session
 from app.core.security import verify_password
+from payments_common.tracing import span
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -54,11 +55,12 @@ class AuthService:
     def decode_access_token(token: str) -> int:
 
         try:
-            payload = jwt.decode(
-                token,
-                settings.SECRET_KEY,
-                algorithms=[settings.JWT_ALGORITHM],
-            )
+            with span("jwt"):
+                payload = jwt.decode(
+                    token,
+                    settings.SECRET_KEY,
+                    algorithms=[settings.JWT_ALGORITHM],
+                )
 
             user_id = payload.get("sub")
 
@@ -78,10 +80,21 @@ class AuthService:
 
     @staticmethod
     def get_current_user(
+        request: Request,
         token: str = Depends(oauth2_scheme),
         session: Session = Depends(get_session),
     ) -> User:
 
+        with span("auth"):
+            user = AuthService.get_user_from_token(session, token)
+
+            # Used by the replica router for read-your-writes stickiness.
+            request.state.user_id = user.id
+            return user
+
+    @staticmethod
+    def get_user_from_token(session: Session, token: str) -> User:
+
         user_id = AuthService.decode_access_token(token)
 
         user = UserService.get_by_id(session, user_id)
@@ -1,11 +1,19 @@
+from sqlalchemy import exists
 from sqlmodel import Session, select
 from fastapi import HTTPException, status
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional
 import re
 
 from app.models import Card, User, CardBrand
 from app.schemas import CardCreate, CardRead, CardUpdate
+from app.core.cache import card_cache
+from app.core.database import (
+    fetch_returning,
+    insert_returning,
+    primary_reads,
+    update_returning,
+)
 
 
 class CardService:
@@ -73,51 +81,58 @@ class CardService:
         )
 
         brand = CardService.detect_brand(card_number)
+        last_four, masked = CardService.mask_card(card_number)
 
-        last_four = card_number[-4:]
-        existing = session.exec(
-            select(Card).where(
+        statement = insert_returning(
+            Card,
+            {
+                "user_id": data.user_id,
+                "card_holder_name": data.card_holder_name,
+                "brand": brand,
+                "last_four": last_four,
+                "masked_number": masked,
+                "expiration_month": data.expiration_month,
+                "expiration_year": data.expiration_year,
+                "is_active": True,
+                "created_at": datetime.now(timezone.utc),
+            },
+            unless=exists().where(
                 Card.user_id == data.user_id,
                 Card.last_four == last_four,
                 Card.deleted_at == None,
-            )
-        ).first()
+            ),
+        )
+        card = fetch_returning(session, statement, CardRead, commit=True)
 
-        if existing:
+        if card is None:
             raise HTTPException(
                 status_code=409,
                 detail="Card already registered",
             )
 
-        last_four, masked = CardService.mask_card(card_number)
-
-        card = Card(
-            user_id=data.user_id,
-            card_holder_name=data.card_holder_name,
-            brand=brand,
-            last_four=last_four,
-            masked_number=masked,
-            expiration_month=data.expiration_month,
-            expiration_year=data.expiration_year,
-        )
-
-        session.add(card)
-        session.commit()
-        session.refresh(card)
+        return card
 
+    @staticmethod
+    def _load_card(session: Session, card_id: int) -> Optional[CardRead]:
+        with primary_reads(session):
+            card = session.get(Card, card_id)
+        if not card or card.deleted_at:
+            return None
         return CardRead.model_validate(card)
 
     @staticmethod
     def get_card(session: Session, card_id: int, current_user: User) -> CardRead:
-        card = session.get(Card, card_id)
+        card = card_cache.get_or_load(
+            card_id, lambda: CardService._load_card(session, card_id)
+        )
 
-        if not card or card.deleted_at:
+        if card is None:
             raise HTTPException(404, "Card not found")
 
         if current_user.role != "admin" and card.user_id != current_user.id:
             raise HTTPException(403, "Permission denied")
 
-        return CardRead.model_validate(card)
+        return card
 
     @staticmethod
     def list_cards(session: Session, current_user: User) -> List[CardRead]:
@@ -131,19 +146,25 @@ class CardService:
 
         return [CardRead.model_validate(c) for c in cards]
 
+    # Ownership lives in the WHERE clause; the card is only read again when the
+    # UPDATE matched nothing, to tell "not found" from "not yours".
+    @staticmethod
+    def _owned(card_id: int, current_user: User) -> list:
+        conditions = [Card.id == card_id, Card.deleted_at == None]
+        if current_user.role != "admin":
+            conditions.append(Card.user_id == current_user.id)
+        return conditions
+
+    @staticmethod
+    def _raise_not_updated(session: Session, card_id: int, current_user: User):
+        CardService.get_card(session, card_id, current_user)
+        raise HTTPException(404, "Card not found")
+
     @staticmethod
     def update_card(
         session: Session, card_id: int, data: CardUpdate, current_user: User
     ) -> CardRead:
 
-        card = session.get(Card, card_id)
-
-        if not card or card.deleted_at:
-            raise HTTPException(404, "Card not found")
-
-        if current_user.role != "admin" and card.user_id != current_user.id:
-            raise HTTPException(403, "Permission denied")
-
         update_data = data.model_dump(exclude_unset=True)
 
         forbidden = {"last_four", "masked_number"}
@@ -154,36 +175,41 @@ class CardService:
             )
 
         if "expiration_month" in update_data or "expiration_year" in update_data:
-            month = update_data.get("expiration_month", card.expiration_month)
-            year = update_data.get("expiration_year", card.expiration_year)
+            month = update_data.get("expiration_month")
+            year = update_data.get("expiration_year")
+            if month is None or year is None:
+                # Only half of the date was sent: the other half is stored.
+                card = CardService.get_card(session, card_id, current_user)
+                month = card.expiration_month if month is None else month
+                year = card.expiration_year if year is None else year
             CardService.validate_expiration(month, year)
 
-        for k, v in update_data.items():
-            setattr(card, k, v)
-
-        card.updated_at = datetime.now(timezone.utc)
+        statement = update_returning(
+            Card,
+            *CardService._owned(card_id, current_user),
+            **update_data,
+            updated_at=datetime.now(timezone.utc),
+        )
+        card = fetch_returning(session, statement, CardRead, commit=True)
+        card_cache.invalidate(card_id)
 
-        session.add(card)
-        session.commit()
-        session.refresh(card)
+        if card is None:
+            CardService._raise_not_updated(session, card_id, current_user)
 
-        return CardRead.model_validate(card)
+        return card
 
     @staticmethod
     def delete_card(session: Session, card_id: int, current_user: User) -> CardRead:
 
-        card = session.get(Card, card_id)
-
-        if not card or card.deleted_at:
-            raise HTTPException(404, "Card not found")
-
-        if current_user.role != "admin" and card.user_id != current_user.id:
-            raise HTTPException(403, "Permission denied")
-
-        card.deleted_at = datetime.now(timezone.utc)
+        statement = update_returning(
+            Card,
+            *CardService._owned(card_id, current_user),
+            deleted_at=datetime.now(timezone.utc),
+        )
+        card = fetch_returning(session, statement, CardRead, commit=True)
+        card_cache.invalidate(card_id)
 
-        session.add(card)
-        session.commit()
-        session.refresh(card)
+        if card is None:
+            CardService._raise_not_updated(session, card_id, current_user)
 
-        return CardRead.model_validate(card)
+        return card
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.core.config import settings
+from app.core.events import PaymentEvent, payment_events
+
+
+def _sse(event: PaymentEvent) -> str:
+    return f"id: {event.id}\nevent: payment\ndata: {json.dumps(event.data)}\n\n"
+
+
+class PaymentEventService:
+
+    @staticmethod
+    async def sse_stream(user_id: int, last_event_id: Optional[str]) -> AsyncIterator[str]:
+        subscription, resync = payment_events.subscribe(user_id, last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            if resync:
+                yield "event: resync\ndata: {}\n\n"
+
+            async for event in subscription.events(settings.EVENTS_HEARTBEAT_SECONDS):
+                if event is None:
+                    yield ": heartbeat\n\n"
+                else:
+                    yield _sse(event)
+        finally:
+            payment_events.unsubscribe(subscription)
+
+    @staticmethod
+    async def websocket_session(
+        websocket: WebSocket, user_id: int, last_event_id: Optional[str]
+    ):
+        subscription, resync = payment_events.subscribe(user_id, last_event_id)
+
+        # Nothing is expected from the client; reading is only how a closed
+        # connection is noticed between events.
+        async def wait_for_disconnect():
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+
+        receiver = asyncio.create_task(wait_for_disconnect())
+        try:
+            if resync:
+                await websocket.send_json({"type": "resync"})
+
+            async for event in subscription.events(settings.EVENTS_HEARTBEAT_SECONDS):
+                if receiver.done():
+                    return
+                if event is None:
+                    await websocket.send_json({"type": "heartbeat"})
+                else:
+                    await websocket.send_json(
+                        {"type": "payment", "id": event.id, "data": event.data}
+                    )
+
+            # Buffer overflowed: ask the client to reconnect with its last id.
+            await websocket.close(code=1013)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
+            payment_events.unsubscribe(subscription)
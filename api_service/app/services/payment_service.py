@@ -1,13 +1,24 @@
+from sqlalchemy import exists, insert, literal
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 from fastapi import HTTPException, status
 from datetime import datetime, timezone
 from typing import Optional, List
 import logging
 
-from app.models import Payment, PaymentStatus, User
-from app.schemas import PaymentCreate, PaymentRead
+from app.models import Card, Payment, PaymentStatus, User
+from app.schemas import PaymentCreate, PaymentRead, ProcessorCallback
+from app.core.cache import card_cache
+from app.core.config import settings
+from app.core.database import fetch_returning, update_returning
+from app.core.metrics import PAYMENTS
 from .card_service import CardService
-from .processor_client import PaymentProcessorClient
+from .processor_client import PaymentProcessorClient, processor_key
+
+payments = Payment.__table__
+
+# status_reason of pending payments the reconciler will not retry.
+MANUAL_REVIEW = "manual_review"
 
 
 class PaymentService:
@@ -27,6 +38,70 @@ class PaymentService:
                 detail="The payment amount must be greater than 0",
             )
 
+        now = datetime.now(timezone.utc)
+        key = payment_data.idempotency_key
+
+        # One INSERT ... SELECT FROM cards: the card must exist, belong to the
+        # caller (unless admin) and the idempotency key must be unused, or no
+        # row is inserted. The payment belongs to the card's owner, which keeps
+        # it on the owner's shard.
+        source = select(
+            Card.user_id,
+            Card.id,
+            literal(payment_data.amount, payments.c.amount.type),
+            literal(payment_data.currency, payments.c.currency.type),
+            literal(PaymentStatus.pending, payments.c.status.type),
+            literal(key, payments.c.idempotency_key.type),
+            literal(now, payments.c.created_at.type),
+        ).where(Card.id == payment_data.card_id, Card.deleted_at == None)
+        if current_user.role != "admin":
+            source = source.where(Card.user_id == current_user.id)
+        if key:
+            source = source.where(
+                ~exists().where(Payment.idempotency_key == key, Payment.deleted_at == None)
+            )
+        statement = (
+            insert(payments)
+            .from_select(
+                [
+                    "user_id",
+                    "card_id",
+                    "amount",
+                    "currency",
+                    "status",
+                    "idempotency_key",
+                    "created_at",
+                ],
+                source,
+            )
+            .returning(*payments.c)
+        )
+
+        try:
+            payment = fetch_returning(self.session, statement, PaymentRead, commit=True)
+        except IntegrityError:
+            # Lost a race on the same idempotency key.
+            self.session.rollback()
+            payment = None
+
+        if payment is None:
+            self._raise_not_created(payment_data, current_user)
+
+        if settings.PROCESSOR_MODE == "callback":
+            await self.processor_client.submit_payment(
+                payment.id, payment.amount, payment.user_id, payment.card_id
+            )
+            return payment
+
+        result = await self.processor_client.process_payment(
+            payment.amount, payment.id, payment.user_id, payment.card_id
+        )
+        return self.finalize_pending(payment.id, result)
+
+    # Only reached when the INSERT inserted nothing; works out why.
+    def _raise_not_created(self, payment_data: PaymentCreate, current_user: User):
+        # The INSERT just saw the row; a cached copy may be older.
+        card_cache.invalidate(payment_data.card_id)
         card = self.card_service.get_card(
             self.session, payment_data.card_id, current_user
         )
@@ -36,53 +111,81 @@ class PaymentService:
                 detail="The card does not belong to the user",
             )
 
-        if payment_data.idempotency_key:
-            existing = self.session.exec(
-                select(Payment).where(
-                    Payment.idempotency_key == payment_data.idempotency_key,
-                    Payment.deleted_at == None,
-                )
-            ).first()
-
-            if existing:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail={
-                        "message": "Payment with this idempotency key already exists",
-                        "payment_id": existing.id,
-                        "status": existing.status,
-                    },
-                )
-
-        payment = Payment(
-            user_id=current_user.id,
-            card_id=payment_data.card_id,
-            amount=payment_data.amount,
-            currency=payment_data.currency,
-            status=PaymentStatus.pending,
-            idempotency_key=getattr(payment_data, "idempotency_key", None),
+        existing = self.session.exec(
+            select(Payment).where(
+                Payment.idempotency_key == payment_data.idempotency_key,
+                Payment.deleted_at == None,
+            )
+        ).first()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "Payment with this idempotency key already exists",
+                "payment_id": existing.id if existing else None,
+                "status": existing.status if existing else None,
+            },
         )
 
-        self.session.add(payment)
-        self.session.commit()
-        self.session.refresh(payment)
+    def apply_callback(self, callback: ProcessorCallback) -> PaymentRead:
+        if callback.idempotency_key != processor_key(callback.payment_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Idempotency key does not match the payment",
+            )
 
-        result = await self.processor_client.process_payment(payment.amount)
+        return self.finalize_pending(callback.payment_id, callback.model_dump())
 
+    # Used by the synchronous path, callbacks and the reconciler. The
+    # status = 'pending' condition makes concurrent deliveries of the same
+    # result apply it once; a payment that is no longer pending is returned
+    # unchanged. The status change itself is announced by the
+    # payments_notify_status trigger.
+    def finalize_pending(self, payment_id: int, result: dict) -> PaymentRead:
+        now = datetime.now(timezone.utc)
         if result["status"] == "approved":
-            payment.status = PaymentStatus.approved
-            payment.processor_reference = result.get("reference")
-            payment.processed_at = datetime.now(timezone.utc)
+            values = {
+                "status": PaymentStatus.approved,
+                "processor_reference": result.get("reference"),
+                "processed_at": now,
+            }
         else:
-            payment.status = PaymentStatus.rejected
-            payment.status_reason = result.get("reason", "Rejected by processor")
-
-        payment.updated_at = datetime.now(timezone.utc)
-        self.session.add(payment)
-        self.session.commit()
-        self.session.refresh(payment)
+            values = {
+                "status": PaymentStatus.rejected,
+                "status_reason": result.get("reason") or "Rejected by processor",
+            }
+
+        statement = update_returning(
+            Payment,
+            Payment.id == payment_id,
+            Payment.status == PaymentStatus.pending,
+            **values,
+            updated_at=now,
+        )
+        payment = fetch_returning(self.session, statement, PaymentRead, commit=True)
 
-        return PaymentRead.model_validate(payment)
+        if payment is None:
+            current = self.session.get(Payment, payment_id)
+            if not current:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found"
+                )
+            return PaymentRead.model_validate(current)
+
+        PAYMENTS.labels(payment.status.value).inc()
+        return payment
+
+    # The processor has no record of the payment, so nobody can tell whether
+    # it was charged. It stays pending for a person to resolve; a late
+    # callback can still finalise it.
+    def mark_for_review(self, payment_id: int) -> Optional[PaymentRead]:
+        statement = update_returning(
+            Payment,
+            Payment.id == payment_id,
+            Payment.status == PaymentStatus.pending,
+            status_reason=MANUAL_REVIEW,
+            updated_at=datetime.now(timezone.utc),
+        )
+        return fetch_returning(self.session, statement, PaymentRead, commit=True)
 
     def get_payment(self, payment_id: int, current_user: User) -> PaymentRead:
         payment = self.session.get(Payment, payment_id)
@@ -99,31 +202,45 @@ class PaymentService:
 
         return PaymentRead.model_validate(payment)
 
-    def list_payments(self, current_user: User) -> List[PaymentRead]:
+    def list_payments(
+        self,
+        current_user: User,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        processor_reference: Optional[str] = None,
+    ) -> List[PaymentRead]:
         statement = select(Payment).where(Payment.deleted_at == None)
 
         if current_user.role != "admin":
             statement = statement.where(Payment.user_id == current_user.id)
 
+        # Bounds on created_at let Postgres prune monthly partitions.
+        if created_from:
+            statement = statement.where(Payment.created_at >= created_from)
+        if created_to:
+            statement = statement.where(Payment.created_at < created_to)
+        if processor_reference:
+            statement = statement.where(
+                Payment.processor_reference == processor_reference
+            )
+
         payments = self.session.exec(statement).all()
         return [PaymentRead.model_validate(p) for p in payments]
 
     def delete_payment(self, payment_id: int, current_user: User) -> PaymentRead:
-        payment = self.session.get(Payment, payment_id)
-        if not payment or payment.deleted_at:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found"
-            )
+        conditions = [Payment.id == payment_id, Payment.deleted_at == None]
+        if current_user.role != "admin":
+            conditions.append(Payment.user_id == current_user.id)
 
-        if current_user.role != "admin" and payment.user_id != current_user.id:
+        statement = update_returning(
+            Payment, *conditions, deleted_at=datetime.now(timezone.utc)
+        )
+        payment = fetch_returning(self.session, statement, PaymentRead, commit=True)
+
+        if payment is None:
+            self.get_payment(payment_id, current_user)
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You do not have permission to delete this payment",
+                status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found"
             )
 
-        payment.deleted_at = datetime.now(timezone.utc)
-        self.session.add(payment)
-        self.session.commit()
-        self.session.refresh(payment)
-
-        return PaymentRead.model_validate(payment)
+        return payment
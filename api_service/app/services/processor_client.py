@@ -1,37 +1,196 @@
+import asyncio
 import httpx
 from fastapi import HTTPException, status
-from typing import Dict
-import logging
+from typing import Dict, Optional
+import time
 from app.services.auth_service import AuthService
+from payments_common import wire
+from app.core.batcher import MicroBatcher
 from app.core.config import settings
+from app.core.metrics import PROCESSOR_BATCH_ITEMS, PROCESSOR_CALL_LATENCY
+from app.core.processor_pool import ProcessorEndpoint, ProcessorPool, processor_pool
+from payments_common.tracing import span, trace_headers
+
+# Service tokens live 60 s; one is reused for half of that.
+SERVICE_TOKEN_REUSE_SECONDS = 30.0
+
+
+def processor_key(payment_id: int) -> str:
+    return f"payment-{payment_id}"
 
 
 class PaymentProcessorClient:
 
-    def __init__(self, base_url: str = settings.PROCESSOR_URL):
-        self.base_url = base_url.rstrip("/")
+    # Shared by every instance in the worker: keep-alive connections instead
+    # of a TCP (and TLS) handshake per call.
+    _http: Optional[httpx.AsyncClient] = None
+    _token: Optional[str] = None
+    _token_refresh_at: float = 0.0
 
-    async def process_payment(self, amount: float) -> Dict:
+    def __init__(
+        self, pool: ProcessorPool = processor_pool, batcher: Optional[MicroBatcher] = None
+    ):
+        self.pool = pool
+        self.batcher = batcher if batcher is not None else payment_batcher
+
+    @classmethod
+    def http(cls) -> httpx.AsyncClient:
+        if cls._http is None:
+            cls._http = httpx.AsyncClient(
+                timeout=settings.PROCESSOR_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.PROCESSOR_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.PROCESSOR_MAX_CONNECTIONS,
+                ),
+            )
+        return cls._http
 
-        payload = {"amount": amount}
+    @classmethod
+    async def close(cls):
+        if cls._http is not None:
+            await cls._http.aclose()
+            cls._http = None
 
-        internal_token = AuthService.create_service_token(service_name="main-backend")
-        logging.info(f"Generated internal token for payment processor: {internal_token}")
-        logging.info("💛"*85)
-        headers = {
-            "Authorization": f"Bearer {internal_token}",
-            "Content-Type": "application/json",
+    @classmethod
+    def _headers(cls) -> Dict[str, str]:
+        now = time.monotonic()
+        if cls._token is None or now >= cls._token_refresh_at:
+            cls._token = AuthService.create_service_token(service_name="main-backend")
+            cls._token_refresh_at = now + SERVICE_TOKEN_REUSE_SECONDS
+        return {
+            "Authorization": f"Bearer {cls._token}",
+            **trace_headers(),
         }
 
+    @classmethod
+    async def _send(
+        cls, pool: ProcessorPool, endpoint: ProcessorEndpoint, method: str, path: str, **kwargs
+    ) -> httpx.Response:
+        pool.started(endpoint)
+        start = time.perf_counter()
+        ok = False
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/process-payment/",
-                    json=payload,
-                    headers=headers,
+            response = await cls.http().request(method, f"{endpoint.url}{path}", **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            pool.finished(endpoint, time.perf_counter() - start, ok)
+
+    async def _request(
+        self, method: str, path: str, key: Optional[str] = None, **kwargs
+    ) -> httpx.Response:
+        return await self._send(self.pool, self.pool.pick(key), method, path, **kwargs)
+
+    async def _post_payment(
+        self,
+        amount: float,
+        payment_id: Optional[int],
+        user_id: Optional[int],
+        card_id: Optional[int],
+    ) -> httpx.Response:
+        # With a key the processor answers a retry with its first decision.
+        key = processor_key(payment_id) if payment_id is not None else None
+        headers = self._headers()
+
+        if settings.PROCESSOR_WIRE_FORMAT == "binary":
+            headers["Content-Type"] = wire.CONTENT_TYPE
+            headers["Accept"] = f"{wire.CONTENT_TYPE}, application/json"
+            return await self._request(
+                "POST",
+                "/process-payment/",
+                key,
+                content=wire.encode_request(amount, payment_id, key, user_id, card_id),
+                headers=headers,
+            )
+
+        payload = {"amount": amount, "user_id": user_id, "card_id": card_id}
+        if key is not None:
+            payload["payment_id"] = payment_id
+            payload["idempotency_key"] = key
+        return await self._request(
+            "POST", "/process-payment/", key, json=payload, headers=headers
+        )
+
+    # Flush of the micro-batcher: one call for every payment queued for the
+    # same endpoint (picked per payment, so keys keep their instance). Always
+    # JSON; a batch carries the trace context of the payment that sent it.
+    @classmethod
+    async def _post_batch(cls, group: tuple, payloads: list) -> list:
+        pool, endpoint = group
+        PROCESSOR_BATCH_ITEMS.observe(len(payloads))
+        response = await cls._send(
+            pool,
+            endpoint,
+            "POST",
+            "/process-payment/batch",
+            json={"payments": payloads},
+            headers=cls._headers(),
+        )
+        response.raise_for_status()
+
+        items = response.json().get("results")
+        if not isinstance(items, list) or len(items) != len(payloads):
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Invalid response from payment processor",
+            )
+        # Per payment, the same error a single call would have raised.
+        return [
+            item["result"]
+            if item.get("status_code") == status.HTTP_200_OK
+            else HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Payment processor error: {item.get('detail')}",
+            )
+            for item in items
+        ]
+
+    async def _batch_payment(
+        self,
+        amount: float,
+        payment_id: Optional[int],
+        user_id: Optional[int],
+        card_id: Optional[int],
+    ) -> Dict:
+        key = processor_key(payment_id) if payment_id is not None else None
+        payload = {"amount": amount, "user_id": user_id, "card_id": card_id}
+        if key is not None:
+            payload["payment_id"] = payment_id
+            payload["idempotency_key"] = key
+        return await self.batcher.submit((self.pool, self.pool.pick(key)), payload)
+
+    # user_id and card_id feed the processor's velocity rules.
+    async def process_payment(
+        self,
+        amount: float,
+        payment_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        card_id: Optional[int] = None,
+    ) -> Dict:
+
+        start = time.perf_counter()
+        outcome = "error"
+
+        try:
+            with span("processor"):
+                if self.batcher.max_size > 1:
+                    data = await self._batch_payment(amount, payment_id, user_id, card_id)
+                else:
+                    response = await self._post_payment(amount, payment_id, user_id, card_id)
+                    response.raise_for_status()
+                    # Errors come back as JSON whatever the request format.
+                    if response.headers.get("content-type", "").startswith(wire.CONTENT_TYPE):
+                        data = wire.decode_response(response.content)
+                    else:
+                        data = response.json()
+
+            if "status" not in data:
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail="Invalid response from payment processor",
                 )
-                response.raise_for_status()
-                data = response.json()
+
+            outcome = "approved" if data["status"] == "approved" else "rejected"
 
         except httpx.RequestError as e:
             raise HTTPException(
@@ -45,10 +204,117 @@ class PaymentProcessorClient:
                 detail=f"Payment processor error: {e.response.text}",
             )
 
-        if "status" not in data:
+        except wire.WireError:
             raise HTTPException(
                 status_code=status.HTTP_502_BAD_GATEWAY,
                 detail="Invalid response from payment processor",
             )
 
+        finally:
+            PROCESSOR_CALL_LATENCY.labels(outcome).observe(time.perf_counter() - start)
+
         return data
+
+    # Callback mode: the processor queues the charge and answers 202; the
+    # result arrives later on POST /payments/callback.
+    async def submit_payment(
+        self,
+        payment_id: int,
+        amount: float,
+        user_id: Optional[int] = None,
+        card_id: Optional[int] = None,
+    ) -> Dict:
+
+        payload = {
+            "payment_id": payment_id,
+            "idempotency_key": processor_key(payment_id),
+            "amount": amount,
+            "user_id": user_id,
+            "card_id": card_id,
+            "callback_url": settings.CALLBACK_URL,
+        }
+
+        start = time.perf_counter()
+        outcome = "error"
+
+        try:
+            with span("processor", "submit"):
+                response = await self._request(
+                    "POST",
+                    "/process-payment/async",
+                    payload["idempotency_key"],
+                    json=payload,
+                    headers=self._headers(),
+                )
+                response.raise_for_status()
+            outcome = "accepted"
+
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Payment processor unreachable: {e}",
+            )
+
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Payment processor error: {e.response.text}",
+            )
+
+        finally:
+            PROCESSOR_CALL_LATENCY.labels(outcome).observe(time.perf_counter() - start)
+
+        return response.json()
+
+    # Returns None when the processor does not know the job (never received,
+    # expired or lost on restart).
+    async def get_payment_status(self, payment_id: int) -> Optional[Dict]:
+
+        try:
+            key = processor_key(payment_id)
+            response = await self._request(
+                "GET",
+                f"/process-payment/{key}",
+                key,
+                headers=self._headers(),
+            )
+            if response.status_code == status.HTTP_404_NOT_FOUND:
+                return None
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Payment processor unreachable: {e}",
+            )
+
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Payment processor error: {e.response.text}",
+            )
+
+
+payment_batcher = MicroBatcher(
+    PaymentProcessorClient._post_batch,
+    max_size=settings.PROCESSOR_BATCH_SIZE,
+    linger=settings.PROCESSOR_BATCH_LINGER_MS / 1000,
+)
+
+
+async def _check_endpoint(pool: ProcessorPool, endpoint):
+    try:
+        response = await PaymentProcessorClient.http().get(
+            f"{endpoint.url}/health", timeout=min(settings.PROCESSOR_TIMEOUT, 2.0)
+        )
+        healthy = response.status_code == status.HTTP_200_OK
+    except httpx.HTTPError:
+        healthy = False
+    pool.mark_health(endpoint, healthy)
+
+
+async def monitor_processors(interval: float, pool: ProcessorPool = processor_pool):
+    while True:
+        await asyncio.gather(*(_check_endpoint(pool, e) for e in pool.endpoints))
+        await asyncio.sleep(interval)
@@ -1,10 +1,18 @@
+from sqlalchemy import exists
 from sqlmodel import Session, select
 from fastapi import HTTPException, status
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional
 
 from app.models import Profile, User
 from app.schemas import ProfileCreate, ProfileUpdate, ProfileRead
+from app.core.cache import profile_cache
+from app.core.database import (
+    fetch_returning,
+    insert_returning,
+    primary_reads,
+    update_returning,
+)
 
 
 class ProfileService:
@@ -18,10 +26,18 @@ class ProfileService:
             )
         ).first()
 
+    @staticmethod
+    def _load_profile(session: Session, user_id: int) -> Optional[ProfileRead]:
+        with primary_reads(session):
+            profile = ProfileService._get_active_profile(session, user_id)
+        return ProfileRead.model_validate(profile) if profile else None
+
     @staticmethod
     def get_profile(session: Session, user_id: int, current_user: User) -> ProfileRead:
 
-        profile = ProfileService._get_active_profile(session, user_id)
+        profile = profile_cache.get_or_load(
+            user_id, lambda: ProfileService._load_profile(session, user_id)
+        )
 
         if not profile:
             raise HTTPException(404, "Profile not found")
@@ -29,7 +45,7 @@ class ProfileService:
         if current_user.role != "admin" and current_user.id != user_id:
             raise HTTPException(403, "Forbidden")
 
-        return ProfileRead.model_validate(profile)
+        return profile
 
     @staticmethod
     def list_profiles(session: Session, current_user: User) -> List[ProfileRead]:
@@ -48,21 +64,36 @@ class ProfileService:
         session: Session, profile_data: ProfileCreate, current_user: User
     ) -> ProfileRead:
 
-        existing_profile = ProfileService._get_active_profile(session, current_user.id)
+        # The commit expires current_user; reading its id afterwards would
+        # reload it.
+        user_id = current_user.id
+        statement = insert_returning(
+            Profile,
+            {
+                "user_id": user_id,
+                **profile_data.model_dump(exclude_unset=True),
+                "created_at": datetime.now(timezone.utc),
+            },
+            unless=exists().where(
+                Profile.user_id == user_id,
+                Profile.deleted_at == None,
+            ),
+        )
+        profile = fetch_returning(session, statement, ProfileRead, commit=True)
+        # Drops a cached "not found".
+        profile_cache.invalidate(user_id)
 
-        if existing_profile:
+        if profile is None:
             raise HTTPException(400, "Profile already exists")
 
-        profile = Profile(
-            user_id=current_user.id,
-            **profile_data.model_dump(exclude_unset=True),
-        )
+        return profile
 
-        session.add(profile)
-        session.commit()
-        session.refresh(profile)
-
-        return ProfileRead.model_validate(profile)
+    # Non-admins can only touch their own profile, which needs no query; the
+    # lookup only runs to report 404 before 403 as get_profile does.
+    @staticmethod
+    def _check_access(session: Session, user_id: int, current_user: User):
+        if current_user.role != "admin" and current_user.id != user_id:
+            ProfileService.get_profile(session, user_id, current_user)
 
     @staticmethod
     def update_profile(
@@ -72,26 +103,22 @@ class ProfileService:
         current_user: User,
     ) -> ProfileRead:
 
-        profile = ProfileService._get_active_profile(session, user_id)
-
-        if not profile:
-            raise HTTPException(404, "Profile not found")
-
-        if current_user.role != "admin" and current_user.id != user_id:
-            raise HTTPException(403, "Forbidden")
-
-        update_data = profile_data.model_dump(exclude_unset=True)
-
-        for k, v in update_data.items():
-            setattr(profile, k, v)
+        ProfileService._check_access(session, user_id, current_user)
 
-        profile.updated_at = datetime.now(timezone.utc)
+        statement = update_returning(
+            Profile,
+            Profile.user_id == user_id,
+            Profile.deleted_at == None,
+            **profile_data.model_dump(exclude_unset=True),
+            updated_at=datetime.now(timezone.utc),
+        )
+        profile = fetch_returning(session, statement, ProfileRead, commit=True)
+        profile_cache.invalidate(user_id)
 
-        session.add(profile)
-        session.commit()
-        session.refresh(profile)
+        if profile is None:
+            raise HTTPException(404, "Profile not found")
 
-        return ProfileRead.model_validate(profile)
+        return profile
 
     @staticmethod
     def delete_profile(
@@ -100,18 +127,18 @@ class ProfileService:
         current_user: User,
     ) -> ProfileRead:
 
-        profile = ProfileService._get_active_profile(session, user_id)
+        ProfileService._check_access(session, user_id, current_user)
 
-        if not profile:
-            raise HTTPException(404, "Profile not found")
-
-        if current_user.role != "admin" and current_user.id != user_id:
-            raise HTTPException(403, "Forbidden")
-
-        profile.deleted_at = datetime.now(timezone.utc)
+        statement = update_returning(
+            Profile,
+            Profile.user_id == user_id,
+            Profile.deleted_at == None,
+            deleted_at=datetime.now(timezone.utc),
+        )
+        profile = fetch_returning(session, statement, ProfileRead, commit=True)
+        profile_cache.invalidate(user_id)
 
-        session.add(profile)
-        session.commit()
-        session.refresh(profile)
+        if profile is None:
+            raise HTTPException(404, "Profile not found")
 
-        return ProfileRead.model_validate(profile)
+        return profile
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import false, text, tuple_
+from sqlalchemy.engine import Connection
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.database import engine, new_session
+from app.core.metrics import RECONCILER_PAYMENTS, STALE_PENDING_PAYMENTS
+from app.models import Payment, PaymentStatus
+from .payment_service import MANUAL_REVIEW, PaymentService
+from .processor_client import PaymentProcessorClient
+
+logger = logging.getLogger(__name__)
+
+# One pass at a time across all workers and hosts.
+LOCK_SQL = text("SELECT pg_try_advisory_lock(hashtext('payment_reconciler'))")
+UNLOCK_SQL = text("SELECT pg_advisory_unlock(hashtext('payment_reconciler'))")
+
+
+def _try_lock() -> Optional[Connection]:
+    conn = engine.connect()
+    if conn.execute(LOCK_SQL).scalar():
+        conn.commit()
+        return conn
+    conn.close()
+    return None
+
+
+def _unlock(conn: Connection):
+    try:
+        conn.execute(UNLOCK_SQL)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# Keyset pagination over (created_at, id), served by the partial index
+# ix_payments_pending, so every batch is an index range scan however many
+# finalised payments the table holds. With several shards each returns its
+# own first `limit` rows; sorting the union and keeping `limit` of them gives
+# the same batch a single database would.
+def _load_batch(
+    cutoff: datetime, resend_after: Optional[datetime], after: Optional[tuple], limit: int
+) -> list:
+    # resendable: the processor still keeps the payment's idempotency key.
+    resendable = Payment.created_at > resend_after if resend_after else false()
+    statement = (
+        select(
+            Payment.id,
+            Payment.amount,
+            Payment.user_id,
+            Payment.card_id,
+            Payment.created_at,
+            resendable.label("resendable"),
+        )
+        .where(
+            Payment.status == PaymentStatus.pending,
+            Payment.deleted_at == None,
+            Payment.created_at < cutoff,
+            Payment.status_reason.is_distinct_from(MANUAL_REVIEW),
+        )
+        .order_by(Payment.created_at, Payment.id)
+        .limit(limit)
+    )
+    if after is not None:
+        statement = statement.where(tuple_(Payment.created_at, Payment.id) > after)
+
+    with new_session() as session:
+        rows = session.exec(statement).all()
+    return sorted(rows, key=lambda p: (p.created_at, p.id))[:limit]
+
+
+def _apply_result(payment_id: int, result: dict):
+    with new_session() as session:
+        PaymentService(session).finalize_pending(payment_id, result)
+
+
+def _mark_for_review(payment_id: int):
+    with new_session() as session:
+        PaymentService(session).mark_for_review(payment_id)
+
+
+class ReconcilerService:
+
+    last_run: dict = {}
+
+    @staticmethod
+    async def _reconcile(client: PaymentProcessorClient, payment) -> str:
+        payment_id = payment.id
+        try:
+            # Ask first: the processor may have decided already and only the
+            # response or callback was lost.
+            job = await client.get_payment_status(payment_id)
+            if job is None and payment.resendable:
+                # Never received (the call failed before reaching it). The
+                # durable store would still hold the key if it had been, so
+                # sending it again with the same key cannot charge twice.
+                if settings.PROCESSOR_MODE == "callback":
+                    await client.submit_payment(
+                        payment_id, payment.amount, payment.user_id, payment.card_id
+                    )
+                else:
+                    result = await client.process_payment(
+                        payment.amount, payment_id, payment.user_id, payment.card_id
+                    )
+                    await asyncio.to_thread(_apply_result, payment_id, result)
+                return "resubmitted"
+
+            if job is None:
+                # Its record may have expired or been lost with a memory
+                # store: the charge may or may not have happened, and sending
+                # it again could charge twice.
+                logger.error(
+                    "Payment unknown to the processor, needs manual review | payment_id=%s",
+                    payment_id,
+                )
+                await asyncio.to_thread(_mark_for_review, payment_id)
+                return "manual_review"
+
+            if job["state"] != "completed":
+                return "in_flight"
+
+            await asyncio.to_thread(_apply_result, payment_id, job["result"])
+            return "resolved"
+
+        except HTTPException as e:
+            logger.warning(
+                "Reconciliation failed | payment_id=%s | error=%s", payment_id, e.detail
+            )
+            return "error"
+
+    @staticmethod
+    async def run() -> dict:
+        stats = {
+            "started_at": datetime.now(timezone.utc),
+            "locked": False,
+            "stale": 0,
+            "resolved": 0,
+            "resubmitted": 0,
+            "manual_review": 0,
+            "in_flight": 0,
+            "error": 0,
+        }
+
+        lock = await asyncio.to_thread(_try_lock)
+        if lock is None:
+            # Another worker is running a pass.
+            ReconcilerService.last_run = stats
+            return stats
+        stats["locked"] = True
+
+        try:
+            client = PaymentProcessorClient()
+            slots = asyncio.Semaphore(settings.RECONCILE_CONCURRENCY)
+            now = datetime.now(timezone.utc)
+            cutoff = now - timedelta(seconds=settings.RECONCILE_STALE_SECONDS)
+            resend_after = (
+                now - timedelta(seconds=settings.PROCESSOR_JOB_RETENTION_SECONDS)
+                if settings.PROCESSOR_JOB_STORE == "redis"
+                else None
+            )
+
+            async def reconcile(payment):
+                async with slots:
+                    outcome = await ReconcilerService._reconcile(client, payment)
+                stats[outcome] += 1
+                RECONCILER_PAYMENTS.labels(outcome).inc()
+
+            after = None
+            while True:
+                batch = await asyncio.to_thread(
+                    _load_batch, cutoff, resend_after, after, settings.RECONCILE_BATCH_SIZE
+                )
+                if not batch:
+                    break
+                stats["stale"] += len(batch)
+                await asyncio.gather(*(reconcile(p) for p in batch))
+                after = (batch[-1].created_at, batch[-1].id)
+        finally:
+            await asyncio.to_thread(_unlock, lock)
+
+        STALE_PENDING_PAYMENTS.set(stats["stale"])
+        if stats["stale"]:
+            logger.info("Reconciler pass finished | %s", stats)
+        ReconcilerService.last_run = stats
+        return stats
+
+
+async def reconcile_periodically(interval: float):
+    while True:
+        try:
+            await ReconcilerService.run()
+        except Exception:
+            logger.exception("Reconciler pass failed")
+        await asyncio.sleep(interval)
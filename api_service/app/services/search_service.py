@@ -0,0 +1,108 @@
+from sqlalchemy import text
+from sqlmodel import Session
+from typing import List
+
+from app.schemas import UserSearchRead
+
+# Must match the ix_profiles_search_trgm index expression (database/init.sql)
+# token for token, or Postgres will not use the index.
+PROFILE_SEARCH_TEXT = """lower(
+    coalesce(name, '') || ' ' || coalesce(last_name, '') || ' ' ||
+    coalesce(ci, '') || ' ' || coalesce(phone, '')
+)"""
+
+# Each branch reads at most :depth rows in index order: prefix matches from
+# the btree indexes, then the nearest trigram matches from the GiST indexes
+# (KNN, so the cost depends on :depth, not on how many rows match). Prefix
+# branches order with ~<~, the text_pattern_ops order (a plain ORDER BY would
+# sort every match), and break ties by user_id so the rows kept under LIMIT
+# do not depend on the plan. A user found by several branches keeps its best
+# rank.
+SEARCH_SQL = text(
+    f"""
+WITH matches AS (
+    (SELECT id AS user_id, 0 AS rank, 0.0::real AS distance
+     FROM users
+     WHERE deleted_at IS NULL AND lower(email) LIKE :prefix
+     ORDER BY lower(email) USING ~<~
+     LIMIT :depth)
+    UNION ALL
+    (SELECT id, 1, lower(email) <-> :q
+     FROM users
+     WHERE deleted_at IS NULL AND lower(email) % :q
+     ORDER BY lower(email) <-> :q
+     LIMIT :depth)
+    UNION ALL
+    (SELECT user_id, 0, 0.0::real
+     FROM profiles
+     WHERE deleted_at IS NULL AND ci LIKE :raw_prefix
+     ORDER BY ci USING ~<~, user_id
+     LIMIT :depth)
+    UNION ALL
+    (SELECT user_id, 0, 0.0::real
+     FROM profiles
+     WHERE deleted_at IS NULL AND phone LIKE :raw_prefix
+     ORDER BY phone USING ~<~, user_id
+     LIMIT :depth)
+    UNION ALL
+    (SELECT user_id, 0, 0.0::real
+     FROM profiles
+     WHERE deleted_at IS NULL AND lower(name) LIKE :prefix
+     ORDER BY lower(name) USING ~<~, user_id
+     LIMIT :depth)
+    UNION ALL
+    (SELECT user_id, 0, 0.0::real
+     FROM profiles
+     WHERE deleted_at IS NULL AND lower(last_name) LIKE :prefix
+     ORDER BY lower(last_name) USING ~<~, user_id
+     LIMIT :depth)
+    UNION ALL
+    (SELECT user_id, 1, :q <<-> {PROFILE_SEARCH_TEXT}
+     FROM profiles
+     WHERE deleted_at IS NULL AND :q <% {PROFILE_SEARCH_TEXT}
+     ORDER BY :q <<-> {PROFILE_SEARCH_TEXT}
+     LIMIT :depth)
+),
+ranked AS (
+    SELECT user_id, min(rank) AS rank, min(distance) AS distance
+    FROM matches
+    GROUP BY user_id
+)
+SELECT u.id AS user_id, u.email, u.role, u.is_active,
+       p.name, p.last_name, p.ci, p.phone,
+       r.rank = 0 AS prefix, 1 - r.distance AS score
+FROM ranked r
+JOIN users u ON u.id = r.user_id AND u.deleted_at IS NULL
+LEFT JOIN profiles p ON p.user_id = u.id AND p.deleted_at IS NULL
+ORDER BY r.rank, r.distance, u.id
+LIMIT :depth
+"""
+)
+
+
+def _like_prefix(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def search_params(q: str, depth: int) -> dict:
+    q = q.strip()
+    return {
+        "q": q.lower(),
+        "prefix": _like_prefix(q.lower()),
+        "raw_prefix": _like_prefix(q),
+        "depth": depth,
+    }
+
+
+class SearchService:
+
+    @staticmethod
+    def search(session: Session, q: str, limit: int, offset: int) -> List[UserSearchRead]:
+        # Every shard returns its best offset + limit rows; the page is cut
+        # after merging them.
+        params = search_params(q, depth=offset + limit)
+        rows = session.execute(SEARCH_SQL, params).mappings().all()
+
+        rows = sorted(rows, key=lambda r: (not r["prefix"], -r["score"], r["user_id"]))
+        return [UserSearchRead.model_validate(r) for r in rows[offset:offset + limit]]
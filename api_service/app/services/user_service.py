@@ -1,11 +1,29 @@
+from sqlalchemy import exists, func, true
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 from sqlmodel import Session, select
 from fastapi import HTTPException, status
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional, Union
 
-from app.models import User
-from app.schemas import UserCreate, UserRead, UserPasswordReset, UserUpdate
+from app.models import Card, Payment, Profile, User, UserRole
+from app.schemas import (
+    CardRead,
+    PaymentRead,
+    PaymentTotalRead,
+    ProfileRead,
+    UserCreate,
+    UserPasswordReset,
+    UserRead,
+    UserStatsRead,
+    UserSummaryRead,
+    UserUpdate,
+)
 from app.core.security import hash_password, verify_password
+from app.core.database import fetch_returning, insert_returning, shards, update_returning
+
+# Page size of list_users(with_stats=True) when no limit is given.
+STATS_PAGE_SIZE = 50
 
 
 class UserService:
@@ -25,15 +43,144 @@ class UserService:
         return user
 
     @staticmethod
-    def list_users(session: Session, current_user: User) -> List[UserRead]:
-        statement = select(User).where(User.deleted_at == None)
+    def list_users(
+        session: Session,
+        current_user: User,
+        with_stats: bool = False,
+        limit: Optional[int] = None,
+        after_id: int = 0,
+    ) -> Union[List[UserRead], List[UserStatsRead]]:
+        # Keyset pagination on id when a limit is given (always with stats):
+        # pass the last id of a page as after_id.
+        page = select(User).where(User.deleted_at == None)
 
         if current_user.role != "admin":
-            statement = statement.where(User.id == current_user.id)
+            page = page.where(User.id == current_user.id)
+
+        if with_stats:
+            limit = limit or STATS_PAGE_SIZE
+        if limit is not None:
+            page = page.where(User.id > after_id).order_by(User.id).limit(limit)
+
+        if with_stats:
+            return UserService._with_stats(session, page, limit)
 
-        users = session.exec(statement).all()
+        users = session.exec(page).all()
+        if limit is not None:
+            # With shards every shard returns its own first page; keep the
+            # lowest ids of them all.
+            users = sorted(users, key=lambda u: u.id)[:limit]
         return [UserRead.model_validate(u) for u in users]
 
+    # One statement per page whatever its size: the page of users first, then
+    # two LATERAL aggregates per user on that page only (active cards through
+    # ix_cards_user_active, payment count and latest date through
+    # ix_payments_user_active).
+    @staticmethod
+    def _with_stats(session: Session, page, limit: int) -> List[UserStatsRead]:
+        page = page.subquery()
+        user = aliased(User, page)
+
+        cards = (
+            select(func.count().label("active_cards"))
+            .where(Card.user_id == page.c.id, Card.deleted_at == None)
+            .lateral("cards")
+        )
+        payments = (
+            select(
+                func.count().label("payments"),
+                func.max(Payment.created_at).label("last_payment_at"),
+            )
+            .where(Payment.user_id == page.c.id, Payment.deleted_at == None)
+            .lateral("payments")
+        )
+        statement = (
+            select(user, cards.c.active_cards, payments.c.payments, payments.c.last_payment_at)
+            .select_from(user)
+            .join(cards, true())
+            .join(payments, true())
+            .order_by(page.c.id)
+        )
+
+        rows = sorted(session.exec(statement).all(), key=lambda r: r[0].id)[:limit]
+        return [
+            UserStatsRead(
+                **UserRead.model_validate(u).model_dump(),
+                active_cards=active_cards,
+                payments=payment_count,
+                last_payment_at=last_payment_at,
+            )
+            for u, active_cards, payment_count, last_payment_at in rows
+        ]
+
+    # Three statements instead of four endpoints: user + active profile +
+    # per-status/currency payment totals (as a JSON scalar subquery), active
+    # cards, and the latest payments.
+    @staticmethod
+    def get_summary(
+        session: Session, user_id: int, payments_limit: int
+    ) -> UserSummaryRead:
+        grouped = (
+            select(
+                Payment.status,
+                Payment.currency,
+                func.count().label("count"),
+                func.sum(Payment.amount).label("amount"),
+            )
+            .where(Payment.user_id == user_id, Payment.deleted_at == None)
+            .group_by(Payment.status, Payment.currency)
+            .subquery()
+        )
+        totals = (
+            select(
+                func.json_agg(
+                    func.json_build_object(
+                        "status", grouped.c.status,
+                        "currency", grouped.c.currency,
+                        "count", grouped.c.count,
+                        "amount", grouped.c.amount,
+                    )
+                )
+            )
+            .select_from(grouped)
+            .scalar_subquery()
+        )
+
+        row = session.exec(
+            select(User, Profile, totals)
+            .outerjoin(
+                Profile,
+                (Profile.user_id == User.id) & (Profile.deleted_at == None),
+            )
+            .where(User.id == user_id, User.deleted_at == None)
+            .order_by(Profile.id)
+            .limit(1)
+        ).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+            )
+        user, profile, payment_totals = row
+
+        cards = session.exec(
+            select(Card).where(Card.user_id == user_id, Card.deleted_at == None)
+        ).all()
+
+        payments = session.exec(
+            select(Payment)
+            .where(Payment.user_id == user_id, Payment.deleted_at == None)
+            .order_by(Payment.created_at.desc())
+            .limit(payments_limit)
+        ).all()
+
+        return UserSummaryRead(
+            user=UserRead.model_validate(user),
+            profile=ProfileRead.model_validate(profile) if profile else None,
+            cards=[CardRead.model_validate(c) for c in cards],
+            recent_payments=[PaymentRead.model_validate(p) for p in payments],
+            payment_totals=[PaymentTotalRead.model_validate(t) for t in payment_totals or []],
+        )
+
     @staticmethod
     def create_user(
         session: Session, user_data: UserCreate, current_user: User
@@ -44,75 +191,134 @@ class UserService:
                 detail="You do not have permission to create users",
             )
 
-        if UserService.get_by_email(session, user_data.email):
+        # Emails are unique per database; across shards only a lookup on
+        # every shard can tell.
+        if shards and UserService.get_by_email(session, user_data.email):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists"
             )
 
-        user = User(
-            email=user_data.email,
-            hashed_password=hash_password(user_data.password),
+        user = fetch_returning(
+            session,
+            insert_returning(
+                User,
+                {
+                    "email": user_data.email,
+                    "hashed_password": hash_password(user_data.password),
+                    "role": UserRole.user,
+                    "is_active": True,
+                    "created_at": datetime.now(timezone.utc),
+                },
+                unless=exists().where(User.email == user_data.email),
+            ),
+            UserRead,
+            commit=True,
         )
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        return UserRead.model_validate(user)
+
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists"
+            )
+
+        return user
 
     @staticmethod
-    def update_user(
-        session: Session, user_id: int, data: UserUpdate, current_user: User
-    ) -> UserRead:
-        user = UserService.get_by_id(session, user_id)
+    def _owned(user_id: int, current_user: User) -> list:
+        conditions = [User.id == user_id, User.deleted_at == None]
+        if current_user.role != "admin":
+            conditions.append(User.id == current_user.id)
+        return conditions
 
+    # Only reached when an UPDATE matched no row.
+    @staticmethod
+    def _raise_not_updated(
+        session: Session, user_id: int, current_user: User, action: str
+    ):
+        UserService.get_by_id(session, user_id)
         if current_user.role != "admin" and current_user.id != user_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail="You do not have permission to update this user",
+                detail=f"You do not have permission to {action}",
             )
-        if UserService.get_by_email(session, data.email):
+
+    @staticmethod
+    def update_user(
+        session: Session, user_id: int, data: UserUpdate, current_user: User
+    ) -> UserRead:
+        update_data = data.model_dump(exclude_unset=True)
+        conditions = UserService._owned(user_id, current_user)
+
+        if update_data.get("email"):
+            if shards:
+                existing = UserService.get_by_email(session, update_data["email"])
+                if existing and existing.id != user_id:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="User email already exists",
+                    )
+            other = aliased(User)
+            conditions.append(
+                ~exists().where(
+                    other.email == update_data["email"],
+                    other.deleted_at == None,
+                    other.id != user_id,
+                )
+            )
+
+        statement = update_returning(
+            User,
+            *conditions,
+            **update_data,
+            updated_at=datetime.now(timezone.utc),
+        )
+        try:
+            user = fetch_returning(session, statement, UserRead, commit=True)
+        except IntegrityError:
+            # The email belongs to a soft-deleted user (emails are unique).
+            session.rollback()
+            user = None
+
+        if user is None:
+            UserService._raise_not_updated(session, user_id, current_user, "update this user")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User email already exists",
             )
 
-        update_data = data.model_dump(exclude_unset=True)
-
-        for k, v in update_data.items():
-            setattr(user, k, v)
-        user.updated_at = datetime.now(timezone.utc)
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        return UserRead.model_validate(user)
+        return user
 
     @staticmethod
     def delete_user(session: Session, user_id: int, current_user: User) -> UserRead:
-        user = UserService.get_by_id(session, user_id)
+        statement = update_returning(
+            User,
+            *UserService._owned(user_id, current_user),
+            deleted_at=datetime.now(timezone.utc),
+        )
+        user = fetch_returning(session, statement, UserRead, commit=True)
 
-        if current_user.role != "admin" and current_user.id != user_id:
+        if user is None:
+            UserService._raise_not_updated(session, user_id, current_user, "delete this user")
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You do not have permission to delete this user",
+                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
             )
 
-        user.deleted_at = datetime.now(timezone.utc)
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        return UserRead.model_validate(user)
+        return user
 
     @staticmethod
     def change_password(
         session: Session, user_id: int, user_data: UserPasswordReset, current_user: User
     ) -> UserRead:
-        user = UserService.get_by_id(session, user_id)
-
         if current_user.role != "admin" and current_user.id != user_id:
+            UserService.get_by_id(session, user_id)
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You do not have permission to change this user's password",
             )
 
+        # The caller's own row is already in the identity map from
+        # authentication, so this is normally not a query.
+        user = UserService.get_by_id(session, user_id)
+
         if user_data.current_password and not verify_password(
             user_data.current_password, user.hashed_password
         ):
@@ -121,11 +327,18 @@ class UserService:
                 detail="Incorrect current password",
             )
 
-        user.hashed_password = hash_password(user_data.new_password)
-        user.updated_at = datetime.now(timezone.utc)
+        statement = update_returning(
+            User,
+            User.id == user_id,
+            User.deleted_at == None,
+            hashed_password=hash_password(user_data.new_password),
+            updated_at=datetime.now(timezone.utc),
+        )
+        user = fetch_returning(session, statement, UserRead, commit=True)
 
-        session.add(user)
-        session.commit()
-        session.refresh(user)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+            )
 
-        return UserRead.model_validate(user)
+        return user
@@ -0,0 +1,68 @@
+"""HTTP load generator used to compare 1 vs N workers.
+
+    python -m benchmarks.load_test --url http://127.0.0.1:8000/health \
+        --concurrency 64 --duration 30 [--token <jwt>]
+
+httpx is itself CPU bound, so run the generator on other cores than the
+server (e.g. ``taskset``) or use ``wrk``/``hey`` for absolute numbers.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def worker(client: httpx.AsyncClient, url: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(url)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+def percentile(values: list, pct: float) -> float:
+    index = min(int(len(values) * pct), len(values) - 1)
+    return values[index]
+
+
+async def run(url: str, concurrency: int, duration: float, token: str | None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = [], []
+
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30.0) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(worker(client, url, deadline, latencies, errors) for _ in range(concurrency))
+        )
+
+    latencies.sort()
+    print(f"requests     {len(latencies)}")
+    print(f"errors       {len(errors)}")
+    print(f"throughput   {len(latencies) / duration:.1f} req/s")
+    if latencies:
+        print(f"latency p50  {percentile(latencies, 0.50) * 1000:.2f} ms")
+        print(f"latency p95  {percentile(latencies, 0.95) * 1000:.2f} ms")
+        print(f"latency p99  {percentile(latencies, 0.99) * 1000:.2f} ms")
+        print(f"latency mean {statistics.fmean(latencies) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--token")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.duration, args.token))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Micro-benchmarks for the per-request hot functions, with regression gates.
+
+    python -m benchmarks.micro run [--output benchmarks/baselines/micro.json]
+    python -m benchmarks.micro compare [--baseline benchmarks/baselines/micro.json] \
+        [--threshold 0.10] [--filter luhn]
+
+``run`` stores the results as a JSON baseline; ``compare`` measures again and
+exits with status 1 when any function got slower than its baseline by more
+than the threshold (a fraction: 0.10 = 10 %), and with status 2 when there is
+no baseline yet. Baselines only make sense on the machine that recorded them,
+so they are not committed: record and compare on the same host (or CI runner
+type).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.models import Payment, PaymentStatus
+from app.core.rate_limit import MemoryBucketStore
+from app.schemas import PaymentRead
+from app.services.auth_service import AuthService
+from app.services.card_service import CardService
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "micro.json"
+
+CARD_NUMBER = "4111111111111111"
+
+
+def _payment_rows(count: int) -> list[Payment]:
+    now = datetime.now(timezone.utc)
+    return [
+        Payment(
+            id=i,
+            user_id=1,
+            card_id=1,
+            amount=125.5,
+            currency="USD",
+            status=PaymentStatus.approved,
+            processor_reference="REF-01J9Z3W7X8Y2Q4R5S6T7V8W9XA",
+            idempotency_key=f"key-{i}",
+            processed_at=now,
+            created_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def cases() -> dict:
+    token = AuthService.create_access_token(1)
+    rows = _payment_rows(100)
+    buckets = MemoryBucketStore(max_keys=100000)
+
+    return {
+        "card.validate_luhn": lambda: CardService.validate_luhn(CARD_NUMBER),
+        "card.detect_brand": lambda: CardService.detect_brand(CARD_NUMBER),
+        "card.mask_card": lambda: CardService.mask_card(CARD_NUMBER),
+        "auth.create_access_token": lambda: AuthService.create_access_token(1),
+        "auth.decode_access_token": lambda: AuthService.decode_access_token(token),
+        "auth.create_service_token": lambda: AuthService.create_service_token("api"),
+        # Budget high enough that every call is allowed; target: under 1 µs.
+        "rate_limit.take": lambda: buckets.take_now("user:1", 1e9, 1e9),
+        # A list page's worth of ORM rows.
+        "schemas.payment_read_x100": lambda: [PaymentRead.model_validate(r) for r in rows],
+    }
+
+
+def measure(function, repeat: int) -> dict:
+    timer = timeit.Timer(function)
+    # Enough calls per sample for ~0.2 s, then the best of `repeat` samples:
+    # the minimum is the run least disturbed by the rest of the machine.
+    number, _ = timer.autorange()
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "ns_per_call": min(samples) * 1e9,
+        "max_ns_per_call": max(samples) * 1e9,
+        "calls_per_sample": number,
+    }
+
+
+def run_cases(name_filter: str | None, repeat: int) -> dict:
+    results = {}
+    for name, function in cases().items():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = measure(function, repeat)
+        print(f"{name:<32} {results[name]['ns_per_call']:12.0f} ns/call", flush=True)
+    return results
+
+
+def host() -> str:
+    return f"{platform.platform()}, {os.cpu_count()} CPU(s), {platform.processor() or 'unknown CPU'}"
+
+
+def run(args) -> int:
+    results = run_cases(args.filter, args.repeat)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(
+        json.dumps(
+            {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "host": host(),
+                "results": results,
+            },
+            indent=2,
+        )
+        + "\n"
+    )
+    print(f"baseline written to {args.output}")
+    return 0
+
+
+def compare(args) -> int:
+    if not args.baseline.exists():
+        print(
+            f"no baseline at {args.baseline}; baselines are not committed because they only hold "
+            f"on the machine that recorded them. Record one on this host first:\n"
+            f"    python -m benchmarks.micro run --output {args.baseline}",
+            file=sys.stderr,
+        )
+        return 2
+
+    recorded = json.loads(args.baseline.read_text())
+    baseline = recorded["results"]
+    if recorded.get("host", host()) != host():
+        print(f"warning: baseline recorded on {recorded['host']}, comparing on {host()}", file=sys.stderr)
+    results = run_cases(args.filter, args.repeat)
+
+    regressions = []
+    print(f"\n{'function':<32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<32} {'-':>12} {result['ns_per_call']:12.0f}      new")
+            continue
+        before = baseline[name]["ns_per_call"]
+        change = result["ns_per_call"] / before - 1
+        flag = "  REGRESSION" if change > args.threshold else ""
+        print(f"{name:<32} {before:12.0f} {result['ns_per_call']:12.0f} {change:+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="measure and store a baseline")
+    run_parser.add_argument("--output", type=Path, default=DEFAULT_BASELINE)
+
+    compare_parser = subparsers.add_parser("compare", help="measure and check against a baseline")
+    compare_parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--filter", help="only functions whose name contains this")
+        sub.add_argument("--repeat", type=int, default=7)
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == "run" else compare(args))
+
+
+if __name__ == "__main__":
+    main()
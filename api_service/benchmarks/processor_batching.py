@@ -0,0 +1,80 @@
+"""Throughput vs added latency of micro-batched processor calls.
+
+    python -m benchmarks.processor_batching --url http://processor:9000 \
+        [--payments 20000] [--concurrency 500] [--configs 1:0 8:1 32:2 128:5]
+
+Sends the same synchronous payments through ``PaymentProcessorClient`` once
+per ``size:linger_ms`` pair (size 1 = one call per payment, as without
+batching) and reports payments/s and the latency each caller saw. The
+processor must be running this version; tokens are signed with this
+service's settings (.env). Payments carry no idempotency key, so the
+processor's job table is not filled.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from app.core.batcher import MicroBatcher
+from app.core.processor_pool import ProcessorPool
+from app.services.processor_client import PaymentProcessorClient
+from benchmarks.load_test import percentile
+
+
+async def run(url: str, size: int, linger_ms: float, payments: int, concurrency: int) -> str:
+    pool = ProcessorPool([url], eject_after=1_000_000, eject_seconds=0.0)
+    batcher = MicroBatcher(PaymentProcessorClient._post_batch, size, linger_ms / 1000)
+    client = PaymentProcessorClient(pool, batcher)
+    rng = random.Random(42)
+    remaining = iter(range(payments))
+    latencies, errors = [], []
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                await client.process_payment(
+                    round(rng.uniform(1, 500), 2),
+                    user_id=rng.randrange(1, 100000),
+                    card_id=rng.randrange(1, 200000),
+                )
+            except Exception as e:
+                errors.append(type(e).__name__)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await batcher.close()
+
+    latencies.sort()
+    return (
+        f"{size:5d} {linger_ms:7.1f}  {payments / elapsed:10.0f}  "
+        f"{percentile(latencies, 0.50) * 1000:8.2f}  {percentile(latencies, 0.99) * 1000:8.2f}  "
+        f"{statistics.fmean(latencies) * 1000:8.2f}  {len(errors):6d}"
+    )
+
+
+async def main_async(args):
+    # Warm-up: connections, token and the processor's first requests.
+    await run(args.url, 1, 0.0, min(args.payments, 500), args.concurrency)
+    print("size  linger   payments/s  p50 (ms)  p99 (ms)  mean (ms)  errors")
+    for config in args.configs:
+        size, linger_ms = config.split(":")
+        print(await run(args.url, int(size), float(linger_ms), args.payments, args.concurrency))
+    await PaymentProcessorClient.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--payments", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--configs", nargs="+", default=["1:0", "8:1", "32:2", "128:5"])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
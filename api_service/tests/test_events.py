@@ -0,0 +1,53 @@
+from app.core.events import EventBroker, PaymentEvent
+
+
+def event(ts: int, payment_id: int, user_id: int = 1) -> PaymentEvent:
+    return PaymentEvent((ts, payment_id), user_id, {"payment_id": payment_id})
+
+
+def broker(history_size: int = 10) -> EventBroker:
+    events = EventBroker(history_size=history_size, buffer_size=10)
+    events.connected(events.add_source(), (100, 0))
+    return events
+
+
+def test_resyncs_ids_from_before_the_listener_started():
+    # A fresh worker: history is far from full but starts at 100.
+    events = broker()
+    events.publish(event(150, 1))
+
+    subscription, resync = events.subscribe(1, "50-7")
+    assert resync
+    assert subscription.queue.get_nowait().key == (150, 1)
+
+
+def test_replays_ids_the_history_covers():
+    events = broker()
+    events.publish(event(150, 1))
+    events.publish(event(160, 2))
+
+    subscription, resync = events.subscribe(1, "150-1")
+    assert not resync
+    assert subscription.queue.get_nowait().key == (160, 2)
+    assert subscription.queue.empty()
+
+
+def test_resyncs_ids_dropped_from_history():
+    events = broker(history_size=2)
+    for ts in (150, 160, 170):
+        events.publish(event(ts, ts))
+
+    # 150 was dropped: a client that saw it misses nothing, an older one might.
+    assert events.subscribe(1, "140-1")[1]
+    assert not events.subscribe(1, "150-150")[1]
+
+
+def test_resyncs_while_a_listener_is_disconnected():
+    events = broker()
+    other = events.add_source()
+    assert events.subscribe(1, "150-1")[1]
+
+    events.connected(other, (120, 0))
+    assert not events.subscribe(1, "150-1")[1]
+    events.disconnected(other)
+    assert events.subscribe(1, "150-1")[1]
@@ -0,0 +1,23 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.services.processor_client import PaymentProcessorClient
+from payments_common import wire
+
+
+def test_undecodable_binary_response_is_a_bad_gateway(monkeypatch):
+    def processor(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200, content=b"\x01\x01", headers={"content-type": wire.CONTENT_TYPE}
+        )
+
+    monkeypatch.setattr(
+        PaymentProcessorClient, "_http", httpx.AsyncClient(transport=httpx.MockTransport(processor))
+    )
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(PaymentProcessorClient().process_payment(10.0, 1, 1, 1))
+    assert error.value.status_code == 502
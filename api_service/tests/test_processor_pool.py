@@ -0,0 +1,28 @@
+from app.core.processor_pool import ProcessorPool
+
+URLS = ["http://processor-a", "http://processor-b", "http://processor-c"]
+
+
+def pool(key_affinity: bool) -> ProcessorPool:
+    return ProcessorPool(URLS, eject_after=5, eject_seconds=30.0, key_affinity=key_affinity)
+
+
+def test_key_affinity_keeps_a_payment_on_one_endpoint():
+    processors = pool(key_affinity=True)
+    first = processors.pick("payment-1")
+    processors.started(first)
+
+    assert all(processors.pick("payment-1") is first for _ in range(50))
+
+
+def test_shared_store_balances_keyed_calls():
+    processors = pool(key_affinity=False)
+    busy, idle = processors.endpoints[0], processors.endpoints[1:]
+    for _ in range(10):
+        processors.started(busy)
+
+    # Power of two choices never prefers the busy endpoint while an idle one
+    # is among the two sampled; the key does not pin it.
+    picks = {processors.pick("payment-1") for _ in range(200)}
+    assert busy not in picks
+    assert picks == set(idle)
@@ -0,0 +1,29 @@
+from app.core import rate_limit
+from app.core.rate_limit import MemoryBucketStore, RateLimiter
+
+
+def test_full_store_evicts_least_recently_used_bucket():
+    buckets = MemoryBucketStore(max_keys=3)
+    for key in ("a", "b", "c"):
+        buckets.take_now(key, rate=1e-3, burst=1)
+    buckets.take_now("a", rate=1e-3, burst=1)
+
+    buckets.take_now("d", rate=1e-3, burst=1)
+
+    # "b" was the least recently used; "a" and "c" keep their spent tokens.
+    assert list(buckets._buckets) == ["c", "a", "d"]
+    assert buckets.take_now("c", rate=1e-3, burst=1) > 0
+    assert buckets.take_now("b", rate=1e-3, burst=1) == 0
+
+
+def test_ip_limit_rejection_carries_cors_headers(client, monkeypatch):
+    limiter = RateLimiter(MemoryBucketStore(max_keys=10), [1e-3, 1], {})
+    monkeypatch.setattr(rate_limit, "rate_limiter", limiter)
+    headers = {"Origin": "https://frontend.test"}
+
+    client.get("/users/me", headers=headers)
+    response = client.get("/users/me", headers=headers)
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"]
+    assert response.headers["access-control-allow-origin"]
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+# A pending payment the processor does not know (its call failed with a 503
+# or a connection error) is sent again with the same idempotency key while a
+# durable processor store would still remember that key, and goes to manual
+# review otherwise.
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    from app.services.processor_client import PaymentProcessorClient
+
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.method == "GET":
+            return httpx.Response(404, json={"detail": "Job not found"})
+        return httpx.Response(
+            200,
+            json={
+                "status": "approved",
+                "reference": "ref-1",
+                "reason": None,
+                "processed_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+
+    monkeypatch.setattr(
+        PaymentProcessorClient, "_http", httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    return requests
+
+
+@pytest.fixture
+def pending_payment(make_user):
+    from sqlmodel import Session
+
+    from app.core.database import engine
+    from app.models import Card, Payment
+
+    def make(age: timedelta) -> int:
+        owner = make_user()
+        created_at = datetime.now(timezone.utc) - age
+        with Session(engine) as session:
+            card = Card(
+                user_id=owner.id,
+                card_holder_name="Test User",
+                last_four="1111",
+                masked_number="**** **** **** 1111",
+                expiration_month=12,
+                expiration_year=created_at.year + 2,
+                created_at=created_at,
+            )
+            session.add(card)
+            session.flush()
+            payment = Payment(
+                user_id=owner.id, card_id=card.id, amount=10.0, created_at=created_at
+            )
+            session.add(payment)
+            session.commit()
+            return payment.id
+
+    return make
+
+
+def load(payment_id: int):
+    from sqlmodel import Session
+
+    from app.core.database import engine
+    from app.models import Payment
+
+    with Session(engine) as session:
+        return session.get(Payment, payment_id)
+
+
+def run_reconciler(monkeypatch, job_store: str) -> dict:
+    import asyncio
+
+    from app.core.config import settings
+    from app.services.reconciler_service import ReconcilerService
+
+    monkeypatch.setattr(settings, "PROCESSOR_JOB_STORE", job_store)
+    monkeypatch.setattr(settings, "PROCESSOR_JOB_RETENTION_SECONDS", 3600.0)
+    return asyncio.run(ReconcilerService.run())
+
+
+def test_resends_within_key_retention(monkeypatch, processor, pending_payment):
+    from app.services.processor_client import processor_key
+
+    payment_id = pending_payment(timedelta(minutes=10))
+    stats = run_reconciler(monkeypatch, "redis")
+
+    posts = [r for r in processor if r.method == "POST"]
+    assert stats["resubmitted"] >= 1
+    assert [r.url.path for r in posts] == ["/process-payment/"]
+    assert processor_key(payment_id).encode() in posts[0].content
+    assert load(payment_id).status == "approved"
+
+
+def test_reviews_after_key_retention(monkeypatch, processor, pending_payment):
+    payment_id = pending_payment(timedelta(hours=2))
+    stats = run_reconciler(monkeypatch, "redis")
+
+    payment = load(payment_id)
+    assert stats["manual_review"] >= 1
+    assert not [r for r in processor if r.method == "POST"]
+    assert (payment.status, payment.status_reason) == ("pending", "manual_review")
+
+
+def test_reviews_with_memory_store(monkeypatch, processor, pending_payment):
+    payment_id = pending_payment(timedelta(minutes=10))
+    run_reconciler(monkeypatch, "memory")
+
+    payment = load(payment_id)
+    assert not [r for r in processor if r.method == "POST"]
+    assert (payment.status, payment.status_reason) == ("pending", "manual_review")
@@ -0,0 +1,246 @@
+from datetime import datetime, timezone
+from itertools import count
+
+import httpx
+import pytest
+from psycopg.pq import TransactionStatus
+from sqlalchemy import event
+
+# Statements each endpoint sends to the database in the happy path, as
+# documented in the README ("Escrituras y round trips"): the authentication
+# SELECT, the write and its COMMIT (sent in the same pipeline).
+_emails = count()
+
+
+class StatementCounter:
+    # SQLAlchemy's cursor hooks see ORM and Core statements; run_pipeline
+    # sends its statements and COMMIT through the raw psycopg connection, so
+    # those are recorded by wrapping it. COMMIT/ROLLBACK through SQLAlchemy
+    # count only when a transaction is open (otherwise psycopg sends nothing).
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.statements: list[str] = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement.split(None, 1)[0].upper())
+
+    def _on_end(self, verb):
+        def listener(conn):
+            if conn.connection.driver_connection.info.transaction_status != TransactionStatus.IDLE:
+                self.statements.append(verb)
+
+        return listener
+
+    def wrap_pipeline(self, run_pipeline):
+        def counted(session, *statements, commit=False):
+            self.statements.extend(str(s).split(None, 1)[0].upper() for s in statements)
+            if commit:
+                self.statements.append("COMMIT")
+            return run_pipeline(session, *statements, commit=commit)
+
+        return counted
+
+    def __enter__(self):
+        self._commit, self._rollback = self._on_end("COMMIT"), self._on_end("ROLLBACK")
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+            event.listen(engine, "commit", self._commit)
+            event.listen(engine, "rollback", self._rollback)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._on_execute)
+            event.remove(engine, "commit", self._commit)
+            event.remove(engine, "rollback", self._rollback)
+
+
+@pytest.fixture
+def statements(database, monkeypatch):
+    from app.core import database as db
+
+    counter = StatementCounter(database)
+    monkeypatch.setattr(db, "run_pipeline", counter.wrap_pipeline(db.run_pipeline))
+    with counter:
+        yield counter.statements
+
+
+# Card, user and payment writes are admin-only; the admin also owns the
+# cards, profile and payments it creates.
+@pytest.fixture
+def user(make_user):
+    return make_user("admin")
+
+
+@pytest.fixture
+def headers(user):
+    from app.services import AuthService
+
+    return {"Authorization": f"Bearer {AuthService.create_access_token(user.id)}"}
+
+
+def create_card(client, user, headers) -> dict:
+    response = client.post(
+        "/cards/",
+        json={
+            "user_id": user.id,
+            "card_holder_name": "Test User",
+            "card_number": "4111111111111111",
+            "expiration_month": 12,
+            "expiration_year": datetime.now().year + 2,
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def create_profile(client, headers) -> dict:
+    response = client.post("/profiles/", json={"name": "Test", "age": 30}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_create_card(client, user, headers, statements):
+    create_card(client, user, headers)
+    assert statements == ["SELECT", "INSERT", "COMMIT"]
+
+
+def test_update_card(client, user, headers, statements):
+    card = create_card(client, user, headers)
+    statements.clear()
+    response = client.put(
+        f"/cards/{card['id']}", json={"card_holder_name": "Renamed"}, headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert statements == ["SELECT", "UPDATE", "COMMIT"]
+
+
+def test_delete_card(client, user, headers, statements):
+    card = create_card(client, user, headers)
+    statements.clear()
+    response = client.delete(f"/cards/{card['id']}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert statements == ["SELECT", "UPDATE", "COMMIT"]
+
+
+def test_create_profile(client, headers, statements):
+    create_profile(client, headers)
+    assert statements == ["SELECT", "INSERT", "COMMIT"]
+
+
+def test_update_profile(client, user, headers, statements):
+    create_profile(client, headers)
+    statements.clear()
+    response = client.put(f"/profiles/{user.id}", json={"name": "Renamed"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert statements == ["SELECT", "UPDATE", "COMMIT"]
+
+
+def test_delete_profile(client, user, headers, statements):
+    create_profile(client, headers)
+    statements.clear()
+    response = client.delete(f"/profiles/{user.id}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert statements == ["SELECT", "UPDATE", "COMMIT"]
+
+
+# POST /auth/register does not pass the acting user to create_user, so user
+# creation is counted at the service, as an admin would call it.
+def test_create_user(make_user, statements):
+    from app.core.database import new_session
+    from app.schemas import UserCreate
+    from app.services import UserService
+
+    admin = make_user("admin")
+    statements.clear()
+    with new_session() as session:
+        UserService.create_user(
+            session, UserCreate(email=f"new{next(_emails)}@example.com", password="pw"), admin
+        )
+    assert statements == ["INSERT", "COMMIT"]
+
+
+def test_update_user(client, user, headers, statements):
+    response = client.put(
+        f"/users/{user.id}",
+        json={"email": f"renamed{next(_emails)}@example.com", "role": "admin", "is_active": True},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    assert statements == ["SELECT", "UPDATE", "COMMIT"]
+
+
+def test_delete_user(client, user, headers, statements):
+    response = client.delete(f"/users/{user.id}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert statements == ["SELECT", "UPDATE", "COMMIT"]
+
+
+def test_create_payment(client, user, headers, statements, monkeypatch):
+    from app.services.processor_client import PaymentProcessorClient
+
+    def processor(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            json={
+                "status": "approved",
+                "reference": "ref-1",
+                "reason": None,
+                "processed_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+
+    monkeypatch.setattr(
+        PaymentProcessorClient, "_http", httpx.AsyncClient(transport=httpx.MockTransport(processor))
+    )
+    card = create_card(client, user, headers)
+    statements.clear()
+    response = client.post(
+        "/payments/",
+        json={
+            "user_id": user.id,
+            "card_id": card["id"],
+            "amount": 25.0,
+            "idempotency_key": f"test-{next(_emails)}",
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "approved"
+    assert statements == ["SELECT", "INSERT", "COMMIT", "UPDATE", "COMMIT"]
+
+
+# GET /users/?with_stats=true: one statement per shard whatever the page size.
+def test_users_with_stats_page_size(client, make_user, user, headers, statements):
+    from sqlmodel import Session
+
+    from app.core.database import engine
+    from app.models import Payment
+
+    users = [make_user() for _ in range(3)]
+    with Session(engine) as session:
+        for owner in users:
+            card = create_card(client, owner, headers)
+            session.add_all(Payment(user_id=owner.id, card_id=card["id"], amount=10.0) for _ in range(2))
+        session.commit()
+
+    pages = {}
+    for limit in (1, len(users)):
+        statements.clear()
+        response = client.get(
+            "/users/",
+            params={"with_stats": True, "limit": limit, "after_id": users[0].id - 1},
+            headers=headers,
+        )
+        assert response.status_code == 200, response.text
+        pages[limit] = (response.json(), list(statements))
+
+    (first, one), (full, many) = pages[1], pages[len(users)]
+    # Authentication and the page in one session, then it closes.
+    assert one == many == ["SELECT", "SELECT", "ROLLBACK"]
+    assert [u["id"] for u in first] == [users[0].id]
+    assert [(u["id"], u["active_cards"], u["payments"]) for u in full] == [
+        (owner.id, 1, 2) for owner in users
+    ]
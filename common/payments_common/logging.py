@@ -0,0 +1,231 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from .tracing import current_trace
+
+REDACTIONS = (
+    # JWTs (access and internal service tokens)
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*"), "[REDACTED_JWT]"),
+    (re.compile(r"(?i)\b(bearer\s+)\S+"), r"\1[REDACTED]"),
+    (
+        re.compile(
+            r"(?i)(\b(?:password|passwd|secret|token|api_key|authorization)\b"
+            r"[\"']?\s*[:=]\s*[\"']?)[^\s\"',}]+"
+        ),
+        r"\1[REDACTED]",
+    ),
+)
+
+
+# 13-19 digits, optionally grouped by spaces or dashes; only replaced when
+# they pass the Luhn check, so ids and timestamps stay readable.
+CARD_NUMBER = re.compile(r"\b\d(?:[ -]?\d){12,18}\b")
+SENSITIVE_KEY = re.compile(
+    r"(?i)password|passwd|secret|token|api_key|authorization|card_number|cvv|cvc"
+)
+
+
+def _luhn(digits: str) -> bool:
+    checksum = 0
+    parity = len(digits) % 2
+    for i, d in enumerate(map(int, digits)):
+        if i % 2 == parity:
+            d = d * 2 - 9 if d > 4 else d * 2
+        checksum += d
+    return checksum % 10 == 0
+
+
+def _redact_card_number(match: re.Match) -> str:
+    digits = re.sub(r"[ -]", "", match.group())
+    return "[REDACTED_PAN]" if _luhn(digits) else match.group()
+
+
+def redact(message: str) -> str:
+    for pattern, replacement in REDACTIONS:
+        message = pattern.sub(replacement, message)
+    return CARD_NUMBER.sub(_redact_card_number, message)
+
+
+# Structured extras (extra={"data": ...}): values under sensitive keys are
+# dropped whole, every other string goes through redact().
+def redact_data(value):
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, dict):
+        return {
+            key: "[REDACTED]"
+            if isinstance(key, str) and SENSITIVE_KEY.search(key)
+            else redact_data(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact_data(item) for item in value]
+    return value
+
+
+def _lookup_by_logger(values: dict, cache: dict, name: str):
+    # Most specific configured prefix wins: "sqlalchemy.engine" applies to
+    # "sqlalchemy.engine.Engine". Results are cached per logger name.
+    try:
+        return cache[name]
+    except KeyError:
+        pass
+
+    value = None
+    candidate = name
+    while candidate:
+        if candidate in values:
+            value = values[candidate]
+            break
+        candidate = candidate.rpartition(".")[0]
+
+    cache[name] = value
+    return value
+
+
+class SamplingFilter(logging.Filter):
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self._cache = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = _lookup_by_logger(self.rates, self._cache, record.name)
+        return rate is None or rate >= 1.0 or random.random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+
+    def __init__(self, limits: dict):
+        super().__init__()
+        self.limits = limits
+        self._cache = {}
+        # logger name -> [tokens, last_refill, dropped]
+        self._buckets = {}
+
+    def filter(self, record):
+        limit = _lookup_by_logger(self.limits, self._cache, record.name)
+        if limit is None:
+            return True
+
+        now = time.monotonic()
+        bucket = self._buckets.get(record.name)
+        if bucket is None:
+            bucket = self._buckets[record.name] = [limit, now, 0]
+
+        bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit)
+        bucket[1] = now
+
+        if bucket[0] < 1.0:
+            bucket[2] += 1
+            return False
+
+        bucket[0] -= 1.0
+        if bucket[2]:
+            record.dropped = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+class ContextFilter(logging.Filter):
+
+    def filter(self, record):
+        trace = current_trace()
+        if trace is not None:
+            record.trace_id = trace.trace_id
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only merge args into the message here; JSON formatting and redaction
+        # run on the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.msg),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        data = getattr(record, "data", None)
+        if data:
+            entry["data"] = redact_data(data)
+        dropped = getattr(record, "dropped", None)
+        if dropped:
+            entry["dropped"] = dropped
+        if record.exc_text:
+            entry["exc"] = redact(record.exc_text)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# levels: per-logger levels on top of `level`, e.g. {"sqlalchemy.engine": "WARNING"}.
+def setup_logging(
+    level: str,
+    queue_size: int,
+    sampling: dict[str, float],
+    rate_limits: dict[str, float],
+    levels: Optional[dict[str, str]] = None,
+):
+    log_queue = queue.Queue(queue_size)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sampling))
+    queue_handler.addFilter(RateLimitFilter(rate_limits))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    # uvicorn installs its own synchronous stream handlers; route its loggers
+    # through the queue as well.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers[:] = []
+        uvicorn_logger.propagate = True
+
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
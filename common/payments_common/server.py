@@ -0,0 +1,72 @@
+import os
+import random
+import sys
+import tempfile
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+
+class RecyclingServer(uvicorn.Server):
+    # Each worker draws its own request limit, MAX_REQUESTS plus up to
+    # MAX_REQUESTS_JITTER, when it starts (workers are spawned, so each has its
+    # own random state). Without it, workers started together reach the limit
+    # together and all restart at the same moment.
+
+    def __init__(self, config: uvicorn.Config, max_requests_jitter: int):
+        super().__init__(config)
+        self.max_requests_jitter = max_requests_jitter
+
+    def run(self, sockets=None):
+        if self.config.limit_max_requests and self.max_requests_jitter > 0:
+            self.config.limit_max_requests += random.randint(0, self.max_requests_jitter)
+        super().run(sockets)
+
+
+def worker_count(settings) -> int:
+    if settings.WORKERS > 0:
+        return settings.WORKERS
+    # The app is async and I/O bound, so one worker per core saturates the CPU.
+    return os.cpu_count() or 1
+
+
+# The launcher of both services, configured from their Settings.
+def serve(app: str, settings, metrics_prefix: str):
+    workers = worker_count(settings)
+
+    # Workers are separate processes; Prometheus needs a shared directory to
+    # aggregate their samples. It must be exported before they are spawned.
+    if workers > 1 and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix=metrics_prefix)
+
+    config = uvicorn.Config(
+        app,
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=workers,
+        # "auto" picks uvloop and httptools when they are installed.
+        loop="auto",
+        http="auto",
+        backlog=settings.BACKLOG,
+        timeout_keep_alive=settings.KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=settings.GRACEFUL_TIMEOUT,
+        limit_max_requests=settings.MAX_REQUESTS or None,
+        proxy_headers=True,
+        # Logging is configured by payments_common.logging in every worker.
+        log_config=None,
+        access_log=settings.ACCESS_LOG,
+    )
+    server = RecyclingServer(config, settings.MAX_REQUESTS_JITTER)
+
+    # Same as uvicorn.run, with our server class.
+    try:
+        if workers > 1:
+            sock = config.bind_socket()
+            Multiprocess(config, target=server.run, sockets=[sock]).run()
+        else:
+            server.run()
+    except KeyboardInterrupt:
+        pass
+
+    if workers == 1 and not server.started:
+        sys.exit(3)
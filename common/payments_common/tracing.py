@@ -0,0 +1,166 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+logger = logging.getLogger("app.trace")
+
+
+class Trace:
+    __slots__ = ("trace_id", "span_id", "parent_id", "sampled", "start", "spans")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start = time.perf_counter()
+        # (name, start, duration, detail); appended from the event loop and from
+        # threadpool dependencies, list.append is atomic so no lock is needed.
+        self.spans = []
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def server_timing(self) -> str:
+        totals = {}
+        for name, _, duration, _ in self.spans:
+            total, count = totals.get(name, (0.0, 0))
+            totals[name] = (total + duration, count + 1)
+
+        parts = [
+            f'{name};dur={total * 1000:.2f};desc="{count}x"'
+            for name, (total, count) in totals.items()
+        ]
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.2f}")
+        return ", ".join(parts)
+
+    def to_dict(self, **extra) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "spans": [
+                {
+                    "name": name,
+                    "offset_ms": round((start - self.start) * 1000, 3),
+                    "duration_ms": round(duration * 1000, 3),
+                    "detail": detail,
+                }
+                for name, start, duration, detail in self.spans
+            ],
+            **extra,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record_span(name: str, start: float, duration: float, detail: Optional[str] = None):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append((name, start, duration, detail))
+
+
+@contextmanager
+def span(name: str, detail: Optional[str] = None):
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append((name, start, time.perf_counter() - start, detail))
+
+
+def trace_headers() -> dict:
+    trace = _current_trace.get()
+    if trace is None:
+        return {}
+    return {"traceparent": trace.traceparent}
+
+
+def parse_traceparent(value: str):
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    version, trace_id, parent_id, flags = parts
+    if version == "ff" or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    try:
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None
+    return trace_id, parent_id, sampled
+
+
+class TracingMiddleware:
+    # An incoming traceparent always keeps its trace id, so logs correlate
+    # across services. Its sampled flag is only obeyed with trust_sampled
+    # (set where every caller is internal): otherwise any client could force
+    # tracing of all its requests past sample_rate.
+
+    def __init__(self, app, sample_rate: float, trust_sampled: bool = False):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.trust_sampled = trust_sampled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        if parent is not None and self.trust_sampled:
+            sampled = parent[2]
+        else:
+            sampled = random.random() < self.sample_rate
+        if parent is not None:
+            trace = Trace(parent[0], parent[1], sampled)
+        else:
+            trace = Trace(f"{random.getrandbits(128):032x}", None, sampled)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode()))
+                headers.append((b"traceparent", trace.traceparent.encode()))
+                message["headers"] = headers
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            if trace.sampled:
+                logger.info(
+                    "trace",
+                    extra={
+                        "data": trace.to_dict(
+                            method=scope["method"],
+                            path=scope["path"],
+                            status=status_code,
+                        )
+                    },
+                )
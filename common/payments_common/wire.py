@@ -0,0 +1,113 @@
+import struct
+from datetime import datetime, timezone
+from typing import Optional
+
+# Compact binary framing for the synchronous API -> processor call, chosen
+# with Content-Type (request) and Accept (response); JSON stays the default.
+# The API encodes requests and the processor responses. Big-endian, strings
+# are a uint16 length followed by UTF-8, and an empty string stands for None;
+# ids use 0:
+#
+#   request v2  version u8 | amount f64 | payment_id i64 | user_id i64 | card_id i64
+#               | idempotency_key str
+#   request v1  version u8 | amount f64 | payment_id i64 | idempotency_key str
+#   response    version u8 | approved u8 | processed_at f64 (unix s) | reference str | reason str
+CONTENT_TYPE = "application/vnd.payments.v1+octet-stream"
+VERSION = 1
+REQUEST_VERSION = 2
+
+_REQUEST = struct.Struct("!Bdqqq")
+_REQUEST_V1 = struct.Struct("!Bdq")
+_RESPONSE = struct.Struct("!BBd")
+_LENGTH = struct.Struct("!H")
+
+
+class WireError(ValueError):
+    pass
+
+
+def accepts(accept_header: Optional[str]) -> bool:
+    return bool(accept_header) and CONTENT_TYPE in accept_header
+
+
+def _pack_str(value: Optional[str]) -> bytes:
+    data = value.encode() if value else b""
+    return _LENGTH.pack(len(data)) + data
+
+
+def _unpack_str(body: bytes, offset: int) -> tuple[Optional[str], int]:
+    (length,) = _LENGTH.unpack_from(body, offset)
+    start = offset + _LENGTH.size
+    end = start + length
+    if end > len(body):
+        raise WireError("Truncated string")
+    return body[start:end].decode() or None, end
+
+
+def _check_version(version: int):
+    if version != VERSION:
+        raise WireError(f"Unsupported wire version {version}")
+
+
+def encode_request(
+    amount: float,
+    payment_id: Optional[int],
+    idempotency_key: Optional[str],
+    user_id: Optional[int] = None,
+    card_id: Optional[int] = None,
+) -> bytes:
+    return _REQUEST.pack(
+        REQUEST_VERSION, amount, payment_id or 0, user_id or 0, card_id or 0
+    ) + _pack_str(idempotency_key)
+
+
+# Same keys as the JSON request body.
+def decode_request(body: bytes) -> dict:
+    try:
+        if body[:1] == bytes([REQUEST_VERSION]):
+            _, amount, payment_id, user_id, card_id = _REQUEST.unpack_from(body)
+            offset = _REQUEST.size
+        else:
+            version, amount, payment_id = _REQUEST_V1.unpack_from(body)
+            _check_version(version)
+            user_id = card_id = 0
+            offset = _REQUEST_V1.size
+        idempotency_key, end = _unpack_str(body, offset)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise WireError(str(e)) from e
+    if end != len(body):
+        raise WireError("Trailing bytes after payment request")
+    return {
+        "amount": amount,
+        "payment_id": payment_id or None,
+        "idempotency_key": idempotency_key,
+        "user_id": user_id or None,
+        "card_id": card_id or None,
+    }
+
+
+def encode_response(
+    status: str, reference: Optional[str], reason: Optional[str], processed_at: datetime
+) -> bytes:
+    return (
+        _RESPONSE.pack(VERSION, status == "approved", processed_at.timestamp())
+        + _pack_str(reference)
+        + _pack_str(reason)
+    )
+
+
+# Same dict shape as the JSON response, so callers do not care which was used.
+def decode_response(body: bytes) -> dict:
+    try:
+        version, approved, processed_at = _RESPONSE.unpack_from(body)
+        _check_version(version)
+        reference, end = _unpack_str(body, _RESPONSE.size)
+        reason, end = _unpack_str(body, end)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise WireError(str(e)) from e
+    return {
+        "status": "approved" if approved else "rejected",
+        "reference": reference,
+        "reason": reason,
+        "processed_at": datetime.fromtimestamp(processed_at, timezone.utc).isoformat(),
+    }
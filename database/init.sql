@@ -62,6 +62,43 @@ CREATE UNIQUE INDEX unique_active_profile
 ON profiles(user_id)
 WHERE deleted_at IS NULL;
 
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Búsqueda de administración (GET /admin/search): prefijo con btree y similitud
+-- con GiST de trigramas, que devuelve los más parecidos primero (KNN) sin
+-- ordenar todas las coincidencias. La expresión de perfiles debe coincidir
+-- exactamente con la de app/services/search_service.py.
+CREATE INDEX ix_users_email_prefix
+ON users (lower(email) text_pattern_ops)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX ix_users_email_trgm
+ON users USING gist (lower(email) gist_trgm_ops)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX ix_profiles_ci_prefix
+ON profiles (ci text_pattern_ops)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX ix_profiles_phone_prefix
+ON profiles (phone text_pattern_ops)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX ix_profiles_name_prefix
+ON profiles (lower(name) text_pattern_ops, user_id)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX ix_profiles_last_name_prefix
+ON profiles (lower(last_name) text_pattern_ops, user_id)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX ix_profiles_search_trgm
+ON profiles USING gist ((lower(
+    coalesce(name, '') || ' ' || coalesce(last_name, '') || ' ' ||
+    coalesce(ci, '') || ' ' || coalesce(phone, '')
+)) gist_trgm_ops)
+WHERE deleted_at IS NULL;
+
 -- ========================
 -- CARDS
 -- ========================
@@ -81,12 +118,22 @@ CREATE TABLE cards (
     deleted_at TIMESTAMP
 );
 
+CREATE INDEX ix_cards_user_active
+ON cards(user_id)
+WHERE deleted_at IS NULL;
+
 -- ========================
 -- PAYMENTS
 -- ========================
 
+-- Particionada por mes de created_at. La PK incluye la clave de partición
+-- (requisito de Postgres); las funciones de mantenimiento están al final.
+
+-- Los ids solo salen de payments_id_seq: la PK (id, created_at) no impide
+-- repetir un id en dos meses, así que no se insertan ids explícitos (la
+-- migración 008 lo comprueba en bases existentes).
 CREATE TABLE payments (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     user_id INTEGER NOT NULL REFERENCES users(id),
     card_id INTEGER NOT NULL REFERENCES cards(id),
     amount DOUBLE PRECISION NOT NULL,
@@ -98,10 +145,118 @@ CREATE TABLE payments (
     processed_at TIMESTAMP,
     created_at TIMESTAMP NOT NULL,
     updated_at TIMESTAMP,
-    deleted_at TIMESTAMP
-);
+    deleted_at TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Recoge filas de meses sin partición; ensure_payment_partitions las mueve.
+CREATE TABLE payments_default PARTITION OF payments DEFAULT;
+
+CREATE INDEX ix_payments_user_active
+ON payments(user_id, created_at)
+WHERE deleted_at IS NULL;
 
-CREATE UNIQUE INDEX unique_payment_idempotency
+CREATE INDEX ix_payments_idempotency_key
 ON payments(idempotency_key)
 WHERE idempotency_key IS NOT NULL;
 
+CREATE INDEX ix_payments_processor_reference
+ON payments(processor_reference)
+WHERE processor_reference IS NOT NULL;
+
+-- Solo pagos pendientes: el reconciliador recorre este índice por lotes.
+CREATE INDEX ix_payments_pending
+ON payments(created_at, id)
+WHERE status = 'pending' AND deleted_at IS NULL;
+
+-- Un índice único sobre una tabla particionada debe incluir created_at, así que
+-- la unicidad global de idempotency_key se garantiza en una tabla aparte.
+CREATE TABLE payment_idempotency_keys (
+    idempotency_key VARCHAR PRIMARY KEY,
+    payment_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION payments_claim_idempotency_key()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.idempotency_key IS NOT NULL THEN
+        INSERT INTO payment_idempotency_keys (idempotency_key, payment_id, created_at)
+        VALUES (NEW.idempotency_key, NEW.id, NEW.created_at);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER payments_idempotency
+AFTER INSERT ON payments
+FOR EACH ROW EXECUTE FUNCTION payments_claim_idempotency_key();
+
+-- Libera la clave cuando el pago se borra (archivado o purga). Al mover filas
+-- entre particiones create_payment_partition activa payments.moving_rows.
+CREATE OR REPLACE FUNCTION payments_release_idempotency_key()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF OLD.idempotency_key IS NOT NULL
+        AND current_setting('payments.moving_rows', true) IS DISTINCT FROM 'on' THEN
+        DELETE FROM payment_idempotency_keys
+        WHERE idempotency_key = OLD.idempotency_key AND payment_id = OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER payments_idempotency_release
+AFTER DELETE ON payments
+FOR EACH ROW EXECUTE FUNCTION payments_release_idempotency_key();
+
+-- Anuncia cada pago finalizado en el canal payment_events (SSE/WebSocket del
+-- API). NOTIFY se entrega al confirmar la transacción, sin consulta extra.
+CREATE OR REPLACE FUNCTION payments_notify_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('payment_events', json_build_object(
+        'ts', (EXTRACT(EPOCH FROM NEW.updated_at) * 1000000)::BIGINT,
+        'user_id', NEW.user_id,
+        'payment_id', NEW.id,
+        'status', NEW.status,
+        'status_reason', NEW.status_reason,
+        'processor_reference', NEW.processor_reference,
+        'amount', NEW.amount,
+        'currency', NEW.currency,
+        'updated_at', NEW.updated_at
+    )::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER payments_notify_status
+AFTER UPDATE OF status ON payments
+FOR EACH ROW
+WHEN (OLD.status = 'pending' AND NEW.status <> 'pending')
+EXECUTE FUNCTION payments_notify_status();
+
+-- Avisa a cada worker del API que invalide su caché de tarjetas/perfiles
+-- (canal entity_changes, "<tabla>:<id>"; perfiles por user_id).
+CREATE OR REPLACE FUNCTION entity_cache_invalidate()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('entity_changes', TG_TABLE_NAME || ':' || CASE TG_TABLE_NAME
+        WHEN 'profiles' THEN NEW.user_id
+        ELSE NEW.id
+    END);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cards_cache_invalidate
+AFTER INSERT OR UPDATE ON cards
+FOR EACH ROW EXECUTE FUNCTION entity_cache_invalidate();
+
+CREATE TRIGGER profiles_cache_invalidate
+AFTER INSERT OR UPDATE ON profiles
+FOR EACH ROW EXECUTE FUNCTION entity_cache_invalidate();
+
+\ir partitioning.sql
+
+SELECT ensure_payment_partitions(3);
@@ -0,0 +1,117 @@
+-- ============================================
+-- MIGRATION 001 - PARTITION PAYMENTS BY MONTH
+-- Convierte una tabla payments existente (init.sql anterior) en una tabla
+-- particionada por created_at. Ejecutar desde database/:
+--   psql -U <usuario> -d <nombre_db> -f migrations/001_partition_payments.sql
+-- ============================================
+
+BEGIN;
+
+-- 1. Apartar la tabla actual; conserva su secuencia payments_id_seq.
+ALTER TABLE payments RENAME TO payments_legacy;
+ALTER INDEX payments_pkey RENAME TO payments_legacy_pkey;
+ALTER INDEX unique_payment_idempotency RENAME TO payments_legacy_idempotency;
+
+-- 2. Nueva tabla particionada reutilizando la misma secuencia de ids.
+CREATE TABLE payments (
+    id INTEGER NOT NULL DEFAULT nextval('payments_id_seq'),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    card_id INTEGER NOT NULL REFERENCES cards(id),
+    amount DOUBLE PRECISION NOT NULL,
+    currency VARCHAR NOT NULL,
+    status paymentstatus NOT NULL,
+    status_reason VARCHAR,
+    processor_reference VARCHAR,
+    idempotency_key VARCHAR,
+    processed_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP,
+    deleted_at TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE payments_id_seq OWNED BY payments.id;
+
+CREATE TABLE payments_default PARTITION OF payments DEFAULT;
+
+CREATE INDEX ix_payments_user_active
+ON payments(user_id, created_at)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX ix_payments_idempotency_key
+ON payments(idempotency_key)
+WHERE idempotency_key IS NOT NULL;
+
+CREATE TABLE payment_idempotency_keys (
+    idempotency_key VARCHAR PRIMARY KEY,
+    payment_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION payments_claim_idempotency_key()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.idempotency_key IS NOT NULL THEN
+        INSERT INTO payment_idempotency_keys (idempotency_key, payment_id, created_at)
+        VALUES (NEW.idempotency_key, NEW.id, NEW.created_at);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER payments_idempotency
+AFTER INSERT ON payments
+FOR EACH ROW EXECUTE FUNCTION payments_claim_idempotency_key();
+
+\ir ../partitioning.sql
+
+-- 3. Particiones para todos los meses con datos, más los próximos.
+SELECT create_payment_partition(month::date)
+FROM generate_series(
+    date_trunc('month', (SELECT COALESCE(MIN(created_at), now()) FROM payments_legacy)),
+    date_trunc('month', now()),
+    INTERVAL '1 month'
+) AS month;
+
+SELECT ensure_payment_partitions(3);
+
+-- 4. Copia por lotes: cada lote se confirma por separado para no retener
+-- bloqueos ni generar una única transacción enorme.
+CREATE OR REPLACE PROCEDURE migrate_legacy_payments(batch_size INTEGER DEFAULT 10000)
+AS $$
+DECLARE
+    moved INTEGER;
+BEGIN
+    LOOP
+        WITH batch AS (
+            DELETE FROM payments_legacy
+            WHERE id IN (
+                SELECT id FROM payments_legacy ORDER BY id LIMIT batch_size
+            )
+            RETURNING *
+        )
+        INSERT INTO payments (
+            id, user_id, card_id, amount, currency, status, status_reason,
+            processor_reference, idempotency_key, processed_at,
+            created_at, updated_at, deleted_at
+        )
+        SELECT
+            id, user_id, card_id, amount, currency, status, status_reason,
+            processor_reference, idempotency_key, processed_at,
+            created_at, updated_at, deleted_at
+        FROM batch;
+
+        GET DIAGNOSTICS moved = ROW_COUNT;
+        EXIT WHEN moved = 0;
+        COMMIT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
+
+-- Fuera de la transacción para que cada lote haga COMMIT.
+CALL migrate_legacy_payments(10000);
+
+DROP TABLE payments_legacy;
+DROP PROCEDURE migrate_legacy_payments(INTEGER);
@@ -0,0 +1,11 @@
+-- ============================================
+-- MIGRATION 002 - INDEX PROCESSOR REFERENCE
+-- Índice para buscar pagos por processor_reference. En una tabla
+-- particionada se crea uno por partición; bloquea las escrituras en payments
+-- mientras se construye, así que conviene ejecutarlo en horas de poca carga:
+--   psql -U <usuario> -d <nombre_db> -f migrations/002_index_processor_reference.sql
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS ix_payments_processor_reference
+ON payments(processor_reference)
+WHERE processor_reference IS NOT NULL;
@@ -0,0 +1,10 @@
+-- ============================================
+-- MIGRATION 003 - INDEX PENDING PAYMENTS
+-- Índice parcial para el reconciliador de pagos pendientes. Como el de la
+-- migración 002, bloquea las escrituras en payments mientras se construye:
+--   psql -U <usuario> -d <nombre_db> -f migrations/003_index_pending_payments.sql
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS ix_payments_pending
+ON payments(created_at, id)
+WHERE status = 'pending' AND deleted_at IS NULL;
@@ -0,0 +1,34 @@
+-- ============================================
+-- MIGRATION 004 - NOTIFY PAYMENT STATUS
+-- Mueve el NOTIFY de los eventos de pago del API a un trigger, para que
+-- finalizar un pago sea una sola sentencia UPDATE ... RETURNING:
+--   psql -U <usuario> -d <nombre_db> -f migrations/004_notify_payment_status.sql
+-- ============================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION payments_notify_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('payment_events', json_build_object(
+        'ts', (EXTRACT(EPOCH FROM NEW.updated_at) * 1000000)::BIGINT,
+        'user_id', NEW.user_id,
+        'payment_id', NEW.id,
+        'status', NEW.status,
+        'status_reason', NEW.status_reason,
+        'processor_reference', NEW.processor_reference,
+        'amount', NEW.amount,
+        'currency', NEW.currency,
+        'updated_at', NEW.updated_at
+    )::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER payments_notify_status
+AFTER UPDATE OF status ON payments
+FOR EACH ROW
+WHEN (OLD.status = 'pending' AND NEW.status <> 'pending')
+EXECUTE FUNCTION payments_notify_status();
+
+COMMIT;
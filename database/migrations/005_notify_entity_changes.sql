@@ -0,0 +1,29 @@
+-- ============================================
+-- MIGRATION 005 - NOTIFY ENTITY CHANGES
+-- Invalida la caché de tarjetas y perfiles de todos los workers del API
+-- cuando cambian (canal entity_changes):
+--   psql -U <usuario> -d <nombre_db> -f migrations/005_notify_entity_changes.sql
+-- ============================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION entity_cache_invalidate()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('entity_changes', TG_TABLE_NAME || ':' || CASE TG_TABLE_NAME
+        WHEN 'profiles' THEN NEW.user_id
+        ELSE NEW.id
+    END);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER cards_cache_invalidate
+AFTER INSERT OR UPDATE ON cards
+FOR EACH ROW EXECUTE FUNCTION entity_cache_invalidate();
+
+CREATE TRIGGER profiles_cache_invalidate
+AFTER INSERT OR UPDATE ON profiles
+FOR EACH ROW EXECUTE FUNCTION entity_cache_invalidate();
+
+COMMIT;
@@ -0,0 +1,31 @@
+-- ============================================
+-- MIGRATION 006 - SEARCH INDEXES
+-- Extensión pg_trgm e índices de GET /admin/search sobre users y profiles.
+-- Se crean con CONCURRENTLY (sin bloquear escrituras), por eso sin BEGIN:
+--   psql -U <usuario> -d <nombre_db> -f migrations/006_search_indexes.sql
+-- ============================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_prefix
+ON users (lower(email) text_pattern_ops)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_trgm
+ON users USING gist (lower(email) gist_trgm_ops)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_profiles_ci_prefix
+ON profiles (ci text_pattern_ops)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_profiles_phone_prefix
+ON profiles (phone text_pattern_ops)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_profiles_search_trgm
+ON profiles USING gist ((lower(
+    coalesce(name, '') || ' ' || coalesce(last_name, '') || ' ' ||
+    coalesce(ci, '') || ' ' || coalesce(phone, '')
+)) gist_trgm_ops)
+WHERE deleted_at IS NULL;
@@ -0,0 +1,10 @@
+-- ============================================
+-- MIGRATION 007 - INDEX CARDS USER
+-- Tarjetas activas por usuario, para contarlas en GET /users/?with_stats=true.
+-- Se crea con CONCURRENTLY (sin bloquear escrituras), por eso sin BEGIN:
+--   psql -U <usuario> -d <nombre_db> -f migrations/007_index_cards_user.sql
+-- ============================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cards_user_active
+ON cards(user_id)
+WHERE deleted_at IS NULL;
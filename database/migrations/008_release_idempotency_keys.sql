@@ -0,0 +1,71 @@
+-- ============================================
+-- MIGRATION 008 - RELEASE IDEMPOTENCY KEYS, CHECK PAYMENT IDS
+-- Borra de payment_idempotency_keys las claves de pagos archivados o purgados
+-- (y las ya huérfanas) y comprueba que los ids de payments son únicos y
+-- salen de payments_id_seq. Ejecutar desde database/:
+--   psql -U <usuario> -d <nombre_db> -f migrations/008_release_idempotency_keys.sql
+-- ============================================
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION payments_release_idempotency_key()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF OLD.idempotency_key IS NOT NULL
+        AND current_setting('payments.moving_rows', true) IS DISTINCT FROM 'on' THEN
+        DELETE FROM payment_idempotency_keys
+        WHERE idempotency_key = OLD.idempotency_key AND payment_id = OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS payments_idempotency_release ON payments;
+CREATE TRIGGER payments_idempotency_release
+AFTER DELETE ON payments
+FOR EACH ROW EXECUTE FUNCTION payments_release_idempotency_key();
+
+\ir ../partitioning.sql
+
+-- Claves cuyos pagos ya se archivaron o se separaron antes de esta migración.
+DELETE FROM payment_idempotency_keys k
+WHERE NOT EXISTS (
+    SELECT 1 FROM payments p
+    WHERE p.id = k.payment_id AND p.idempotency_key = k.idempotency_key
+);
+
+-- La PK (id, created_at) no impide repetir un id en dos meses; la unicidad
+-- depende de que todos los ids salgan de payments_id_seq. Recorre la tabla
+-- entera una vez.
+DO $$
+DECLARE
+    id_default TEXT;
+    duplicated BIGINT;
+    max_id BIGINT;
+    seq_value BIGINT;
+BEGIN
+    SELECT pg_get_expr(d.adbin, d.adrelid) INTO id_default
+    FROM pg_attrdef d
+    JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum
+    WHERE d.adrelid = 'payments'::regclass AND a.attname = 'id';
+    IF id_default IS DISTINCT FROM 'nextval(''payments_id_seq''::regclass)' THEN
+        RAISE EXCEPTION 'payments.id must default to nextval(''payments_id_seq'')';
+    END IF;
+
+    SELECT count(*) INTO duplicated
+    FROM (SELECT id FROM payments GROUP BY id HAVING count(*) > 1) AS d;
+    IF duplicated > 0 THEN
+        RAISE EXCEPTION '% payment ids appear more than once', duplicated;
+    END IF;
+
+    SELECT max(id) INTO max_id FROM payments;
+    SELECT last_value INTO seq_value FROM payments_id_seq;
+    IF max_id > seq_value THEN
+        RAISE EXCEPTION 'payments_id_seq (%) is behind max(payments.id) (%)', seq_value, max_id;
+    END IF;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,14 @@
+-- ============================================
+-- MIGRATION 009 - SEARCH NAME PREFIX
+-- Índices de prefijo de GET /admin/search sobre lower(name) y lower(last_name).
+-- Se crean con CONCURRENTLY (sin bloquear escrituras), por eso sin BEGIN:
+--   psql -U <usuario> -d <nombre_db> -f migrations/009_search_name_prefix.sql
+-- ============================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_profiles_name_prefix
+ON profiles (lower(name) text_pattern_ops, user_id)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_profiles_last_name_prefix
+ON profiles (lower(last_name) text_pattern_ops, user_id)
+WHERE deleted_at IS NULL;
@@ -0,0 +1,97 @@
+-- ============================================
+-- PARTITION MAINTENANCE - PAYMENTS
+-- Funciones idempotentes; init.sql y la migración las cargan
+-- ============================================
+
+-- Crea la partición mensual que contiene month_start. Si la partición DEFAULT
+-- ya tiene filas de ese mes, se mueven a la nueva partición antes de adjuntarla.
+CREATE OR REPLACE FUNCTION create_payment_partition(month_start DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    range_start DATE := date_trunc('month', month_start)::date;
+    range_end DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::date;
+    partition_name TEXT := format('payments_%s', to_char(month_start, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM payments_default
+        WHERE created_at >= range_start AND created_at < range_end
+    ) THEN
+        -- Las filas cambian de tabla, no se borran: conservan su clave.
+        PERFORM set_config('payments.moving_rows', 'on', true);
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE payments INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+            partition_name
+        );
+        EXECUTE format(
+            'WITH moved AS (
+                DELETE FROM payments_default
+                WHERE created_at >= %L AND created_at < %L
+                RETURNING *
+            )
+            INSERT INTO %I SELECT * FROM moved',
+            range_start, range_end, partition_name
+        );
+        PERFORM set_config('payments.moving_rows', 'off', true);
+        EXECUTE format(
+            'ALTER TABLE payments ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            partition_name, range_start, range_end
+        );
+    ELSE
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF payments FOR VALUES FROM (%L) TO (%L)',
+            partition_name, range_start, range_end
+        );
+    END IF;
+
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Garantiza particiones desde el mes actual hasta months_ahead meses después.
+-- Devuelve cuántas se crearon. El API la ejecuta periódicamente.
+CREATE OR REPLACE FUNCTION ensure_payment_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    current_month DATE := date_trunc('month', now() AT TIME ZONE 'UTC')::date;
+    created INTEGER := 0;
+BEGIN
+    -- Serializa a los workers que la invocan a la vez.
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_payment_partitions'));
+
+    FOR i IN 0..months_ahead LOOP
+        IF create_payment_partition((current_month + make_interval(months => i))::date) THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Separa un mes antiguo de la tabla caliente; la tabla resultante se puede
+-- archivar o eliminar. Sus pagos dejan de estar en payments, así que por
+-- defecto se liberan también sus claves de idempotencia.
+-- Para no bloquear escrituras usar manualmente (Postgres 14+):
+--   ALTER TABLE payments DETACH PARTITION payments_YYYY_MM CONCURRENTLY;
+-- y después borrar sus filas de payment_idempotency_keys.
+CREATE OR REPLACE FUNCTION detach_payment_partition(month_start DATE, purge_keys BOOLEAN DEFAULT TRUE)
+RETURNS TEXT AS $$
+DECLARE
+    range_start DATE := date_trunc('month', month_start)::date;
+    range_end DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::date;
+    partition_name TEXT := format('payments_%s', to_char(month_start, 'YYYY_MM'));
+BEGIN
+    EXECUTE format('ALTER TABLE payments DETACH PARTITION %I', partition_name);
+
+    IF purge_keys THEN
+        DELETE FROM payment_idempotency_keys
+        WHERE created_at >= range_start AND created_at < range_end;
+    END IF;
+
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
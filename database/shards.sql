@@ -0,0 +1,22 @@
+-- =========================================
+-- NUMERACIÓN DE IDS POR SHARD
+-- =========================================
+-- Ejecutar en cada base de datos del cluster, justo después de init.sql y con
+-- las tablas vacías. shard_index: 0 para la base DB_*, 1.. en el orden de
+-- DB_SHARD_URLS. stride: el mismo DB_SHARD_ID_STRIDE que usa el API.
+--
+--   psql -v shard_index=1 -v stride=64 -d <nombre_db> -f database/shards.sql
+--
+-- Cada secuencia genera shard_index + 1, shard_index + 1 + stride, ... así que
+-- el shard de cualquier id es (id - 1) % stride y los ids nunca se repiten
+-- entre shards.
+
+\set ON_ERROR_STOP on
+
+SELECT format(
+    'ALTER SEQUENCE %I INCREMENT BY %s MINVALUE 1 START WITH %s RESTART WITH %s',
+    sequence_name, :stride, :shard_index + 1, :shard_index + 1
+)
+FROM unnest(ARRAY['users_id_seq', 'profiles_id_seq', 'cards_id_seq', 'payments_id_seq'])
+    AS sequence_name
+\gexec
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,6 +12,65 @@ class Settings(BaseSettings):
     EXPECTED_SCOPE: str
     ENV: str
 
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    # Per-logger settings, keyed by logger name prefix, e.g. {"app.services": 0.1}
+    LOG_SAMPLING: dict[str, float] = {}
+    LOG_RATE_LIMITS: dict[str, float] = {}
+
+    TRACE_SAMPLE_RATE: float = 0.01
+    # Obey the sampled flag of an incoming traceparent: the processor is only
+    # reachable by the API, so its sampling decision carries over. Turn off if
+    # anything else can reach it
+    TRACE_TRUST_UPSTREAM: bool = True
+
+    # 0-1023, unique per host: part of every processor reference
+    NODE_ID: int = 0
+
+    # Fraud and velocity rules (app/core/risk.py); RISK_MAX_KEYS caps the
+    # cards/users tracked per window in each worker
+    RISK_ENABLED: bool = True
+    RISK_RULES_FILE: Path = Path(__file__).resolve().parent.parent / "risk_rules.yaml"
+    RISK_MAX_KEYS: int = 50000
+
+    # Payments per POST /process-payment/batch
+    BATCH_MAX_SIZE: int = 256
+
+    # Asynchronous (callback) mode; results are signed with CALLBACK_SECRET,
+    # or INTERNAL_SECRET_KEY when it is empty
+    CALLBACK_SECRET: str = ""
+    JOB_WORKERS: int = 32
+    JOB_QUEUE_SIZE: int = 10000
+    JOB_RETENTION_SECONDS: float = 3600.0
+    # Where idempotency keys and job state live: "memory" is per worker and
+    # lost on restart (development only); "redis" is shared by every worker
+    # and instance
+    JOB_STORE: Literal["memory", "redis"] = "memory"
+    JOB_REDIS_URL: str = "redis://localhost:6379/0"
+    # An unfinished job whose owner has not started it within this many
+    # seconds is taken over by another worker, checked every
+    # JOB_RECOVERY_INTERVAL seconds
+    JOB_LEASE_SECONDS: float = 30.0
+    JOB_RECOVERY_INTERVAL: float = 5.0
+    CALLBACK_TIMEOUT: float = 5.0
+    CALLBACK_CONCURRENCY: int = 64
+    CALLBACK_MAX_ATTEMPTS: int = 8
+    CALLBACK_BACKOFF_BASE: float = 0.5
+    CALLBACK_BACKOFF_MAX: float = 60.0
+
+    HOST: str = "0.0.0.0"
+    PORT: int = 9000
+    # 0 = one worker per CPU core
+    WORKERS: int = 0
+    BACKLOG: int = 2048
+    KEEPALIVE_TIMEOUT: int = 5
+    GRACEFUL_TIMEOUT: int = 30
+    # Recycle a worker after this many requests (0 disables recycling)
+    MAX_REQUESTS: int = 10000
+    # Each worker adds a random 0..N to MAX_REQUESTS so they don't restart together
+    MAX_REQUESTS_JITTER: int = 1000
+    ACCESS_LOG: bool = False
+
     model_config = SettingsConfigDict(
         env_file=Path(__file__).resolve().parent.parent / ".env", extra="ignore"
     )
@@ -0,0 +1,58 @@
+import base64
+import itertools
+import os
+import random
+import time
+
+# 128-bit, k-sortable identifiers (ULID-style):
+#
+#   48 bits  milliseconds since the Unix epoch
+#   10 bits  node id (NODE_ID, one per host)
+#   22 bits  process id (Linux pid_max is at most 2**22)
+#   48 bits  per-process counter, starting at a random offset
+#
+# The counter comes from itertools.count, whose __next__ is a single C call and
+# therefore atomic under the GIL: no lock, and no two threads ever get the
+# same value. Time, node and pid keep processes and hosts apart; the random
+# start keeps a recycled pid from replaying the previous process's ids.
+#
+# Encoded as 26 Crockford base32 characters, most significant bits first, so
+# string order equals numeric order.
+NODE_BITS = 10
+PID_BITS = 22
+COUNTER_BITS = 48
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+
+_RFC4648 = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+_CROCKFORD = b"0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_TO_CROCKFORD = bytes.maketrans(_RFC4648, _CROCKFORD)
+
+
+class IdGenerator:
+
+    def __init__(self, node_id: int, prefix: str = ""):
+        if not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f"node_id must be between 0 and {MAX_NODE_ID}")
+
+        self.prefix = prefix
+        self.node_id = node_id
+        self._fork_safe_init()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._fork_safe_init)
+
+    def _fork_safe_init(self):
+        pid = os.getpid() & ((1 << PID_BITS) - 1)
+        self._middle = (self.node_id << PID_BITS | pid) << COUNTER_BITS
+        self._counter = itertools.count(random.getrandbits(COUNTER_BITS - 8))
+        # Wall clock anchored once, then advanced by the monotonic clock so
+        # the timestamp never goes backwards when NTP steps the system time.
+        self._anchor_ms = time.time_ns() // 1_000_000 - time.monotonic_ns() // 1_000_000
+
+    def new_int(self) -> int:
+        ms = self._anchor_ms + time.monotonic_ns() // 1_000_000
+        sequence = next(self._counter) & ((1 << COUNTER_BITS) - 1)
+        return ms << 80 | self._middle | sequence
+
+    def new(self) -> str:
+        raw = self.new_int().to_bytes(16, "big")
+        return self.prefix + base64.b32encode(raw)[:26].translate(_TO_CROCKFORD).decode()
@@ -0,0 +1,171 @@
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+# Job records are plain dicts (see PaymentJob.to_record): idempotency_key,
+# request, state, result, attempts, delivered, created_at (unix seconds).
+#
+# A job that is not completed has a lease: the worker that owns it must start
+# it before the lease runs out, and a worker that finds an expired lease takes
+# the job over. That is how queued or half-processed jobs of a worker that
+# died are finished by another one.
+
+
+class MemoryJobStore:
+    # Per worker and lost on restart: for development and single-worker runs.
+    # Only touched from the event loop, so no lock.
+
+    def __init__(self, retention: float):
+        self.retention = retention
+        self.owner = "memory"
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+
+    async def claim(self, record: dict, lease: float) -> Optional[dict]:
+        existing = self._jobs.get(record["idempotency_key"])
+        if existing is not None:
+            return existing
+        self._prune()
+        self._jobs[record["idempotency_key"]] = record
+        return None
+
+    async def get(self, key: str) -> Optional[dict]:
+        return self._jobs.get(key)
+
+    async def start(self, key: str, lease: float) -> bool:
+        return key in self._jobs
+
+    async def save(self, record: dict):
+        self._jobs[record["idempotency_key"]] = record
+
+    async def delete(self, key: str):
+        self._jobs.pop(key, None)
+
+    async def take_expired(self, lease: float, limit: int) -> list[dict]:
+        return []
+
+    async def close(self):
+        pass
+
+    def _prune(self):
+        # Oldest first; unfinished jobs are kept but do not stop the scan.
+        cutoff = time.time() - self.retention
+        for key, record in list(self._jobs.items()):
+            if record["created_at"] > cutoff:
+                break
+            if record["state"] == "completed":
+                del self._jobs[key]
+
+
+# Shared by every worker and instance, and kept across restarts as far as
+# Redis persists. Lease deadlines use the Redis clock.
+JOB_KEY = "payment_job:"
+LEASES_KEY = "payment_jobs:leases"
+OWNERS_KEY = "payment_jobs:owners"
+
+# KEYS: job, leases, owners. ARGV: record, idempotency key, owner, lease.
+CLAIM_SCRIPT = """
+local existing = redis.call('GET', KEYS[1])
+if existing then
+    return existing
+end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[4]), ARGV[2])
+redis.call('HSET', KEYS[3], ARGV[2], ARGV[3])
+return false
+"""
+
+# Renews the lease only for the job's current owner. KEYS: leases, owners.
+# ARGV: idempotency key, owner, lease.
+START_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+# Moves up to ARGV[3] expired leases to ARGV[1]. KEYS: leases, owners.
+# ARGV: owner, lease, limit.
+TAKE_EXPIRED_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local keys = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, tonumber(ARGV[3]))
+for _, key in ipairs(keys) do
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), key)
+    redis.call('HSET', KEYS[2], key, ARGV[1])
+end
+return keys
+"""
+
+
+class RedisJobStore:
+
+    def __init__(self, url: str, retention: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("JOB_STORE=redis needs the redis package")
+
+        self.retention = retention
+        self.owner = uuid.uuid4().hex
+        self.client = redis.from_url(url)
+        self._claim = self.client.register_script(CLAIM_SCRIPT)
+        self._start = self.client.register_script(START_SCRIPT)
+        self._take_expired = self.client.register_script(TAKE_EXPIRED_SCRIPT)
+
+    async def claim(self, record: dict, lease: float) -> Optional[dict]:
+        key = record["idempotency_key"]
+        existing = await self._claim(
+            keys=[JOB_KEY + key, LEASES_KEY, OWNERS_KEY],
+            args=[json.dumps(record), key, self.owner, lease],
+        )
+        return json.loads(existing) if existing else None
+
+    async def get(self, key: str) -> Optional[dict]:
+        raw = await self.client.get(JOB_KEY + key)
+        return json.loads(raw) if raw else None
+
+    async def start(self, key: str, lease: float) -> bool:
+        return bool(await self._start(keys=[LEASES_KEY, OWNERS_KEY], args=[key, self.owner, lease]))
+
+    async def save(self, record: dict):
+        key = record["idempotency_key"]
+        async with self.client.pipeline(transaction=True) as pipe:
+            if record["state"] == "completed":
+                pipe.set(JOB_KEY + key, json.dumps(record), ex=max(1, int(self.retention)))
+                pipe.zrem(LEASES_KEY, key)
+                pipe.hdel(OWNERS_KEY, key)
+            else:
+                pipe.set(JOB_KEY + key, json.dumps(record))
+            await pipe.execute()
+
+    async def delete(self, key: str):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(JOB_KEY + key)
+            pipe.zrem(LEASES_KEY, key)
+            pipe.hdel(OWNERS_KEY, key)
+            await pipe.execute()
+
+    async def take_expired(self, lease: float, limit: int) -> list[dict]:
+        keys = await self._take_expired(
+            keys=[LEASES_KEY, OWNERS_KEY], args=[self.owner, lease, limit]
+        )
+        records = []
+        for key in keys:
+            key = key.decode() if isinstance(key, bytes) else key
+            record = await self.get(key)
+            if record is None:
+                # The record expired or was deleted without its lease.
+                await self.delete(key)
+            elif record["state"] != "completed":
+                records.append(record)
+        return records
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,18 @@
+from prometheus_client import Counter, Gauge
+
+# HTTP metrics, the middleware and /metrics come from payments_common.metrics,
+# shared with the API; these are the processor's own.
+
+PAYMENT_DECISIONS = Counter(
+    "payment_decisions_total", "Payment decisions by status and reason", ["status", "reason"]
+)
+PAYMENT_JOBS_QUEUED = Gauge(
+    "payment_jobs_queued",
+    "Asynchronous payment jobs waiting for a worker",
+    multiprocess_mode="livesum",
+)
+CALLBACK_DELIVERIES = Counter(
+    "callback_deliveries_total",
+    "Callback delivery attempts by outcome",
+    ["outcome"],
+)
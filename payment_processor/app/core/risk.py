@@ -0,0 +1,242 @@
+import ast
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+import yaml
+
+# Rules are Python-like expressions over the payment amount and velocity
+# windows, compiled once at startup into plain functions, e.g.
+#
+#   - code: card_velocity
+#     when: card_10m.count >= 5 or card_10m.sum + amount > 2000
+#
+# The first rule that matches rejects the payment with its code as reason.
+# Only numbers, names, arithmetic, comparisons and and/or/not are allowed.
+# Division by zero gives 0 (e.g. card_24h.sum / card_24h.count for a new
+# card) instead of failing the payment.
+
+# Entities with velocity windows, and the request field holding their id.
+ENTITIES = {"card": "card_id", "user": "user_id"}
+MAX_BUCKETS = 1440
+
+_ALLOWED = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub,
+    ast.Compare, ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div,
+    ast.Constant, ast.Name, ast.Attribute, ast.Load,
+)
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _div(a: float, b: float) -> float:
+    return a / b if b else 0.0
+
+
+class VelocityWindow:
+    # Sliding window of `seconds` split into `buckets` slots, exact to one
+    # bucket. Each tracked key owns a row in flat arrays of doubles: a ring of
+    # (count, sum) per bucket, its newest bucket and running totals, so
+    # reading a window never loops over it and no object is allocated per
+    # key. At most `max_keys` rows; the least recently seen key gives up its
+    # row (and starts again from zero if it comes back).
+
+    def __init__(self, name: str, entity: str, seconds: float, buckets: int, max_keys: int):
+        if entity not in ENTITIES:
+            raise RuleError(f"Window {name}: entity must be one of {sorted(ENTITIES)}")
+        if seconds <= 0 or not 0 < buckets <= MAX_BUCKETS:
+            raise RuleError(f"Window {name}: needs seconds > 0 and 1-{MAX_BUCKETS} buckets")
+        self.name = name
+        self.entity = entity
+        self.field = ENTITIES[entity]
+        self.buckets = buckets
+        self.bucket_seconds = seconds / buckets
+        self.max_keys = max_keys
+        self.rows: OrderedDict[int, int] = OrderedDict()
+        self.cells = array("d")
+        self.heads = array("q")
+        self.totals = array("d")
+
+    def _advance(self, row: int, bucket: int):
+        gap = bucket - self.heads[row]
+        if gap <= 0:
+            return
+        cells, totals, size = self.cells, self.totals, self.buckets
+        base = row * size * 2
+        if gap >= size:
+            cells[base:base + size * 2] = array("d", bytes(16 * size))
+            totals[row * 2] = totals[row * 2 + 1] = 0.0
+        else:
+            count, total = totals[row * 2], totals[row * 2 + 1]
+            for b in range(self.heads[row] + 1, bucket + 1):
+                i = base + (b % size) * 2
+                count -= cells[i]
+                total -= cells[i + 1]
+                cells[i] = cells[i + 1] = 0.0
+            # Drop the rounding error left by the subtractions.
+            totals[row * 2] = count
+            totals[row * 2 + 1] = total if count else 0.0
+        self.heads[row] = bucket
+
+    def read(self, key: int, now: float) -> tuple[float, float]:
+        row = self.rows.get(key)
+        if row is None:
+            return 0.0, 0.0
+        self._advance(row, int(now // self.bucket_seconds))
+        return self.totals[row * 2], self.totals[row * 2 + 1]
+
+    def _new_row(self, key: int, bucket: int) -> int:
+        size = self.buckets
+        if len(self.rows) >= self.max_keys:
+            _, row = self.rows.popitem(last=False)
+            base = row * size * 2
+            self.cells[base:base + size * 2] = array("d", bytes(16 * size))
+            self.heads[row] = bucket
+            self.totals[row * 2] = self.totals[row * 2 + 1] = 0.0
+        else:
+            row = len(self.heads)
+            self.cells.frombytes(bytes(16 * size))
+            self.heads.append(bucket)
+            self.totals.frombytes(bytes(16))
+        self.rows[key] = row
+        return row
+
+    def record(self, key: int, amount: float, now: float):
+        bucket = int(now // self.bucket_seconds)
+        row = self.rows.get(key)
+        if row is None:
+            row = self._new_row(key, bucket)
+        else:
+            self.rows.move_to_end(key)
+            self._advance(row, bucket)
+        i = row * self.buckets * 2 + (bucket % self.buckets) * 2
+        self.cells[i] += 1
+        self.cells[i + 1] += amount
+        self.totals[row * 2] += 1
+        self.totals[row * 2 + 1] += amount
+
+
+class _Features(ast.NodeTransformer):
+    # amount -> f["amount"], card_10m.count -> f["card_10m.count"],
+    # a / b -> div(a, b)
+
+    def __init__(self, names: set[str]):
+        self.names = names
+
+    def _lookup(self, name: str) -> ast.Subscript:
+        if name not in self.names:
+            raise RuleError(f"Unknown name {name!r}")
+        return ast.Subscript(
+            value=ast.Name("f", ast.Load()), slice=ast.Constant(name), ctx=ast.Load()
+        )
+
+    def visit_Name(self, node: ast.Name):
+        return self._lookup(node.id)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        if not isinstance(node.value, ast.Name):
+            raise RuleError("Only <window>.count and <window>.sum are allowed")
+        return self._lookup(f"{node.value.id}.{node.attr}")
+
+    def visit_BinOp(self, node: ast.BinOp):
+        self.generic_visit(node)
+        if not isinstance(node.op, ast.Div):
+            return node
+        return ast.Call(func=ast.Name("div", ast.Load()), args=[node.left, node.right], keywords=[])
+
+
+def compile_rule(code: str, expression: str, names: set[str]) -> Callable[[dict], bool]:
+    try:
+        tree = ast.parse(str(expression), mode="eval")
+    except SyntaxError as e:
+        raise RuleError(f"Rule {code}: {e.msg}") from e
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED) or (
+            isinstance(node, ast.Constant) and not isinstance(node.value, (int, float))
+        ):
+            raise RuleError(f"Rule {code}: {type(node).__name__} is not allowed")
+
+    try:
+        body = _Features(names).visit(tree.body)
+    except RuleError as e:
+        raise RuleError(f"Rule {code}: {e}") from e
+    function = ast.Expression(
+        ast.Lambda(
+            args=ast.arguments(
+                posonlyargs=[], args=[ast.arg("f")], kwonlyargs=[], kw_defaults=[], defaults=[]
+            ),
+            body=body,
+        )
+    )
+    ast.fix_missing_locations(function)
+    return eval(compile(function, f"<rule {code}>", "eval"), {"__builtins__": {}, "div": _div})
+
+
+class RiskEngine:
+    # Per worker and in memory: with several workers or instances each one
+    # sees only the payments routed to it.
+
+    def __init__(self, windows: list[VelocityWindow], rules: list[tuple[str, Callable]]):
+        self.windows = windows
+        self.rules = rules
+
+    @classmethod
+    def from_config(cls, config: dict, max_keys: int) -> "RiskEngine":
+        windows = [
+            VelocityWindow(
+                name, spec["entity"], float(spec["seconds"]), int(spec["buckets"]), max_keys
+            )
+            for name, spec in (config.get("windows") or {}).items()
+        ]
+        names = {"amount"}
+        for window in windows:
+            names.update((f"{window.name}.count", f"{window.name}.sum"))
+
+        rules = []
+        for rule in config.get("rules") or []:
+            code = str(rule["code"])
+            rules.append((code, compile_rule(code, rule["when"], names)))
+        return cls(windows, rules)
+
+    @classmethod
+    def from_file(cls, path: Path, max_keys: int) -> "RiskEngine":
+        with open(path) as f:
+            return cls.from_config(yaml.safe_load(f) or {}, max_keys)
+
+    # Returns the code of the first matching rule, or None. Every attempt is
+    # counted in the windows, rejected or not: repeated declines are what
+    # card testing looks like.
+    def check(
+        self,
+        amount: float,
+        card_id: Optional[int],
+        user_id: Optional[int],
+        now: Optional[float] = None,
+    ) -> Optional[str]:
+        if now is None:
+            now = time.monotonic()
+        ids = {"card_id": card_id, "user_id": user_id}
+
+        features = {"amount": amount}
+        for window in self.windows:
+            key = ids[window.field]
+            count, total = window.read(key, now) if key is not None else (0.0, 0.0)
+            features[f"{window.name}.count"] = count
+            features[f"{window.name}.sum"] = total
+
+        reason = None
+        for code, predicate in self.rules:
+            if predicate(features):
+                reason = code
+                break
+
+        for window in self.windows:
+            key = ids[window.field]
+            if key is not None:
+                window.record(key, amount, now)
+        return reason
@@ -1,10 +1,22 @@
+import hashlib
+import hmac
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from app.core.config import settings
+from payments_common.tracing import span
 
 security = HTTPBearer()
 
+# Tokens that passed every check, until they expire. The API reuses each
+# service token for most of its lifetime, so steady traffic skips the
+# signature check.
+VERIFIED_TOKENS_MAX = 1024
+_verified_tokens: dict[str, dict] = {}
+
+
 def verify_internal_token(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ):
@@ -16,13 +28,20 @@ def verify_internal_token(
 
     token = credentials.credentials.strip()
 
+    payload = _verified_tokens.get(token)
+    if payload is not None:
+        if payload["exp"] > time.time():
+            return payload
+        _verified_tokens.pop(token, None)
+
     try:
-        payload = jwt.decode(
-            token,
-            settings.INTERNAL_SECRET_KEY,
-            algorithms=[settings.JWT_ALGORITHM],
-            audience=settings.EXPECTED_AUDIENCE,
-        )
+        with span("auth"):
+            payload = jwt.decode(
+                token,
+                settings.INTERNAL_SECRET_KEY,
+                algorithms=[settings.JWT_ALGORITHM],
+                audience=settings.EXPECTED_AUDIENCE,
+            )
     except JWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -38,4 +57,17 @@ def verify_internal_token(
     if payload.get("scope") != settings.EXPECTED_SCOPE:
         raise HTTPException(status_code=403, detail="Invalid scope")
 
+    if "exp" in payload:
+        if len(_verified_tokens) >= VERIFIED_TOKENS_MAX:
+            _verified_tokens.clear()
+        _verified_tokens[token] = payload
     return payload
+
+
+# Callback bodies are signed as "t=<unix time>,v1=<hex HMAC-SHA256 of
+# '<t>.<body>'>" so the receiver can reject tampered or replayed results.
+def sign_callback(body: bytes) -> str:
+    secret = (settings.CALLBACK_SECRET or settings.INTERNAL_SECRET_KEY).encode()
+    timestamp = str(int(time.time()))
+    digest = hmac.new(secret, timestamp.encode() + b"." + body, hashlib.sha256)
+    return f"t={timestamp},v1={digest.hexdigest()}"
@@ -4,15 +4,24 @@ from contextlib import asynccontextmanager
 import logging
 
 from fastapi.responses import RedirectResponse
+from payments_common.logging import setup_logging
+from payments_common.metrics import MetricsMiddleware, mark_process_dead, metrics_response
+from payments_common.tracing import TracingMiddleware
 
-from app.core.logging import setup_logging
+from app.core.config import settings
 from app.routes.payment_router import router as payment_router
+from app.services.job_service import payment_jobs
 
 
 # --------------------------------------------------
 # 🔧 Logging
 # --------------------------------------------------
-setup_logging()
+setup_logging(
+    settings.LOG_LEVEL,
+    settings.LOG_QUEUE_SIZE,
+    settings.LOG_SAMPLING,
+    settings.LOG_RATE_LIMITS,
+)
 logger = logging.getLogger(__name__)
 
 
@@ -22,8 +31,11 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("🚀 Starting payment processor service...")
+    payment_jobs.start()
     yield
     logger.info("🛑 Shutting down payment processor service...")
+    await payment_jobs.stop()
+    mark_process_dead()
 
 
 # --------------------------------------------------
@@ -46,12 +58,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --------------------------------------------------
+# 📊 Metrics & Tracing
+# --------------------------------------------------
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(
+    TracingMiddleware,
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    trust_sampled=settings.TRACE_TRUST_UPSTREAM,
+)
+
 # --------------------------------------------------
 # 🔗 Routers
 # --------------------------------------------------
 app.include_router(payment_router)
 
 
+# --------------------------------------------------
+# ❤️ Health Check
+# --------------------------------------------------
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+# --------------------------------------------------
+# 📊 Metrics
+# --------------------------------------------------
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
 # --------------------------------------------------
 # 🔄 Redirect Docs
 # --------------------------------------------------
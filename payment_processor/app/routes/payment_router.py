@@ -1,24 +1,92 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import math
+from decimal import Decimal
 
-from app.schemas.payment_schemas import PaymentRequest, PaymentResponse
-from app.services.payment_service import PaymentProcessor
+from fastapi import APIRouter, HTTPException, Request, Response, status, Depends
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from app.schemas.payment_schemas import (
+    AsyncPaymentRequest,
+    PaymentBatchItem,
+    PaymentBatchRequest,
+    PaymentBatchResponse,
+    PaymentJobStatus,
+    PaymentRequest,
+    PaymentResponse,
+)
+from app.services.job_service import payment_jobs
+from payments_common import wire
+from app.core.config import settings
 from app.core.security import verify_internal_token
+from payments_common.tracing import span
 
 router = APIRouter(prefix="/process-payment", tags=["Payments"])
-processor = PaymentProcessor()
+
+
+# JSON is validated by pydantic as usual; the binary layout already fixes the
+# types, so only the value constraints are checked before building the model.
+async def read_payment_request(request: Request) -> PaymentRequest:
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith(wire.CONTENT_TYPE):
+        try:
+            fields = wire.decode_request(body)
+        except wire.WireError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        amount, idempotency_key = fields["amount"], fields["idempotency_key"]
+        if not math.isfinite(amount) or amount <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Payment amount must be greater than zero",
+            )
+        if idempotency_key is not None and len(idempotency_key) > 255:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency key is too long",
+            )
+        return PaymentRequest.model_construct(**{**fields, "amount": Decimal(repr(amount))})
+
+    if content_type and not content_type.startswith("application/json"):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Use application/json or {wire.CONTENT_TYPE}",
+        )
+    try:
+        return PaymentRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
 
 
 @router.post(
     "/",
     response_model=PaymentResponse,
     status_code=status.HTTP_200_OK,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": PaymentRequest.model_json_schema()},
+                wire.CONTENT_TYPE: {},
+            },
+        }
+    },
 )
 async def process_payment(
-    req: PaymentRequest,
+    request: Request,
     token_data=Depends(verify_internal_token),
+    req: PaymentRequest = Depends(read_payment_request),
 ):
     try:
-        result = await processor.process_payment(req.amount)
+        with span("decision"):
+            result = await payment_jobs.process_now(req)
+        if wire.accepts(request.headers.get("accept")):
+            return Response(
+                wire.encode_response(
+                    result.status, result.reference, result.reason, result.processed_at
+                ),
+                media_type=wire.CONTENT_TYPE,
+            )
         return result
 
     except HTTPException as e:
@@ -29,3 +97,58 @@ async def process_payment(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error",
         )
+
+
+# Micro-batches from the API client: the payments are decided in order, like
+# the same calls one after another on this worker.
+@router.post(
+    "/batch",
+    response_model=PaymentBatchResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def process_payment_batch(
+    req: PaymentBatchRequest,
+    token_data=Depends(verify_internal_token),
+):
+    if len(req.payments) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.BATCH_MAX_SIZE} payments per batch",
+        )
+
+    results = []
+    with span("decision", "batch"):
+        for payment in req.payments:
+            try:
+                result = await payment_jobs.process_now(payment)
+                results.append(PaymentBatchItem(status_code=status.HTTP_200_OK, result=result))
+            except HTTPException as e:
+                results.append(PaymentBatchItem(status_code=e.status_code, detail=e.detail))
+            except Exception:
+                results.append(
+                    PaymentBatchItem(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail="Internal server error",
+                    )
+                )
+    return PaymentBatchResponse(results=results)
+
+
+@router.post(
+    "/async",
+    response_model=PaymentJobStatus,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def process_payment_async(
+    req: AsyncPaymentRequest,
+    token_data=Depends(verify_internal_token),
+):
+    return (await payment_jobs.submit(req)).to_status()
+
+
+@router.get("/{idempotency_key}", response_model=PaymentJobStatus)
+async def get_payment_job(
+    idempotency_key: str,
+    token_data=Depends(verify_internal_token),
+):
+    return (await payment_jobs.get(idempotency_key)).to_status()
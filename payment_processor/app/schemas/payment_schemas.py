@@ -8,6 +8,13 @@ class PaymentRequest(BaseModel):
     amount: Decimal = Field(
         gt=0, description="Payment amount. Must be greater than zero."
     )
+    # Optional on the synchronous endpoint: with a key, a repeated request
+    # returns the first decision instead of charging again.
+    payment_id: int | None = None
+    idempotency_key: str | None = Field(default=None, min_length=1, max_length=255)
+    # For the velocity rules; without them only the amount rules apply.
+    user_id: int | None = None
+    card_id: int | None = None
 
 
 class PaymentResponse(BaseModel):
@@ -15,3 +22,40 @@ class PaymentResponse(BaseModel):
     reference: str | None = None
     reason: str | None = None
     processed_at: datetime
+
+
+# Every payment is decided on its own: one that fails (e.g. 409, already
+# being processed) does not fail the rest. status_code is what the single
+# endpoint would have answered.
+class PaymentBatchRequest(BaseModel):
+    payments: list[PaymentRequest] = Field(min_length=1)
+
+
+class PaymentBatchItem(BaseModel):
+    status_code: int
+    result: PaymentResponse | None = None
+    detail: str | None = None
+
+
+class PaymentBatchResponse(BaseModel):
+    results: list[PaymentBatchItem]
+
+
+class AsyncPaymentRequest(PaymentRequest):
+    payment_id: int
+    idempotency_key: str = Field(min_length=1, max_length=255)
+    callback_url: str
+
+
+class PaymentCallback(PaymentResponse):
+    payment_id: int
+    idempotency_key: str
+
+
+class PaymentJobStatus(BaseModel):
+    idempotency_key: str
+    payment_id: int | None
+    state: Literal["queued", "processing", "completed"]
+    callback_attempts: int
+    callback_delivered: bool
+    result: PaymentResponse | None = None
@@ -0,0 +1,11 @@
+from payments_common.server import serve
+
+from app.core.config import settings
+
+
+def main():
+    serve("app.main:app", settings, metrics_prefix="processor-metrics-")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.core.job_store import MemoryJobStore, RedisJobStore
+from app.core.metrics import CALLBACK_DELIVERIES, PAYMENT_JOBS_QUEUED
+from app.core.security import sign_callback
+from app.schemas.payment_schemas import (
+    AsyncPaymentRequest,
+    PaymentCallback,
+    PaymentJobStatus,
+    PaymentRequest,
+    PaymentResponse,
+)
+from app.services.payment_service import PaymentProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentJob:
+    __slots__ = (
+        "request",
+        "state",
+        "result",
+        "attempts",
+        "delivered",
+        "created_at",
+    )
+
+    def __init__(self, request: PaymentRequest):
+        self.request = request
+        self.state = "queued"
+        self.result: Optional[PaymentResponse] = None
+        self.attempts = 0
+        self.delivered = False
+        self.created_at = time.time()
+
+    def to_record(self) -> dict:
+        return {
+            "idempotency_key": self.request.idempotency_key,
+            "request": self.request.model_dump(mode="json"),
+            "state": self.state,
+            "result": self.result.model_dump(mode="json") if self.result else None,
+            "attempts": self.attempts,
+            "delivered": self.delivered,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "PaymentJob":
+        request = record["request"]
+        model = AsyncPaymentRequest if request.get("callback_url") else PaymentRequest
+        job = cls(model.model_validate(request))
+        job.state = record["state"]
+        job.result = PaymentResponse.model_validate(record["result"]) if record["result"] else None
+        job.attempts = record["attempts"]
+        job.delivered = record["delivered"]
+        job.created_at = record["created_at"]
+        return job
+
+    def to_status(self) -> PaymentJobStatus:
+        return PaymentJobStatus(
+            idempotency_key=self.request.idempotency_key,
+            payment_id=self.request.payment_id,
+            state=self.state,
+            callback_attempts=self.attempts,
+            callback_delivered=self.delivered,
+            result=self.result,
+        )
+
+
+def _create_store():
+    if settings.JOB_STORE == "redis":
+        return RedisJobStore(settings.JOB_REDIS_URL, settings.JOB_RETENTION_SECONDS)
+    return MemoryJobStore(settings.JOB_RETENTION_SECONDS)
+
+
+class PaymentJobQueue:
+    # Idempotency keys and job state live in the job store (Redis in
+    # production, shared by every worker and instance); the queue itself is
+    # per worker. Jobs of a worker that stops are taken over by another one
+    # once their lease expires (JOB_LEASE_SECONDS).
+
+    def __init__(self, processor: PaymentProcessor, store):
+        self.processor = processor
+        self.store = store
+        self.queue: asyncio.Queue[PaymentJob] = asyncio.Queue(settings.JOB_QUEUE_SIZE)
+        self._workers: list[asyncio.Task] = []
+        self._deliveries: set[asyncio.Task] = set()
+        self._delivery_slots = asyncio.Semaphore(settings.CALLBACK_CONCURRENCY)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def start(self):
+        self._client = httpx.AsyncClient(timeout=settings.CALLBACK_TIMEOUT)
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(settings.JOB_WORKERS)
+        ]
+        self._workers.append(asyncio.create_task(self._recover()))
+
+    async def stop(self):
+        for task in (*self._workers, *self._deliveries):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._deliveries, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+        await self.store.close()
+
+    async def submit(self, request: AsyncPaymentRequest) -> PaymentJob:
+        if self.queue.full():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Payment queue is full",
+                headers={"Retry-After": "1"},
+            )
+
+        job = PaymentJob(request)
+        existing = await self.store.claim(job.to_record(), settings.JOB_LEASE_SECONDS)
+        if existing is not None:
+            return PaymentJob.from_record(existing)
+
+        self.queue.put_nowait(job)
+        PAYMENT_JOBS_QUEUED.inc()
+        return job
+
+    # Synchronous requests with an idempotency key go through the same job
+    # table, so a retried request (or the API's reconciler) gets the original
+    # decision back and the status endpoint can report it.
+    async def process_now(self, request: PaymentRequest) -> PaymentResponse:
+        if request.idempotency_key is None:
+            return await self.processor.process_payment(request)
+
+        job = PaymentJob(request)
+        job.state = "processing"
+        existing = await self.store.claim(job.to_record(), settings.JOB_LEASE_SECONDS)
+        if existing is not None:
+            if existing["state"] != "completed":
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Payment is already being processed",
+                )
+            return PaymentResponse.model_validate(existing["result"])
+
+        try:
+            job.result = await self.processor.process_payment(request)
+        except Exception:
+            await self.store.delete(request.idempotency_key)
+            raise
+        job.state = "completed"
+        # Nothing to deliver: the caller already has the answer.
+        job.delivered = True
+        await self.store.save(job.to_record())
+        return job.result
+
+    async def get(self, idempotency_key: str) -> PaymentJob:
+        record = await self.store.get(idempotency_key)
+        if record is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Payment job not found"
+            )
+        return PaymentJob.from_record(record)
+
+    async def _recover(self):
+        # Picks up jobs whose owner stopped before finishing them.
+        while True:
+            await asyncio.sleep(settings.JOB_RECOVERY_INTERVAL)
+            try:
+                free = self.queue.maxsize - self.queue.qsize()
+                if free <= 0:
+                    continue
+                records = await self.store.take_expired(settings.JOB_LEASE_SECONDS, free)
+            except Exception:
+                logger.exception("Job recovery failed")
+                continue
+            for record in records:
+                logger.warning("Recovering payment job | key=%s", record["idempotency_key"])
+                self.queue.put_nowait(PaymentJob.from_record(record))
+                PAYMENT_JOBS_QUEUED.inc()
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            PAYMENT_JOBS_QUEUED.dec()
+            key = job.request.idempotency_key
+            try:
+                # Another worker took the job over after its lease expired.
+                if not await self.store.start(key, settings.JOB_LEASE_SECONDS):
+                    continue
+                job.state = "processing"
+                await self.store.save(job.to_record())
+            except Exception:
+                logger.exception("Job store unavailable | key=%s", key)
+                continue
+
+            try:
+                job.result = await self.processor.process_payment(job.request)
+            except Exception:
+                logger.exception(
+                    "Payment job failed | payment_id=%s", job.request.payment_id
+                )
+                job.result = PaymentResponse(
+                    status="rejected",
+                    reason="processing_error",
+                    processed_at=datetime.now(timezone.utc),
+                )
+            job.state = "completed"
+            # A synchronous request recovered from a stopped worker has no
+            # callback; its caller reads the result from the status endpoint.
+            job.delivered = not isinstance(job.request, AsyncPaymentRequest)
+            try:
+                await self.store.save(job.to_record())
+            except Exception:
+                logger.exception("Job store unavailable | key=%s", key)
+            if job.delivered:
+                continue
+
+            # Deliveries run on their own tasks so backoff sleeps never hold a
+            # worker.
+            task = asyncio.create_task(self._deliver(job))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, job: PaymentJob):
+        body = PaymentCallback(
+            payment_id=job.request.payment_id,
+            idempotency_key=job.request.idempotency_key,
+            **job.result.model_dump(),
+        ).model_dump_json().encode()
+
+        for attempt in range(1, settings.CALLBACK_MAX_ATTEMPTS + 1):
+            job.attempts = attempt
+            try:
+                async with self._delivery_slots:
+                    response = await self._client.post(
+                        job.request.callback_url,
+                        content=body,
+                        headers={
+                            "Content-Type": "application/json",
+                            "X-Signature": sign_callback(body),
+                        },
+                    )
+                if response.is_success:
+                    job.delivered = True
+                    CALLBACK_DELIVERIES.labels("delivered").inc()
+                    await self._save_delivery(job)
+                    return
+                # Other 4xx answers will not change on retry.
+                if response.status_code < 500 and response.status_code != 429:
+                    CALLBACK_DELIVERIES.labels("rejected").inc()
+                    logger.error(
+                        "Callback rejected | payment_id=%s | status=%s",
+                        job.request.payment_id,
+                        response.status_code,
+                    )
+                    await self._save_delivery(job)
+                    return
+            except httpx.HTTPError as e:
+                logger.warning(
+                    "Callback failed | payment_id=%s | attempt=%d | error=%s",
+                    job.request.payment_id,
+                    attempt,
+                    e,
+                )
+
+            if attempt == settings.CALLBACK_MAX_ATTEMPTS:
+                break
+            CALLBACK_DELIVERIES.labels("retry").inc()
+            delay = min(
+                settings.CALLBACK_BACKOFF_MAX,
+                settings.CALLBACK_BACKOFF_BASE * 2 ** (attempt - 1),
+            )
+            # Full jitter so a recovering API is not hit by synchronized retries.
+            await asyncio.sleep(random.uniform(0, delay))
+
+        CALLBACK_DELIVERIES.labels("gave_up").inc()
+        logger.error(
+            "Callback delivery gave up | payment_id=%s | attempts=%d",
+            job.request.payment_id,
+            job.attempts,
+        )
+        await self._save_delivery(job)
+
+    # Delivery outcome for the status endpoint; the result is already stored.
+    async def _save_delivery(self, job: PaymentJob):
+        try:
+            await self.store.save(job.to_record())
+        except Exception:
+            logger.exception("Job store unavailable | key=%s", job.request.idempotency_key)
+
+
+payment_jobs = PaymentJobQueue(PaymentProcessor(), _create_store())
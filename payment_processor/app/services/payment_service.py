@@ -1,17 +1,28 @@
 import random
 import logging
 from datetime import datetime, timezone
-from decimal import Decimal
 
-from app.schemas.payment_schemas import PaymentResponse
+from app.schemas.payment_schemas import PaymentRequest, PaymentResponse
+from app.core.config import settings
+from app.core.ids import IdGenerator
+from app.core.metrics import PAYMENT_DECISIONS
+from app.core.risk import RiskEngine
 
 logger = logging.getLogger(__name__)
 
+references = IdGenerator(settings.NODE_ID, prefix="REF-")
+risk = (
+    RiskEngine.from_file(settings.RISK_RULES_FILE, settings.RISK_MAX_KEYS)
+    if settings.RISK_ENABLED
+    else None
+)
+
 
 class PaymentProcessor:
 
-    async def process_payment(self, amount: Decimal) -> PaymentResponse:
+    async def process_payment(self, request: PaymentRequest) -> PaymentResponse:
 
+        amount = request.amount
         processed_at = datetime.now(timezone.utc)
 
         if amount <= 0:
@@ -19,6 +30,7 @@ class PaymentProcessor:
                 "Payment rejected | reason=invalid_amount | amount=%s",
                 amount,
             )
+            PAYMENT_DECISIONS.labels("rejected", "invalid_amount").inc()
 
             return PaymentResponse(
                 status="rejected",
@@ -27,16 +39,36 @@ class PaymentProcessor:
                 processed_at=processed_at,
             )
 
+        if risk is not None:
+            reason = risk.check(float(amount), request.card_id, request.user_id)
+            if reason is not None:
+                logger.warning(
+                    "Payment rejected | reason=%s | amount=%s | card_id=%s | user_id=%s",
+                    reason,
+                    amount,
+                    request.card_id,
+                    request.user_id,
+                )
+                PAYMENT_DECISIONS.labels("rejected", reason).inc()
+
+                return PaymentResponse(
+                    status="rejected",
+                    reference=None,
+                    reason=reason,
+                    processed_at=processed_at,
+                )
+
         approved = random.random() < 0.8
 
         if approved:
-            reference = f"REF-{int(processed_at.timestamp())}"
+            reference = references.new()
 
             logger.info(
                 "Payment approved | reference=%s | amount=%s",
                 reference,
                 amount,
             )
+            PAYMENT_DECISIONS.labels("approved", "").inc()
 
             return PaymentResponse(
                 status="approved",
@@ -49,6 +81,7 @@ class PaymentProcessor:
             "Payment rejected | reason=insufficient_funds | amount=%s",
             amount,
         )
+        PAYMENT_DECISIONS.labels("rejected", "insufficient_funds").inc()
 
         return PaymentResponse(
             status="rejected",
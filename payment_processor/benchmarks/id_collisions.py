@@ -0,0 +1,77 @@
+"""Throughput and collision check for the processor reference generator.
+
+    python -m benchmarks.id_collisions --processes 4 --threads 4 --count 250000
+
+Every thread of every process draws ids from its process's generator; all of
+them are then checked for duplicates, and each thread's sequence for strict
+ordering.
+"""
+
+import argparse
+import multiprocessing
+import threading
+import time
+
+from app.core.ids import IdGenerator
+
+
+def generate(node_id: int, threads: int, count: int) -> tuple[list[list[int]], float, float]:
+    generator = IdGenerator(node_id, prefix="REF-")
+
+    # Encoding throughput, single thread.
+    start = time.perf_counter()
+    for _ in range(count):
+        generator.new()
+    encode_rate = count / (time.perf_counter() - start)
+
+    results: list[list[int]] = [[] for _ in range(threads)]
+
+    def draw(out: list):
+        new_int = generator.new_int
+        out.extend(new_int() for _ in range(count))
+
+    workers = [threading.Thread(target=draw, args=(out,)) for out in results]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    threaded_rate = threads * count / (time.perf_counter() - start)
+
+    return results, encode_rate, threaded_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--count", type=int, default=250_000, help="ids per thread")
+    parser.add_argument("--node-id", type=int, default=0)
+    args = parser.parse_args()
+
+    with multiprocessing.Pool(args.processes) as pool:
+        runs = pool.starmap(
+            generate, [(args.node_id, args.threads, args.count)] * args.processes
+        )
+
+    seen = set()
+    total = unordered = 0
+    for sequences, encode_rate, threaded_rate in runs:
+        print(
+            f"process      new() {encode_rate:,.0f} ids/s | "
+            f"new_int() x{args.threads} threads {threaded_rate:,.0f} ids/s"
+        )
+        for sequence in sequences:
+            total += len(sequence)
+            seen.update(sequence)
+            unordered += sum(1 for a, b in zip(sequence, sequence[1:]) if a >= b)
+
+    print(f"ids          {total:,}")
+    print(f"collisions   {total - len(seen):,}")
+    print(f"out of order {unordered:,}")
+    if total != len(seen) or unordered:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
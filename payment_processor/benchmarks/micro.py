@@ -0,0 +1,182 @@
+"""Micro-benchmarks for the per-request hot functions, with regression gates.
+
+    python -m benchmarks.micro run [--output benchmarks/baselines/micro.json]
+    python -m benchmarks.micro compare [--baseline benchmarks/baselines/micro.json] \
+        [--threshold 0.10] [--filter token]
+
+Same commands and baseline format as ``api_service/benchmarks/micro.py``;
+``compare`` exits with status 1 when a function regressed past the threshold
+and with status 2 when there is no baseline yet.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import platform
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+
+from app.core.config import settings
+from app.core.risk import RiskEngine
+from app.core.security import verify_internal_token
+from app.schemas.payment_schemas import PaymentRequest
+from app.services.payment_service import PaymentProcessor
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "micro.json"
+
+
+def _service_token() -> str:
+    now = datetime.now(timezone.utc)
+    return jwt.encode(
+        {
+            "iss": settings.EXPECTED_ISSUER,
+            "aud": settings.EXPECTED_AUDIENCE,
+            "scope": settings.EXPECTED_SCOPE,
+            "service": "benchmark",
+            "iat": now,
+            "exp": now + timedelta(hours=1),
+        },
+        settings.INTERNAL_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+
+
+# process_payment never awaits, so one send() runs it to completion without
+# an event loop in the measurement.
+def _run(coroutine):
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended")
+
+
+def cases() -> dict:
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=_service_token())
+    processor = PaymentProcessor()
+    request = PaymentRequest(amount=Decimal("125.50"))
+    engine = RiskEngine.from_file(settings.RISK_RULES_FILE, settings.RISK_MAX_KEYS)
+    # Cycles through more cards than RISK_MAX_KEYS, so eviction is included.
+    ids = itertools.cycle(range(1, settings.RISK_MAX_KEYS * 2))
+
+    # Decision logs still build their records, but are not printed.
+    logging.getLogger().addHandler(logging.NullHandler())
+
+    return {
+        "security.verify_internal_token": lambda: verify_internal_token(credentials),
+        "processor.process_payment": lambda: _run(processor.process_payment(request)),
+        # Budget: under 50 µs per decision.
+        "risk.check": lambda: engine.check(125.5, next(ids), 1),
+    }
+
+
+def measure(function, repeat: int) -> dict:
+    timer = timeit.Timer(function)
+    # Enough calls per sample for ~0.2 s, then the best of `repeat` samples:
+    # the minimum is the run least disturbed by the rest of the machine.
+    number, _ = timer.autorange()
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "ns_per_call": min(samples) * 1e9,
+        "max_ns_per_call": max(samples) * 1e9,
+        "calls_per_sample": number,
+    }
+
+
+def run_cases(name_filter: str | None, repeat: int) -> dict:
+    results = {}
+    for name, function in cases().items():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = measure(function, repeat)
+        print(f"{name:<32} {results[name]['ns_per_call']:12.0f} ns/call", flush=True)
+    return results
+
+
+def host() -> str:
+    return f"{platform.platform()}, {os.cpu_count()} CPU(s), {platform.processor() or 'unknown CPU'}"
+
+
+def run(args) -> int:
+    results = run_cases(args.filter, args.repeat)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(
+        json.dumps(
+            {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "host": host(),
+                "results": results,
+            },
+            indent=2,
+        )
+        + "\n"
+    )
+    print(f"baseline written to {args.output}")
+    return 0
+
+
+def compare(args) -> int:
+    if not args.baseline.exists():
+        print(
+            f"no baseline at {args.baseline}; baselines are not committed because they only hold "
+            f"on the machine that recorded them. Record one on this host first:\n"
+            f"    python -m benchmarks.micro run --output {args.baseline}",
+            file=sys.stderr,
+        )
+        return 2
+
+    recorded = json.loads(args.baseline.read_text())
+    baseline = recorded["results"]
+    if recorded.get("host", host()) != host():
+        print(f"warning: baseline recorded on {recorded['host']}, comparing on {host()}", file=sys.stderr)
+    results = run_cases(args.filter, args.repeat)
+
+    regressions = []
+    print(f"\n{'function':<32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<32} {'-':>12} {result['ns_per_call']:12.0f}      new")
+            continue
+        before = baseline[name]["ns_per_call"]
+        change = result["ns_per_call"] / before - 1
+        flag = "  REGRESSION" if change > args.threshold else ""
+        print(f"{name:<32} {before:12.0f} {result['ns_per_call']:12.0f} {change:+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="measure and store a baseline")
+    run_parser.add_argument("--output", type=Path, default=DEFAULT_BASELINE)
+
+    compare_parser = subparsers.add_parser("compare", help="measure and check against a baseline")
+    compare_parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--filter", help="only functions whose name contains this")
+        sub.add_argument("--repeat", type=int, default=7)
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == "run" else compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Per-decision latency and memory of the risk engine, against its budget.
+
+    python -m benchmarks.risk [--rules app/risk_rules.yaml] [--decisions 200000] \
+        [--cards 100000] [--users 50000] [--max-keys 50000] [--budget-us 50]
+
+Replays random payments over more cards and users than ``--max-keys`` (so
+windows fill up and evict), then reports latency percentiles per decision
+and the memory the windows hold. Exits with status 1 when the p99 is over
+the budget.
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.core.risk import RiskEngine
+
+DEFAULT_RULES = Path(__file__).resolve().parent.parent / "app" / "risk_rules.yaml"
+
+
+def replay(engine: RiskEngine, payments: list, start: float) -> list[int]:
+    latencies = []
+    for offset, amount, card_id, user_id in payments:
+        begin = time.perf_counter_ns()
+        engine.check(amount, card_id, user_id, now=start + offset)
+        latencies.append(time.perf_counter_ns() - begin)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=Path, default=DEFAULT_RULES)
+    parser.add_argument("--decisions", type=int, default=200000)
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--max-keys", type=int, default=50000)
+    # Simulated time between payments, so buckets rotate during the run.
+    parser.add_argument("--interval-ms", type=float, default=5.0)
+    parser.add_argument("--budget-us", type=float, default=50.0)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    payments = [
+        (
+            i * args.interval_ms / 1000,
+            round(rng.lognormvariate(4, 1.2), 2),
+            rng.randrange(1, args.cards + 1),
+            rng.randrange(1, args.users + 1),
+        )
+        for i in range(args.decisions)
+    ]
+
+    # Warm-up on its own engine, then measure on a fresh one.
+    replay(RiskEngine.from_file(args.rules, args.max_keys), payments[:10000], 0.0)
+    engine = RiskEngine.from_file(args.rules, args.max_keys)
+    latencies = sorted(replay(engine, payments, 0.0))
+
+    def pct(p: float) -> float:
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] / 1000
+
+    print(
+        f"{len(latencies)} decisions, {len(engine.rules)} rules, {len(engine.windows)} windows\n"
+        f"p50 {pct(0.50):8.2f} µs  p99 {pct(0.99):8.2f} µs  "
+        f"p99.9 {pct(0.999):8.2f} µs  max {latencies[-1] / 1000:8.2f} µs"
+    )
+
+    tracemalloc.start()
+    engine = RiskEngine.from_file(args.rules, args.max_keys)
+    replay(engine, payments, 0.0)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    keys = sum(len(window.rows) for window in engine.windows)
+    print(f"memory {held / 2**20:.1f} MiB for {keys} tracked keys ({held / max(keys, 1):.0f} B/key)")
+
+    if pct(0.99) > args.budget_us:
+        print(f"p99 over the {args.budget_us:.0f} µs budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""JSON vs the binary wire format for the synchronous payment call.
+
+    python -m benchmarks.wire [--repeat 7]
+    python -m benchmarks.wire --url http://processor:8001 --token <service JWT> \
+        [--iterations 2000]
+
+Without ``--url`` it measures the CPU both sides spend per call on encoding
+and decoding, in process. With ``--url`` it also posts real payments over one
+keep-alive connection in each format and reports the latency (the processor
+must be running this version). Compare formats on the same host and network.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import timeit
+from datetime import datetime, timezone
+
+import httpx
+
+from payments_common import wire
+from app.schemas.payment_schemas import PaymentRequest, PaymentResponse
+
+AMOUNT = 125.5
+PAYMENT_ID = 4242
+KEY = f"payment-{PAYMENT_ID}"
+USER_ID = 17
+CARD_ID = 23
+REQUEST = {
+    "amount": AMOUNT,
+    "payment_id": PAYMENT_ID,
+    "idempotency_key": KEY,
+    "user_id": USER_ID,
+    "card_id": CARD_ID,
+}
+RESPONSE = PaymentResponse(
+    status="approved",
+    reference="REF-01J9Z3W7X8Y2Q4R5S6T7V8W9XA",
+    processed_at=datetime.now(timezone.utc),
+)
+
+
+def json_round_trip():
+    # Client encodes, processor parses and answers, client parses the answer.
+    body = json.dumps(REQUEST)
+    PaymentRequest.model_validate_json(body)
+    json.loads(RESPONSE.model_dump_json())
+
+
+def binary_round_trip():
+    wire.decode_request(wire.encode_request(AMOUNT, PAYMENT_ID, KEY, USER_ID, CARD_ID))
+    wire.decode_response(
+        wire.encode_response(
+            RESPONSE.status, RESPONSE.reference, RESPONSE.reason, RESPONSE.processed_at
+        )
+    )
+
+
+def sizes() -> dict:
+    json_request = json.dumps(REQUEST)
+    return {
+        "json": (len(json_request.encode()), len(RESPONSE.model_dump_json().encode())),
+        "binary": (
+            len(wire.encode_request(AMOUNT, PAYMENT_ID, KEY, USER_ID, CARD_ID)),
+            len(
+                wire.encode_response(
+                    RESPONSE.status, RESPONSE.reference, RESPONSE.reason, RESPONSE.processed_at
+                )
+            ),
+        ),
+    }
+
+
+def codec(repeat: int):
+    body_sizes = sizes()
+    for name, function in (("json", json_round_trip), ("binary", binary_round_trip)):
+        timer = timeit.Timer(function)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        request_size, response_size = body_sizes[name]
+        print(
+            f"{name:<8} {best * 1e9:10.0f} ns/round trip"
+            f"  request {request_size:4d} B  response {response_size:4d} B"
+        )
+
+
+async def live(url: str, token: str, iterations: int):
+    endpoint = f"{url.rstrip('/')}/process-payment/"
+    auth = {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        for name in ("json", "binary"):
+            latencies = []
+            for i in range(iterations + 1):
+                key = f"bench-{name}-{time.time_ns()}-{i}"
+                start = time.perf_counter()
+                if name == "binary":
+                    response = await client.post(
+                        endpoint,
+                        content=wire.encode_request(AMOUNT, None, key),
+                        headers={
+                            **auth,
+                            "Content-Type": wire.CONTENT_TYPE,
+                            "Accept": wire.CONTENT_TYPE,
+                        },
+                    )
+                    response.raise_for_status()
+                    wire.decode_response(response.content)
+                else:
+                    response = await client.post(
+                        endpoint, json={"amount": AMOUNT, "idempotency_key": key}, headers=auth
+                    )
+                    response.raise_for_status()
+                    response.json()
+                # The first call opens the connection; leave it out.
+                if i:
+                    latencies.append(time.perf_counter() - start)
+
+            latencies.sort()
+            print(
+                f"{name:<8} p50 {latencies[len(latencies) // 2] * 1000:8.3f} ms"
+                f"  p95 {latencies[int(len(latencies) * 0.95)] * 1000:8.3f} ms"
+                f"  mean {statistics.fmean(latencies) * 1000:8.3f} ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--url", help="a running processor, for the latency comparison")
+    parser.add_argument("--token", help="service token accepted by that processor")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    codec(args.repeat)
+    if args.url:
+        if not args.token:
+            parser.error("--url needs --token")
+        asyncio.run(live(args.url, args.token, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
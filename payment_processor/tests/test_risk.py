@@ -0,0 +1,37 @@
+import pytest
+
+from app.core.risk import RiskEngine, RuleError
+
+CONFIG = {
+    "windows": {"card_10m": {"entity": "card", "seconds": 600, "buckets": 10}},
+    "rules": [
+        {"code": "average_jump", "when": "amount / card_10m.count > 100"},
+    ],
+}
+
+
+def test_division_by_zero_is_zero():
+    engine = RiskEngine.from_config(CONFIG, max_keys=10)
+
+    # First payment of the card: count is 0, so the average is 0.
+    assert engine.check(500.0, card_id=1, user_id=None, now=0.0) is None
+
+
+def test_division_by_nonzero():
+    engine = RiskEngine.from_config(CONFIG, max_keys=10)
+    engine.check(50.0, card_id=1, user_id=None, now=0.0)
+
+    assert engine.check(100.0, card_id=1, user_id=None, now=1.0) is None
+    assert engine.check(250.0, card_id=1, user_id=None, now=2.0) == "average_jump"
+
+
+def test_constant_division_by_zero():
+    rules = {"rules": [{"code": "never", "when": "amount / 0 > 1"}]}
+    engine = RiskEngine.from_config(rules, max_keys=10)
+
+    assert engine.check(500.0, card_id=None, user_id=None) is None
+
+
+def test_calls_are_not_allowed():
+    with pytest.raises(RuleError):
+        RiskEngine.from_config({"rules": [{"code": "bad", "when": "div(amount, 0)"}]}, max_keys=10)